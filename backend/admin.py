@@ -0,0 +1,401 @@
+"""
+Admin CLI for bulk data: export, import, diff and reseed Firestore collections.
+
+    python admin.py export zones zones.ndjson
+    python admin.py import signals campus.ndjson --only-changed
+    python admin.py import signals campus.ndjson --resume     # carry on after an interruption
+    python admin.py diff zones zones.json
+    python admin.py reseed zones --dry-run                    # what reseeding would change
+    python admin.py reseed all
+
+Files are NDJSON (one document per line, .ndjson or .jsonl) or a JSON array (.json). A
+document's ID is its id field, or its _id field for documents without one (users,
+counters); export writes _id where needed. Timestamps are ISO 8601 strings in files and
+Firestore timestamps once imported.
+
+Imports read the file in chunks of WRITE_BATCH_SIZE documents and commit each chunk as one
+batch, --workers chunks at a time. --only-changed first reads the chunk's stored
+documents and skips those that already match; --dry-run reports what would be written
+without writing. Progress is saved after every chunk, so --resume skips what an
+interrupted run already committed. Afterwards the ID counter is moved past imported
+signal and notification IDs, stats and zone counters are recounted from the signals
+when signals or zones were written, and the users' inboxes are brought in line with the
+notifications when notifications or users were written.
+
+reseed replaces a collection with the seed data from database.py: seeds that differ are
+written and documents that aren't seeds are deleted. Seeds are compared without their
+timestamps, which are taken from the time of seeding, and zones without the counters
+the app maintains. Running servers pick up imported
+data as their caches expire; the search index and risk engine need a restart.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from google.cloud.firestore_v1.field_path import FieldPath
+from pydantic_core import from_json, to_json
+
+import database
+from firebase_config import (
+    db, SIGNALS_COLLECTION, ZONES_COLLECTION, USERS_COLLECTION, NOTIFICATIONS_COLLECTION, COUNTERS_COLLECTION,
+    STATS_COLLECTION, INCIDENTS_COLLECTION, SIGNALS_ARCHIVE_COLLECTION, NOTIFICATIONS_ARCHIVE_COLLECTION,
+)
+from settings import EXPORT_PAGE_SIZE, WRITE_BATCH_SIZE
+
+COLLECTIONS = (
+    SIGNALS_COLLECTION, ZONES_COLLECTION, USERS_COLLECTION, NOTIFICATIONS_COLLECTION, INCIDENTS_COLLECTION,
+    COUNTERS_COLLECTION, STATS_COLLECTION, SIGNALS_ARCHIVE_COLLECTION, NOTIFICATIONS_ARCHIVE_COLLECTION,
+)
+# Fields stored as Firestore timestamps.
+TIME_FIELDS = (database.CREATED_AT, database.UPDATED_AT, 'lastSeen', 'archivedAt')
+# Fields reseed leaves out of its comparison: seed times are relative to now, and zone counters follow the signals.
+RESEED_IGNORED_FIELDS = TIME_FIELDS + ('activeByRisk', 'signalCount', 'riskLevel')
+ID_FIELD = '_id'
+COMMIT_ATTEMPTS = 3
+
+
+# ---- Files ----
+
+def _is_ndjson(path: str) -> bool:
+    return path.endswith(('.ndjson', '.jsonl'))
+
+
+def _from_file(record: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """A file record as (document ID, document data)."""
+    doc_id = record.pop(ID_FIELD, None) or str(record['id'])
+    for field in TIME_FIELDS:
+        if isinstance(record.get(field), str):
+            record[field] = datetime.fromisoformat(record[field])
+    return doc_id, record
+
+
+def read_documents(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    with open(path, 'rb') as f:
+        if not _is_ndjson(path):
+            try:
+                records = from_json(f.read())
+            except ValueError as exc:
+                raise SystemExit(f"{path}: invalid JSON: {exc}")
+            for number, record in enumerate(records, 1):
+                try:
+                    yield _from_file(record)
+                except (ValueError, KeyError) as exc:
+                    raise SystemExit(f"{path}: document {number}: invalid document: {exc}")
+            return
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield _from_file(from_json(line))
+                except (ValueError, KeyError) as exc:
+                    raise SystemExit(f"{path}:{number}: invalid document: {exc}")
+
+
+def _stream_collection(collection: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Every document, a page at a time in ID order, so a long export doesn't outlive one query stream."""
+    last = None
+    while True:
+        query = db.collection(collection).order_by(FieldPath.document_id()).limit(EXPORT_PAGE_SIZE)
+        if last is not None:
+            query = query.start_after({FieldPath.document_id(): last})
+        docs = list(query.stream())
+        for doc in docs:
+            yield doc.id, doc.to_dict()
+        if len(docs) < EXPORT_PAGE_SIZE:
+            return
+        last = docs[-1].id
+
+
+def export_collection(collection: str, path: str) -> int:
+    count = 0
+    with open(path, 'wb') as f:
+        ndjson = _is_ndjson(path)
+        f.write(b'' if ndjson else b'[\n')
+        for doc_id, data in _stream_collection(collection):
+            if str(data.get('id')) != doc_id:
+                data = {ID_FIELD: doc_id, **data}
+            f.write((b'' if ndjson or not count else b',\n') + to_json(data))
+            f.write(b'\n' if ndjson else b'')
+            count += 1
+        f.write(b'' if ndjson else b'\n]\n')
+    return count
+
+
+# ---- Planning and writing ----
+
+class Plan:
+    """
+    What a load does to a collection: documents to create, update or delete, how many already
+    match, and how many are written without being compared.
+    """
+
+    def __init__(self):
+        self.created: List[str] = []
+        self.updated: List[Tuple[str, List[str]]] = []  # (ID, changed fields)
+        self.deleted: List[str] = []
+        self.unchanged = 0
+        self.overwritten = 0
+
+    def add(self, other: 'Plan') -> None:
+        self.created += other.created
+        self.updated += other.updated
+        self.deleted += other.deleted
+        self.unchanged += other.unchanged
+        self.overwritten += other.overwritten
+
+    @property
+    def writes(self) -> int:
+        return len(self.created) + len(self.updated) + len(self.deleted) + self.overwritten
+
+    def report(self, collection: str, show: int) -> str:
+        if self.overwritten:
+            return f"{collection}: {self.overwritten} written"
+        lines = [f"{collection}: {len(self.created)} to create, {len(self.updated)} to update, "
+                 f"{len(self.deleted)} to delete, {self.unchanged} unchanged"]
+        lines += [f"  + {doc_id}" for doc_id in self.created[:show]]
+        lines += [f"  ~ {doc_id} ({', '.join(fields)})" for doc_id, fields in self.updated[:show]]
+        lines += [f"  - {doc_id}" for doc_id in self.deleted[:show]]
+        return '\n'.join(lines)
+
+
+def _changed_fields(stored: Dict[str, Any], data: Dict[str, Any], ignored: Tuple[str, ...] = ()) -> List[str]:
+    return sorted(field for field in set(stored) | set(data) if field not in ignored and stored.get(field) != data.get(field))
+
+
+def _plan_chunk(collection: str, chunk: List[Tuple[str, Dict[str, Any]]], compare: bool,
+                ignored: Tuple[str, ...] = ()) -> Tuple[Plan, List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Plan one chunk; without compare every document is written. Fields in ignored don't count
+    as changes. Returns the plan and the writes.
+    """
+    plan = Plan()
+    if not compare:
+        plan.overwritten = len(chunk)
+        return plan, chunk
+    refs = [db.collection(collection).document(doc_id) for doc_id, _ in chunk]
+    stored = {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+    writes = []
+    for doc_id, data in chunk:
+        if doc_id not in stored:
+            plan.created.append(doc_id)
+        else:
+            fields = _changed_fields(stored[doc_id], data, ignored)
+            if not fields:
+                plan.unchanged += 1
+                continue
+            plan.updated.append((doc_id, fields))
+        writes.append((doc_id, data))
+    return plan, writes
+
+
+def _commit(collection: str, writes: List[Tuple[str, Dict[str, Any]]], deletes: List[str]) -> None:
+    for attempt in range(1, COMMIT_ATTEMPTS + 1):
+        batch = db.batch()
+        for doc_id, data in writes:
+            batch.set(db.collection(collection).document(doc_id), data)
+        for doc_id in deletes:
+            batch.delete(db.collection(collection).document(doc_id))
+        try:
+            batch.commit()
+            return
+        except Exception:
+            if attempt == COMMIT_ATTEMPTS:
+                raise
+            time.sleep(attempt)
+
+
+def _load_chunk(collection: str, chunk: List[Tuple[str, Dict[str, Any]]], compare: bool, dry_run: bool,
+                ignored: Tuple[str, ...]) -> Plan:
+    plan, writes = _plan_chunk(collection, chunk, compare, ignored)
+    if writes and not dry_run:
+        _commit(collection, writes, [])
+    return plan
+
+
+def _chunks(documents: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    documents = iter(documents)
+    while chunk := list(islice(documents, WRITE_BATCH_SIZE)):
+        yield chunk
+
+
+def load(collection: str, documents: Iterable[Tuple[str, Dict[str, Any]]], compare: bool, dry_run: bool,
+         workers: int, start: int = 0, on_progress=None, ignored: Tuple[str, ...] = ()) -> Plan:
+    """
+    Write documents in parallel batched commits and return what was done. ignored names fields
+    left out of the comparison. on_progress(n) is
+    called whenever the first n documents (counting the start skipped) are all committed;
+    chunks can finish out of order, so it only moves past a chunk once every earlier one has.
+    """
+    total = Plan()
+    done: Dict[int, int] = {}  # chunk start -> chunk end, for chunks finished ahead of their turn
+    committed = start
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='admin') as pool:
+        running: Dict[Future, Tuple[int, int]] = {}
+
+        def collect(finished: Iterable[Future]) -> None:
+            nonlocal committed
+            for future in finished:
+                chunk_start, chunk_end = running.pop(future)
+                total.add(future.result())
+                done[chunk_start] = chunk_end
+            while committed in done:
+                committed = done.pop(committed)
+                if on_progress is not None:
+                    on_progress(committed)
+
+        offset = start
+        for chunk in _chunks(islice(documents, start, None)):
+            # Keep only a few chunks in memory at once, however large the file.
+            if len(running) >= 2 * workers:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                collect(finished)
+            running[pool.submit(_load_chunk, collection, chunk, compare, dry_run, ignored)] = (offset, offset + len(chunk))
+            offset += len(chunk)
+        collect(wait(running).done)
+    return total
+
+
+def _after_load(collection: str, doc_ids: List[str]) -> None:
+    if collection in database.ID_PREFIXES and doc_ids:
+        print(f"{collection} counter: next ID {database.raise_counter(collection, doc_ids)}")
+    if collection == SIGNALS_COLLECTION:
+        print("Rebuilding dashboard stats...")
+        database.rebuild_stats()
+    if collection in (SIGNALS_COLLECTION, ZONES_COLLECTION):
+        print(f"Recounted signals in {database.rebuild_zone_counters()} zones")
+    if collection in (NOTIFICATIONS_COLLECTION, USERS_COLLECTION):
+        synced = database.sync_inboxes()
+        print(f"Inboxes: removed {synced['removed']}, refreshed {synced['refreshed']} and copied {synced['copied']} notifications")
+
+
+# ---- Progress ----
+
+def _progress_path(path: str, collection: str) -> str:
+    return f"{path}.{collection}.progress"
+
+
+def _read_progress(path: str) -> int:
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_progress(path: str, count: int) -> None:
+    # Written to a temporary file and renamed, so an interruption never leaves it half written.
+    with open(path + '.tmp', 'w') as f:
+        f.write(str(count))
+    os.replace(path + '.tmp', path)
+
+
+# ---- Commands ----
+
+def cmd_export(args) -> None:
+    started = time.perf_counter()
+    count = export_collection(args.collection, args.file)
+    print(f"Exported {count} {args.collection} documents to {args.file} in {time.perf_counter() - started:.1f}s")
+
+
+def cmd_import(args) -> None:
+    progress = _progress_path(args.file, args.collection)
+    start = _read_progress(progress) if args.resume else 0
+    if start:
+        print(f"Resuming after {start} documents")
+    written: List[str] = []
+
+    def documents() -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for doc_id, data in read_documents(args.file):
+            written.append(doc_id)
+            yield doc_id, data
+
+    started = time.perf_counter()
+    plan = load(args.collection, documents(), args.only_changed or args.dry_run, args.dry_run, args.workers, start,
+                None if args.dry_run else lambda count: _write_progress(progress, count))
+    print(plan.report(args.collection, args.show))
+    if args.dry_run:
+        print("Dry run: nothing was written")
+        return
+    print(f"Imported in {time.perf_counter() - started:.1f}s")
+    if os.path.exists(progress):
+        os.remove(progress)
+    if plan.writes:
+        _after_load(args.collection, written)
+
+
+def _stored_ids(collection: str) -> Set[str]:
+    return {doc.id for doc in db.collection(collection).select([]).stream()}
+
+
+def _delete(collection: str, doc_ids: List[str], workers: int) -> None:
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='admin') as pool:
+        for future in [pool.submit(_commit, collection, [], doc_ids[start:start + WRITE_BATCH_SIZE])
+                       for start in range(0, len(doc_ids), WRITE_BATCH_SIZE)]:
+            future.result()
+
+
+def cmd_diff(args) -> None:
+    documents = list(read_documents(args.file))
+    plan = load(args.collection, documents, True, True, args.workers)
+    plan.deleted = sorted(_stored_ids(args.collection) - {doc_id for doc_id, _ in documents})
+    print(plan.report(args.collection, args.show))
+
+
+def cmd_reseed(args) -> None:
+    seeds = database._seed_documents()
+    collections = list(seeds) if args.collection == 'all' else [args.collection]
+    for collection in collections:
+        if collection not in seeds:
+            raise SystemExit(f"No seed data for {collection}; seeded collections: {', '.join(seeds)}")
+        plan = load(collection, seeds[collection], True, args.dry_run, args.workers, ignored=RESEED_IGNORED_FIELDS)
+        plan.deleted = sorted(_stored_ids(collection) - {doc_id for doc_id, _ in seeds[collection]})
+        if plan.deleted and not args.dry_run:
+            _delete(collection, plan.deleted, args.workers)
+        print(plan.report(collection, args.show))
+        if not args.dry_run and (plan.writes or plan.deleted):
+            _after_load(collection, [doc_id for doc_id, _ in seeds[collection]])
+    if args.dry_run:
+        print("Dry run: nothing was written")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help='write a collection to a file')
+    export.add_argument('collection', choices=COLLECTIONS)
+    export.add_argument('file')
+    export.set_defaults(run=cmd_export)
+
+    load_args = argparse.ArgumentParser(add_help=False)
+    load_args.add_argument('--workers', type=int, default=8, help='batches committed at once')
+    load_args.add_argument('--show', type=int, default=20, help='document IDs listed per kind of change')
+
+    imports = commands.add_parser('import', parents=[load_args], help='write the documents in a file to a collection')
+    imports.add_argument('collection', choices=COLLECTIONS)
+    imports.add_argument('file')
+    imports.add_argument('--only-changed', action='store_true', help="skip documents that already match what's stored")
+    imports.add_argument('--dry-run', action='store_true', help='report what would be written without writing')
+    imports.add_argument('--resume', action='store_true', help='skip the documents an interrupted import committed')
+    imports.set_defaults(run=cmd_import)
+
+    diffs = commands.add_parser('diff', parents=[load_args], help='compare a file with a collection')
+    diffs.add_argument('collection', choices=COLLECTIONS)
+    diffs.add_argument('file')
+    diffs.set_defaults(run=cmd_diff)
+
+    reseed = commands.add_parser('reseed', parents=[load_args], help='replace a collection with the seed data')
+    reseed.add_argument('collection', choices=COLLECTIONS + ('all',))
+    reseed.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    reseed.set_defaults(run=cmd_reseed)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Async facade over database.py.
+
+Every function here has the same name and arguments as its counterpart in
+database.py, but runs on the bounded Firestore executor so route handlers
+can await it without blocking the event loop.
+"""
+import functools
+
+import database
+from db_executor import run
+
+
+def _offload(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+initialize_firestore = _offload(database.initialize_firestore)
+
+query_signals = _offload(database.query_signals)
+get_all_signals = _offload(database.get_all_signals)
+get_signal_by_id = _offload(database.get_signal_by_id)
+create_signal = _offload(database.create_signal)
+update_signal = _offload(database.update_signal)
+delete_signal = _offload(database.delete_signal)
+batch_update_signals = _offload(database.batch_update_signals)
+batch_delete_signals = _offload(database.batch_delete_signals)
+search_signals = _offload(database.search_signals)
+build_search_index = _offload(database.build_search_index)
+
+query_zones = _offload(database.query_zones)
+get_all_zones = _offload(database.get_all_zones)
+get_zone_by_id = _offload(database.get_zone_by_id)
+update_zone = _offload(database.update_zone)
+nearby_zones = _offload(database.nearby_zones)
+zone_risk = _offload(database.zone_risk)
+get_heatmap = _offload(database.get_heatmap)
+build_risk_engine = _offload(database.build_risk_engine)
+
+query_incidents = _offload(database.query_incidents)
+get_incident_by_id = _offload(database.get_incident_by_id)
+stop_incident_watch = _offload(database.stop_incident_watch)
+
+get_user_by_type = _offload(database.get_user_by_type)
+update_user = _offload(database.update_user)
+
+query_notifications = _offload(database.query_notifications)
+get_all_notifications = _offload(database.get_all_notifications)
+get_notification_by_id = _offload(database.get_notification_by_id)
+update_notification = _offload(database.update_notification)
+create_notification = _offload(database.create_notification)
+mark_all_notifications_read = _offload(database.mark_all_notifications_read)
+query_inbox = _offload(database.query_inbox)
+get_unread_count = _offload(database.get_unread_count)
+update_inbox_notification = _offload(database.update_inbox_notification)
+mark_inbox_read = _offload(database.mark_inbox_read)
+shutdown_fanout = _offload(database.shutdown_fanout)
+
+archive_old_documents = _offload(database.archive_old_documents)
+
+get_stats = _offload(database.get_stats)
@@ -0,0 +1,371 @@
+"""
+Load test for every /api route, run in-process against a Firestore stand-in.
+
+The FastAPI app from main.py is driven through httpx's ASGI transport, so no server or
+credentials are needed. firebase_config is replaced before the app is imported:
+
+  * by default with benchmarks/fake_firestore.py, an in-memory client that adds
+    --latency-ms to every simulated RPC and counts them;
+  * with --emulator HOST:PORT, by a real client talking to the Firestore emulator
+    (RPCs are not counted in that mode).
+
+The signals collection is preloaded with --signals documents, then each scenario sends
+--requests requests from --concurrency concurrent clients. Per scenario the report gives
+p50/p99 latency, throughput, errors, and Firestore RPCs and document reads per request.
+Run from the backend directory:
+
+    python benchmarks/api_load.py --signals 10000 --concurrency 32 --latency-ms 5
+    python benchmarks/api_load.py --signals 1000000 --scenarios signals.page signals.get
+    python benchmarks/api_load.py --json baseline.json     # machine-readable results
+    python benchmarks/api_load.py --scenarios signals.create --write-behind /tmp/signals.log
+
+Scenarios that read every signal (signals.list_all, the exports, mark-all-read over a
+large unread set) run --heavy-requests times instead. The SSE route /api/stream never completes, so
+it is measured as time to the first event: a signal is created and the client waits
+for it on the stream.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+COLLECTIONS = {
+    'SIGNALS_COLLECTION': 'signals',
+    'ZONES_COLLECTION': 'zones',
+    'USERS_COLLECTION': 'users',
+    'NOTIFICATIONS_COLLECTION': 'notifications',
+    'COUNTERS_COLLECTION': 'counters',
+    'STATS_COLLECTION': 'stats',
+    'INCIDENTS_COLLECTION': 'incidents',
+    'SIGNALS_ARCHIVE_COLLECTION': 'signals_archive',
+    'NOTIFICATIONS_ARCHIVE_COLLECTION': 'notifications_archive',
+    'INBOXES_COLLECTION': 'inboxes',
+}
+
+CATEGORIES = ['Safety', 'IT', 'Facilities', 'General']
+RISK_LEVELS = ['Low', 'Moderate', 'Critical']
+STATUSES = ['Open', 'Investigating', 'Resolved']
+CAMPUS = (19.1040, 72.8365)
+
+
+def install_firestore(latency: float, emulator: Optional[str]):
+    """Register a stand-in firebase_config module and return its client."""
+    if emulator:
+        os.environ['FIRESTORE_EMULATOR_HOST'] = emulator
+        from google.cloud import firestore
+        client = firestore.Client(project=os.getenv('GCLOUD_PROJECT', 'earlyshield-bench'))
+    else:
+        from fake_firestore import FakeFirestore
+        client = FakeFirestore(latency=latency)
+    module = types.ModuleType('firebase_config')
+    module.db = client
+    module.get_db = lambda: client
+    module.on_client_created = lambda hook: hook(client)
+    for name, value in COLLECTIONS.items():
+        setattr(module, name, value)
+    sys.modules['firebase_config'] = module
+    return client
+
+
+def make_signal(n: int, rng: random.Random, now: datetime) -> Dict[str, Any]:
+    signal = {
+        'id': f's{n}',
+        'title': f'Benchmark signal {n}',
+        'category': rng.choice(CATEGORIES),
+        'location': f'Block {n % 40}',
+        'timestamp': 'Just now',
+        'riskLevel': rng.choice(RISK_LEVELS),
+        'description': 'Generated by benchmarks/api_load.py',
+        'status': rng.choice(STATUSES),
+        'lat': CAMPUS[0] + rng.uniform(-0.003, 0.003),
+        'lng': CAMPUS[1] + rng.uniform(-0.003, 0.003),
+        'createdAt': now - timedelta(seconds=rng.uniform(0, 90 * 86400)),
+    }
+    signal['updatedAt'] = signal['createdAt']
+    return signal
+
+
+def seed_signals(client, count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    signals = (make_signal(n, rng, now) for n in range(1, count + 1))
+    if hasattr(client, 'load'):
+        client.load('signals', ((signal['id'], signal) for signal in signals))
+    else:
+        writer = client.bulk_writer()
+        for signal in signals:
+            writer.set(client.collection('signals').document(signal['id']), signal)
+        writer.close()
+    client.collection('counters').document('signals').set({'next': count + 1})
+
+
+def seed_users(client, count: int) -> None:
+    """Add count users, with empty inboxes, alongside the seeded profiles, so notifications fan out to count + 3 inboxes."""
+    batch = client.batch()
+    for n in range(1, count + 1):
+        batch.set(client.collection('users').document(f'bench{n}'), {'name': f'Bench user {n}', 'email': f'bench{n}@campus.edu', 'department': 'Bench'})
+        batch.set(client.collection('inboxes').document(f'bench{n}'), {'unread': 0, 'total': 0})
+        if n % 200 == 0:
+            batch.commit()
+            batch = client.batch()
+    batch.commit()
+
+
+@dataclass
+class Scenario:
+    name: str
+    # Builds (method, url, kwargs) for the i-th request.
+    request: Callable[[int], tuple]
+    heavy: bool = False
+    ok: tuple = (200,)
+
+
+@dataclass
+class Result:
+    name: str
+    requests: int
+    concurrency: int
+    seconds: float
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    rpcs: Dict[str, int] = field(default_factory=dict)
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def summary(self, billing_keys) -> Dict[str, Any]:
+        rpc_total = sum(v for k, v in self.rpcs.items() if k not in billing_keys)
+        return {
+            'scenario': self.name,
+            'requests': self.requests,
+            'concurrency': self.concurrency,
+            'p50_ms': round(self.percentile(50), 2),
+            'p99_ms': round(self.percentile(99), 2),
+            'mean_ms': round(statistics.fmean(self.latencies_ms), 2) if self.latencies_ms else 0.0,
+            'req_per_s': round(self.requests / self.seconds, 1) if self.seconds else 0.0,
+            'errors': self.errors,
+            'rpcs_per_req': round(rpc_total / self.requests, 2) if self.rpcs else None,
+            'reads_per_req': round(self.rpcs.get('documents_read', 0) / self.requests, 2) if self.rpcs else None,
+            'rpcs': self.rpcs,
+        }
+
+
+def build_scenarios(signal_count: int, seed: int, user_count: int = 0) -> List[Scenario]:
+    rng = random.Random(seed + 1)
+    # Mutating scenarios take IDs from disjoint ranges so they don't 404 on each other.
+    quarter = max(1, signal_count // 4)
+
+    def signal_id(i: int) -> str:
+        return f's{rng.randint(1, signal_count)}'
+
+    def ids_from(start: int, i: int, width: int) -> List[str]:
+        return [f's{start + (i * width + k) % quarter}' for k in range(width)]
+
+    def user_id(i: int) -> str:
+        return f'bench{i % user_count + 1}' if user_count else ('Admin', 'Student', 'Management')[i % 3]
+
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+    new_signal = {
+        'title': 'Load test', 'category': 'IT', 'location': 'Lab 3', 'riskLevel': 'Moderate',
+        'description': 'benchmark', 'lat': CAMPUS[0], 'lng': CAMPUS[1],
+    }
+    return [
+        Scenario('stats.get', lambda i: ('GET', '/api/stats', {})),
+        Scenario('signals.page', lambda i: ('GET', '/api/signals', {'params': {'limit': 100}})),
+        Scenario('signals.filtered', lambda i: ('GET', '/api/signals', {'params': {'status': 'Open', 'riskLevel': 'Critical', 'limit': 100}})),
+        Scenario('signals.recent', lambda i: ('GET', '/api/signals', {'params': {'since': week_ago, 'limit': 100}})),
+        Scenario('signals.projected', lambda i: ('GET', '/api/signals', {'params': {'fields': 'id,title,status', 'limit': 500}})),
+        Scenario('signals.search', lambda i: ('GET', '/api/signals/search', {'params': {'q': f'signal {rng.randint(1, signal_count)}'}})),
+        Scenario('signals.search_prefix', lambda i: ('GET', '/api/signals/search', {'params': {'q': f'bench block {i % 40}', 'status': 'Open'}})),
+        Scenario('signals.list_all', lambda i: ('GET', '/api/signals', {}), heavy=True),
+        Scenario('signals.export_csv', lambda i: ('GET', '/api/signals/export', {}), heavy=True),
+        Scenario('signals.export_ndjson', lambda i: ('GET', '/api/signals/export', {'params': {'format': 'ndjson'}}), heavy=True),
+        Scenario('signals.export_changes', lambda i: ('GET', '/api/signals/export', {'params': {'changedSince': week_ago}}), heavy=True),
+        Scenario('signals.get', lambda i: ('GET', f'/api/signals/{signal_id(i)}', {}), ok=(200, 404)),
+        Scenario('signals.create', lambda i: ('POST', '/api/signals', {'json': new_signal})),
+        Scenario('signals.ingest', lambda i: ('POST', '/api/signals:ingest', {'params': {'notify': 'false'}, 'json': [new_signal] * 50})),
+        Scenario('signals.update_status', lambda i: ('PATCH', f'/api/signals/{signal_id(i)}/status', {'json': {'status': rng.choice(STATUSES)}}), ok=(200, 404)),
+        Scenario('signals.batch_update', lambda i: ('POST', '/api/signals:batchUpdateStatus', {'json': {'ids': ids_from(1, i, 100), 'status': 'Investigating'}})),
+        Scenario('zones.list', lambda i: ('GET', '/api/zones', {})),
+        Scenario('zones.filtered', lambda i: ('GET', '/api/zones', {'params': {'riskLevel': 'Critical', 'limit': 50}})),
+        Scenario('zones.get', lambda i: ('GET', f'/api/zones/z{i % 10 + 1}', {})),
+        Scenario('zones.risk', lambda i: ('GET', '/api/zones/risk', {})),
+        Scenario('zones.heatmap', lambda i: ('GET', '/api/zones/heatmap', {})),
+        Scenario('zones.nearby', lambda i: ('GET', '/api/zones/nearby', {'params': {'lat': CAMPUS[0], 'lng': CAMPUS[1], 'radius': 500}})),
+        Scenario('zones.update', lambda i: ('PATCH', f'/api/zones/z{i % 10 + 1}', {'json': {'details': f'Checked {i}'}})),
+        Scenario('users.get', lambda i: ('GET', f'/api/users/{("Admin", "Student", "Management")[i % 3]}', {})),
+        Scenario('users.update', lambda i: ('PATCH', '/api/users/Student', {'json': {'department': f'Dept {i % 7}'}})),
+        Scenario('notifications.list', lambda i: ('GET', '/api/notifications', {'params': {'limit': 50}})),
+        Scenario('notifications.recent', lambda i: ('GET', '/api/notifications', {'params': {'order': 'newest', 'limit': 50}})),
+        Scenario('notifications.unread', lambda i: ('GET', '/api/notifications', {'params': {'read': 'false', 'limit': 50}})),
+        Scenario('notifications.mark_read', lambda i: ('PATCH', f'/api/notifications/{i % 5 + 1}/read', {'json': {'read': True}}), ok=(200, 404)),
+        Scenario('notifications.mark_all_read', lambda i: ('POST', '/api/notifications/mark-all-read', {}), heavy=True),
+        Scenario('notifications.unread_count', lambda i: ('GET', '/api/notifications/unread-count', {'params': {'user': user_id(i)}})),
+        Scenario('notifications.inbox', lambda i: ('GET', '/api/notifications', {'params': {'user': user_id(i), 'read': 'false', 'limit': 50}})),
+        Scenario('notifications.inbox_mark_read', lambda i: ('PATCH', f'/api/notifications/{i % 5 + 1}/read', {'params': {'user': user_id(i)}, 'json': {'read': True}}), ok=(200, 404)),
+        Scenario('notifications.fan_out', lambda i: ('POST', '/api/signals', {'json': {**new_signal, 'riskLevel': 'Critical', 'title': f'Fan-out {i} {rng.random()}'}})),
+        Scenario('signals.delete', lambda i: ('DELETE', f'/api/signals/s{quarter + 1 + i}', {}), ok=(200, 404)),
+        Scenario('signals.batch_delete', lambda i: ('POST', '/api/signals:batchDelete', {'json': {'ids': ids_from(2 * quarter + 1, i, 100)}})),
+    ]
+
+
+async def run_scenario(client, fake, scenario: Scenario, requests: int, concurrency: int) -> Result:
+    result = Result(scenario.name, requests, concurrency, 0.0)
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            method, url, kwargs = scenario.request(index)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            result.latencies_ms.append((time.perf_counter() - start) * 1000)
+            if response.status_code not in scenario.ok:
+                result.errors += 1
+
+    if fake is not None:
+        fake.stats.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    result.seconds = time.perf_counter() - start
+    if fake is not None:
+        result.rpcs = fake.stats.snapshot()
+    return result
+
+
+async def run_stream_scenario(client, fake, requests: int) -> Result:
+    """Time from creating a signal to receiving its event on /api/stream."""
+    from live_feed import feed
+
+    result = Result('stream.first_event', requests, 1, 0.0)
+    feed.start(asyncio.get_running_loop())
+    subscription = feed.subscribe({'signals'})
+    body = {'title': 'Stream probe', 'category': 'IT', 'location': 'Lab', 'riskLevel': 'Low', 'description': 'benchmark'}
+    if fake is not None:
+        fake.stats.reset()
+    start_all = time.perf_counter()
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.post('/api/signals', json=body)
+            try:
+                await asyncio.wait_for(subscription.queue.get(), timeout=5)
+            except asyncio.TimeoutError:
+                result.errors += 1
+                continue
+            if response.status_code != 200:
+                result.errors += 1
+            result.latencies_ms.append((time.perf_counter() - start) * 1000)
+    finally:
+        feed.unsubscribe(subscription)
+    result.seconds = time.perf_counter() - start_all
+    if fake is not None:
+        result.rpcs = fake.stats.snapshot()
+    return result
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    header = f"{'scenario':<30} {'reqs':>6} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'err':>5} {'rpc/req':>8} {'reads/req':>10}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        rpcs = '-' if row['rpcs_per_req'] is None else f"{row['rpcs_per_req']:.2f}"
+        reads = '-' if row['reads_per_req'] is None else f"{row['reads_per_req']:.1f}"
+        print(f"{row['scenario']:<30} {row['requests']:>6} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+              f"{row['req_per_s']:>9.1f} {row['errors']:>5} {rpcs:>8} {reads:>10}")
+
+
+async def main_async(args) -> List[Dict[str, Any]]:
+    client = install_firestore(args.latency_ms / 1000, args.emulator)
+    fake = client if hasattr(client, 'stats') else None
+    if args.write_behind:
+        os.environ['WRITE_BEHIND_LOG'] = args.write_behind
+
+    import httpx
+    import main
+    from fake_firestore import BILLING_KEYS
+
+    latency = args.latency_ms / 1000
+    if fake is not None:
+        # Seed and start up without simulated latency; it only applies to measured requests.
+        fake.latency = 0.0
+    started = time.perf_counter()
+    seed_signals(client, args.signals, args.seed)
+    print(f"Seeded {args.signals} signals in {time.perf_counter() - started:.1f}s")
+
+    scenarios = build_scenarios(args.signals, args.seed, args.users)
+    if args.scenarios:
+        known = {s.name for s in scenarios} | {'stream.first_event'}
+        unknown = set(args.scenarios) - known
+        if unknown:
+            raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}. Known: {', '.join(sorted(known))}")
+        scenarios = [s for s in scenarios if s.name in args.scenarios]
+
+    rows = []
+    async with main.app.router.lifespan_context(main.app):
+        # The search index and risk engine build in the background; measure against the finished ones.
+        while (main.SEARCH_INDEX_ENABLED and not main.signal_search.ready.is_set()) or not main.risk_engine.ready.is_set():
+            await asyncio.sleep(0.05)
+        if args.users:
+            # After startup, which only seeds the default users into an empty collection.
+            seed_users(client, args.users)
+            main.cache.users_cache.invalidate(main.cache.ALL)
+        if fake is not None:
+            fake.latency = latency
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as http:
+            for scenario in scenarios:
+                requests = args.heavy_requests if scenario.heavy else args.requests
+                result = await run_scenario(http, fake, scenario, requests, args.concurrency)
+                rows.append(result.summary(BILLING_KEYS))
+            if not args.scenarios or 'stream.first_event' in args.scenarios:
+                result = await run_stream_scenario(http, fake, min(args.requests, 50))
+                rows.append(result.summary(BILLING_KEYS))
+        if fake is not None:
+            fake.latency = 0.0
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signals', type=int, default=10_000, help='signals preloaded before the run')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--heavy-requests', type=int, default=5, help='requests for full-collection scenarios')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--latency-ms', type=float, default=2.0, help='simulated latency per Firestore RPC')
+    parser.add_argument('--emulator', metavar='HOST:PORT', help='use the Firestore emulator instead of the in-process fake')
+    parser.add_argument('--scenarios', nargs='+', help='run only these scenarios')
+    parser.add_argument('--write-behind', metavar='PATH', help='acknowledge signal creates from a write-behind log at PATH')
+    parser.add_argument('--users', type=int, default=0, help='users added to the default three, for inbox fan-out')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    rows = asyncio.run(main_async(args))
+    print(f"\nsignals={args.signals} concurrency={args.concurrency} latency={args.latency_ms}ms "
+          f"backend={'emulator ' + args.emulator if args.emulator else 'fake'}")
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Throughput of blocking Firestore calls made directly from async handlers versus
+through the bounded executor in db_executor.py, as the number of concurrent
+clients grows.
+
+A Firestore round trip is simulated with time.sleep so the benchmark runs
+without credentials. Run from the backend directory:
+
+    python benchmarks/async_db_throughput.py --latency-ms 40 --requests 400
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_executor
+
+
+def fake_firestore_call(latency: float) -> dict:
+    time.sleep(latency)
+    return {'id': 's1'}
+
+
+async def _blocking_handler(latency: float) -> dict:
+    return fake_firestore_call(latency)
+
+
+async def _offloaded_handler(latency: float) -> dict:
+    return await db_executor.run(fake_firestore_call, latency)
+
+
+async def _drive(handler, clients: int, total_requests: int, latency: float) -> float:
+    remaining = total_requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await handler(latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return total_requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=40.0, help='simulated Firestore round trip')
+    parser.add_argument('--requests', type=int, default=400, help='requests per run')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16, 64, 128])
+    parser.add_argument('--max-concurrency', type=int, default=db_executor.FIRESTORE_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    print(f"latency={args.latency_ms}ms requests={args.requests} max_concurrency={args.max_concurrency}")
+    print(f"{'clients':>8} {'blocking req/s':>16} {'offloaded req/s':>16} {'speedup':>8}")
+    for clients in args.clients:
+        blocking = asyncio.run(_drive(_blocking_handler, clients, args.requests, latency))
+        db_executor.configure(args.max_concurrency)
+        offloaded = asyncio.run(_drive(_offloaded_handler, clients, args.requests, latency))
+        print(f"{clients:>8} {blocking:>16.1f} {offloaded:>16.1f} {offloaded / blocking:>7.1f}x")
+    db_executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,710 @@
+"""
+In-process stand-in for the part of the google-cloud-firestore client the backend uses,
+with a configurable per-RPC latency and a count of every simulated RPC.
+
+It covers collections, documents, queries (FieldFilter, order_by, start_after, select,
+limit), batches, transactions driven by firestore.transactional, BulkWriter, write
+preconditions, transforms and on_snapshot listeners, closely enough for database.py,
+cache.py and live_feed.py to run against it unmodified. Documents are kept per
+collection in ID order, so paginated queries cost the page, not the collection, even
+with a million documents loaded.
+"""
+import bisect
+import copy
+import datetime
+import itertools
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1._helpers import ReadAfterWriteError
+from google.cloud.firestore_v1.watch import ChangeType
+
+DIRECTION_ASC = 'ASCENDING'
+DIRECTION_DESC = 'DESCENDING'
+DOCUMENT_ID = '__name__'
+
+# Counted RPC kinds; documents_read / documents_written are billing units, not RPCs.
+BILLING_KEYS = ('documents_read', 'documents_written')
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'not-in': lambda a, b: a not in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+    'array_contains_any': lambda a, b: isinstance(a, list) and any(x in a for x in b),
+}
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _get_field(data: Dict[str, Any], path: str) -> Any:
+    value: Any = data
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _set_field(data: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split('.')
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def _delete_field(data: Dict[str, Any], path: str) -> None:
+    parts = path.split('.')
+    for part in parts[:-1]:
+        data = data.get(part, {})
+    data.pop(parts[-1], None)
+
+
+def _apply_value(data: Dict[str, Any], path: str, value: Any) -> None:
+    if value is transforms.DELETE_FIELD:
+        _delete_field(data, path)
+    elif value is transforms.SERVER_TIMESTAMP:
+        _set_field(data, path, _now())
+    elif isinstance(value, transforms.Increment):
+        current = _get_field(data, path)
+        _set_field(data, path, (current if isinstance(current, (int, float)) else 0) + value.value)
+    elif isinstance(value, transforms.ArrayUnion):
+        current = list(_get_field(data, path) or [])
+        current.extend(v for v in value.values if v not in current)
+        _set_field(data, path, current)
+    elif isinstance(value, transforms.ArrayRemove):
+        current = _get_field(data, path) or []
+        _set_field(data, path, [v for v in current if v not in value.values])
+    else:
+        _set_field(data, path, copy.deepcopy(value))
+
+
+def _project(data: Dict[str, Any], field_paths: Iterable[str]) -> Dict[str, Any]:
+    projected: Dict[str, Any] = {}
+    for field in field_paths:
+        value = _get_field(data, field)
+        if value is not None:
+            _set_field(projected, field, copy.deepcopy(value))
+    return projected
+
+
+class RpcStats:
+    """Thread-safe counters of simulated Firestore RPCs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Counter = Counter()
+
+    def record(self, kind: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[kind] += n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts.clear()
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = _now()
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        return copy.deepcopy(_get_field(self._data, field_path))
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class _WriteOption:
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+
+class _Collection:
+    """One collection's documents: id -> [data, create_time, update_time], plus a sorted ID list."""
+
+    def __init__(self):
+        self.docs: Dict[str, list] = {}
+        self._ids: Optional[List[str]] = None
+
+    def sorted_ids(self) -> List[str]:
+        if self._ids is None:
+            self._ids = sorted(self.docs)
+        return self._ids
+
+    def put(self, doc_id: str, data: Dict[str, Any], now) -> None:
+        entry = self.docs.get(doc_id)
+        if entry is None:
+            self.docs[doc_id] = [data, now, now]
+            if self._ids is not None:
+                bisect.insort(self._ids, doc_id)
+        else:
+            entry[0], entry[2] = data, now
+
+    def remove(self, doc_id: str) -> None:
+        if self.docs.pop(doc_id, None) is not None and self._ids is not None:
+            index = bisect.bisect_left(self._ids, doc_id)
+            if index < len(self._ids) and self._ids[index] == doc_id:
+                del self._ids[index]
+
+
+def _split(path: str) -> Tuple[str, str]:
+    parent, _, doc_id = path.rpartition('/')
+    return parent, doc_id
+
+
+class FakeFirestore:
+    """In-memory Firestore client. ``latency`` seconds are added to every simulated RPC."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.stats = RpcStats()
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.RLock()
+        self._listeners: List['_Listener'] = []
+        self._txn_lock = threading.RLock()
+        self._ids = itertools.count(1)
+        # Called as listener(rpc, documents_read, documents_written) for every simulated RPC.
+        self.rpc_listeners: List[Callable[[str, int, int], None]] = []
+
+    # -- client surface --
+
+    def collection(self, *path: str) -> 'CollectionReference':
+        return CollectionReference(self, '/'.join(path))
+
+    def document(self, *path: str) -> 'DocumentReference':
+        parent, doc_id = _split('/'.join(path))
+        return DocumentReference(self, parent, doc_id)
+
+    def batch(self) -> 'WriteBatch':
+        return WriteBatch(self)
+
+    def bulk_writer(self, options=None) -> 'BulkWriter':
+        return BulkWriter(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> 'Transaction':
+        return Transaction(self, max_attempts=max_attempts)
+
+    def write_option(self, **kwargs) -> _WriteOption:
+        return _WriteOption(**kwargs)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        self._rpc('batch_get', reads=len(references))
+        return [ref._snapshot(field_paths) for ref in references]
+
+    def collections(self):
+        self._rpc('list_collections')
+        with self._lock:
+            names = sorted(path for path in self._collections if '/' not in path)
+        return [self.collection(name) for name in names]
+
+    def close(self) -> None:
+        pass
+
+    # -- benchmark helpers --
+
+    def load(self, collection: str, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Insert (id, data) pairs directly, without RPCs, latency or listeners. Returns the count."""
+        now = _now()
+        count = 0
+        with self._lock:
+            store = self._collections.setdefault(collection, _Collection())
+            for doc_id, data in documents:
+                store.docs[doc_id] = [data, now, now]
+                count += 1
+            store._ids = None
+        return count
+
+    def size(self, collection: str) -> int:
+        with self._lock:
+            store = self._collections.get(collection)
+            return len(store.docs) if store else 0
+
+    # -- internals --
+
+    def _rpc(self, kind: str, reads: int = 0, writes: int = 0) -> None:
+        self.stats.record(kind)
+        if reads:
+            self.stats.record('documents_read', reads)
+        if writes:
+            self.stats.record('documents_written', writes)
+        for listener in self.rpc_listeners:
+            listener(kind, reads, writes)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _entry(self, path: str) -> Optional[list]:
+        parent, doc_id = _split(path)
+        store = self._collections.get(parent)
+        return store.docs.get(doc_id) if store else None
+
+    def _apply_writes(self, writes: List[tuple]) -> List[WriteResult]:
+        """Validate and apply a list of writes atomically."""
+        with self._lock:
+            now = _now()
+            staged: Dict[str, Optional[Dict[str, Any]]] = {}
+            for op, path, data, option in writes:
+                entry = self._entry(path)
+                current = staged[path] if path in staged else (entry[0] if entry else None)
+                if option is not None:
+                    if option.exists is True and current is None:
+                        raise exceptions.NotFound(f'No document to update: {path}')
+                    if option.exists is False and current is not None:
+                        raise exceptions.Conflict(f'Document already exists: {path}')
+                    if option.last_update_time is not None and (entry is None or entry[2] != option.last_update_time):
+                        raise exceptions.FailedPrecondition(f'Update time mismatch: {path}')
+                if op in ('create', 'set'):
+                    if op == 'create' and current is not None:
+                        raise exceptions.Conflict(f'Document already exists: {path}')
+                    new: Optional[Dict[str, Any]] = {}
+                    for key, value in data.items():
+                        _apply_value(new, key, value)
+                elif op in ('merge', 'update'):
+                    if op == 'update' and current is None:
+                        raise exceptions.NotFound(f'No document to update: {path}')
+                    new = copy.deepcopy(current) if current is not None else {}
+                    for key, value in data.items():
+                        _apply_value(new, key, value)
+                else:
+                    new = None
+                staged[path] = new
+
+            changes = []
+            for path, new in staged.items():
+                parent, doc_id = _split(path)
+                store = self._collections.setdefault(parent, _Collection())
+                old = store.docs.get(doc_id)
+                if new is None:
+                    if old is not None:
+                        store.remove(doc_id)
+                        changes.append((ChangeType.REMOVED, path, old[0]))
+                    continue
+                store.put(doc_id, new, now)
+                changes.append((ChangeType.ADDED if old is None else ChangeType.MODIFIED, path, new))
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener.notify(changes)
+        return [WriteResult(now) for _ in writes]
+
+
+class DocumentReference:
+    def __init__(self, client: FakeFirestore, parent_path: str, doc_id: str):
+        self._client = client
+        self._parent_path = parent_path
+        self.id = doc_id
+        self.path = f'{parent_path}/{doc_id}'
+
+    @property
+    def parent(self) -> 'CollectionReference':
+        return CollectionReference(self._client, self._parent_path)
+
+    def collection(self, name: str) -> 'CollectionReference':
+        return CollectionReference(self._client, f'{self.path}/{name}')
+
+    def _snapshot(self, field_paths=None) -> DocumentSnapshot:
+        with self._client._lock:
+            entry = self._client._entry(self.path)
+            if entry is None:
+                return DocumentSnapshot(self, None)
+            data = _project(entry[0], field_paths) if field_paths is not None else copy.deepcopy(entry[0])
+            return DocumentSnapshot(self, data, entry[1], entry[2])
+
+    def get(self, field_paths=None, transaction=None) -> DocumentSnapshot:
+        if transaction is not None:
+            return transaction.get(self)
+        self._client._rpc('get', reads=1)
+        return self._snapshot(field_paths)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False) -> WriteResult:
+        self._client._rpc('commit', writes=1)
+        return self._client._apply_writes([('merge' if merge else 'set', self.path, document_data, None)])[0]
+
+    def create(self, document_data: Dict[str, Any]) -> WriteResult:
+        self._client._rpc('commit', writes=1)
+        return self._client._apply_writes([('create', self.path, document_data, None)])[0]
+
+    def update(self, field_updates: Dict[str, Any], option=None) -> WriteResult:
+        self._client._rpc('commit', writes=1)
+        return self._client._apply_writes([('update', self.path, field_updates, option)])[0]
+
+    def delete(self, option=None) -> datetime.datetime:
+        self._client._rpc('commit', writes=1)
+        return self._client._apply_writes([('delete', self.path, None, option)])[0].update_time
+
+    def on_snapshot(self, callback: Callable) -> '_Listener':
+        return _Listener(self._client, self._parent_path, callback, doc_path=self.path)
+
+
+class Query:
+    def __init__(self, client: FakeFirestore, collection_path: str, filters=(), orders=(),
+                 limit_=None, cursor=None, projection=None):
+        self._client = client
+        self._path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy(self, **changes) -> 'Query':
+        state = dict(filters=self._filters, orders=self._orders, limit_=self._limit,
+                     cursor=self._cursor, projection=self._projection)
+        state.update(changes)
+        return Query(self._client, self._path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None) -> 'Query':
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = DIRECTION_ASC) -> 'Query':
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> 'Query':
+        return self._copy(limit_=count)
+
+    def start_after(self, document_fields_or_snapshot) -> 'Query':
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def select(self, field_paths) -> 'Query':
+        return self._copy(projection=list(field_paths))
+
+    def _matches(self, doc_id: str, data: Dict[str, Any]) -> bool:
+        for field, op, value in self._filters:
+            actual = doc_id if field == DOCUMENT_ID else _get_field(data, field)
+            if actual is None and op not in ('==', '!=', 'not-in'):
+                return False
+            if not _OPS[op](actual, value):
+                return False
+        return True
+
+    def _by_id_only(self) -> bool:
+        return all(field == DOCUMENT_ID and direction == DIRECTION_ASC for field, direction in self._orders)
+
+    def _run(self) -> List[Tuple[str, Dict[str, Any], list]]:
+        """Matching (id, data, entry) rows in query order. data is the stored dict; callers copy it."""
+        with self._client._lock:
+            store = self._client._collections.get(self._path)
+            if store is None:
+                return []
+            if self._by_id_only():
+                # Walk IDs in order from the cursor and stop at the limit, like an index scan.
+                ids = store.sorted_ids()
+                start = 0
+                if self._cursor is not None:
+                    after = self._cursor.id if isinstance(self._cursor, DocumentSnapshot) else next(iter(self._cursor.values()))
+                    start = bisect.bisect_right(ids, after)
+                rows = []
+                for doc_id in itertools.islice(ids, start, None):
+                    entry = store.docs[doc_id]
+                    if self._matches(doc_id, entry[0]):
+                        rows.append((doc_id, entry[0], entry))
+                        if self._limit is not None and len(rows) >= self._limit:
+                            break
+                return rows
+
+            rows = [(doc_id, entry[0], entry) for doc_id, entry in store.docs.items() if self._matches(doc_id, entry[0])]
+        rows.sort(key=lambda row: row[0])
+        for field, direction in reversed(self._orders):
+            rows.sort(
+                key=lambda row: (row[0] if field == DOCUMENT_ID else _get_field(row[1], field)) or '',
+                reverse=direction == DIRECTION_DESC,
+            )
+        if self._cursor is not None:
+            fields = [field for field, _ in self._orders] or [DOCUMENT_ID]
+            cursor = self._cursor.to_dict() if isinstance(self._cursor, DocumentSnapshot) else self._cursor
+            values = [cursor.get(field) for field in fields]
+            descending = bool(self._orders) and self._orders[0][1] == DIRECTION_DESC
+
+            def after(row) -> bool:
+                key = [row[0] if field == DOCUMENT_ID else _get_field(row[1], field) for field in fields]
+                return key < values if descending else key > values
+
+            rows = [row for row in rows if after(row)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return rows
+
+    def stream(self, transaction=None):
+        rows = self._run()
+        self._client._rpc('run_query', reads=max(1, len(rows)))
+        for doc_id, data, entry in rows:
+            ref = DocumentReference(self._client, self._path, doc_id)
+            payload = _project(data, self._projection) if self._projection is not None else copy.deepcopy(data)
+            yield DocumentSnapshot(ref, payload, entry[1], entry[2])
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def count(self, alias=None):
+        query = self
+
+        class _Aggregation:
+            def get(self, transaction=None):
+                total = len(query._run())
+                query._client._rpc('run_aggregation_query', reads=max(1, total // 1000))
+                return [[SimpleNamespace(alias=alias or 'count', value=total)]]
+
+        return _Aggregation()
+
+    def on_snapshot(self, callback: Callable) -> '_Listener':
+        return _Listener(self._client, self._path, callback, query=self)
+
+
+class CollectionReference(Query):
+    def __init__(self, client: FakeFirestore, path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        if document_id is None:
+            document_id = f'auto{next(self._client._ids):016d}'
+        return DocumentReference(self._client, self._path, document_id)
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+    def list_documents(self):
+        with self._client._lock:
+            store = self._client._collections.get(self._path)
+            ids = list(store.sorted_ids()) if store else []
+        return [DocumentReference(self._client, self._path, doc_id) for doc_id in ids]
+
+
+class WriteBatch:
+    def __init__(self, client: FakeFirestore):
+        self._client = client
+        self._writes: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> None:
+        self._writes.append(('create', reference.path, document_data, None))
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append(('merge' if merge else 'set', reference.path, document_data, None))
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any], option=None) -> None:
+        self._writes.append(('update', reference.path, field_updates, option))
+
+    def delete(self, reference: DocumentReference, option=None) -> None:
+        self._writes.append(('delete', reference.path, None, option))
+
+    def commit(self, retry=None, timeout=None) -> List[WriteResult]:
+        if len(self._writes) > 500:
+            raise exceptions.InvalidArgument('maximum 500 writes allowed per request')
+        self._client._rpc('commit', writes=len(self._writes))
+        results = self._client._apply_writes(self._writes)
+        self._writes = []
+        return results
+
+
+class BulkWriter:
+    """Sends writes in batches of 20 and applies each one independently, like the real BulkWriter."""
+
+    def __init__(self, client: FakeFirestore):
+        self._client = client
+        self._pending: List[tuple] = []
+        self._error_callback = None
+
+    def on_write_error(self, callback: Callable) -> None:
+        self._error_callback = callback
+
+    def _enqueue(self, op, reference, data=None, option=None) -> None:
+        self._pending.append((op, reference.path, data, option))
+        if len(self._pending) >= 20:
+            self.flush()
+
+    def create(self, reference, document_data) -> None:
+        self._enqueue('create', reference, document_data)
+
+    def set(self, reference, document_data, merge: bool = False) -> None:
+        self._enqueue('merge' if merge else 'set', reference, document_data)
+
+    def update(self, reference, field_updates, option=None) -> None:
+        self._enqueue('update', reference, field_updates, option)
+
+    def delete(self, reference, option=None) -> None:
+        self._enqueue('delete', reference, None, option)
+
+    def flush(self) -> None:
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self._client._rpc('batch_write', writes=len(pending))
+        for write in pending:
+            try:
+                self._client._apply_writes([write])
+            except exceptions.GoogleAPICallError as exc:
+                if self._error_callback is None:
+                    raise
+                self._error_callback(SimpleNamespace(message=str(exc), operation=write), self)
+
+    def close(self) -> None:
+        self.flush()
+
+
+class Transaction:
+    """Serialises transactions on one client-wide lock; enough for firestore.transactional."""
+
+    def __init__(self, client: FakeFirestore, max_attempts: int = 5):
+        self._client = client
+        self._max_attempts = max_attempts
+        self._id = None
+        self._writes: List[tuple] = []
+        self._locked = False
+        self._read_only = False
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+        if self._locked:
+            self._locked = False
+            self._client._txn_lock.release()
+
+    def _begin(self, retry_id=None) -> None:
+        self._client._txn_lock.acquire()
+        self._locked = True
+        self._client._rpc('begin_transaction')
+        self._id = next(self._client._ids)
+
+    def _rollback(self) -> None:
+        if self.in_progress:
+            self._client._rpc('rollback')
+        self._clean_up()
+
+    def _commit(self) -> List[WriteResult]:
+        try:
+            if len(self._writes) > 500:
+                raise exceptions.InvalidArgument('maximum 500 writes allowed per request')
+            self._client._rpc('commit', writes=len(self._writes))
+            return self._client._apply_writes(self._writes)
+        finally:
+            self._clean_up()
+
+    def _check_read(self) -> None:
+        if self._writes:
+            raise ReadAfterWriteError('Attempted read after write in a transaction.')
+
+    def get(self, ref_or_query, **kwargs):
+        self._check_read()
+        if isinstance(ref_or_query, DocumentReference):
+            self._client._rpc('get', reads=1)
+            return ref_or_query._snapshot()
+        return ref_or_query.stream()
+
+    def get_all(self, references, **kwargs):
+        self._check_read()
+        return self._client.get_all(references)
+
+    def create(self, reference, document_data) -> None:
+        self._writes.append(('create', reference.path, document_data, None))
+
+    def set(self, reference, document_data, merge: bool = False) -> None:
+        self._writes.append(('merge' if merge else 'set', reference.path, document_data, None))
+
+    def update(self, reference, field_updates, option=None) -> None:
+        self._writes.append(('update', reference.path, field_updates, option))
+
+    def delete(self, reference, option=None) -> None:
+        self._writes.append(('delete', reference.path, None, option))
+
+
+class _DocumentChange:
+    def __init__(self, type_, document, old_index=-1, new_index=-1):
+        self.type = type_
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
+
+
+class _Listener:
+    """Delivers on_snapshot callbacks synchronously after each committed write."""
+
+    def __init__(self, client: FakeFirestore, collection_path: str, callback: Callable,
+                 query: Optional[Query] = None, doc_path: Optional[str] = None):
+        self._client = client
+        self._collection_path = collection_path
+        self._callback = callback
+        self._query = query
+        self._doc_path = doc_path
+        client._rpc('listen')
+        with client._lock:
+            client._listeners.append(self)
+        if doc_path is not None:
+            parent, doc_id = _split(doc_path)
+            callback([DocumentReference(client, parent, doc_id)._snapshot()], [], _now())
+        else:
+            # The initial snapshot only needs to exist; the backend's listeners skip it.
+            callback([], [], _now())
+
+    def notify(self, changes) -> None:
+        relevant = []
+        for change_type, path, data in changes:
+            parent, doc_id = _split(path)
+            if self._doc_path is not None:
+                if path != self._doc_path:
+                    continue
+            elif parent != self._collection_path:
+                continue
+            elif self._query is not None and data is not None and not self._query._matches(doc_id, data):
+                continue
+            ref = DocumentReference(self._client, parent, doc_id)
+            relevant.append(_DocumentChange(change_type, DocumentSnapshot(ref, copy.deepcopy(data))))
+        if relevant:
+            self._callback([change.document for change in relevant], relevant, _now())
+
+    def unsubscribe(self) -> None:
+        with self._client._lock:
+            if self in self._client._listeners:
+                self._client._listeners.remove(self)
+
+    close = unsubscribe
@@ -0,0 +1,173 @@
+"""
+In-process read-through cache for rarely changing Firestore documents.
+
+Each ReadThroughCache holds one collection's entries with its own TTL and LRU size bound.
+Concurrent misses on the same key are collapsed into a single load (single flight).
+Entries are dropped by this process's own writes (database.py calls invalidate) and by
+on_snapshot listeners, so writes from other processes show up without waiting for the TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List
+
+from firebase_config import db, ZONES_COLLECTION, USERS_COLLECTION
+from settings import CACHE_MAX_ENTRIES, CACHE_TTL_USERS, CACHE_TTL_ZONES
+import response_cache
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException = None
+
+
+class ReadThroughCache:
+    def __init__(self, name: str, ttl: float, max_entries: int = CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load that started before one doesn't store its result.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.loads = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return a copy of the cached value for key, calling loader on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+                self.expirations += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            flight.value = loader()
+            self.loads += 1
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and generation == self._generation:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return copy.deepcopy(flight.value)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value this process just wrote, superseding any load still in flight."""
+        with self._lock:
+            self._generation += 1
+            self._store(key, copy.deepcopy(value))
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+# Keys used for the cached full-collection list and list of document IDs, next to per-document keys.
+ALL = ('__all__',)
+IDS = ('__ids__',)
+
+zones_cache = ReadThroughCache(ZONES_COLLECTION, ttl=CACHE_TTL_ZONES)
+users_cache = ReadThroughCache(USERS_COLLECTION, ttl=CACHE_TTL_USERS)
+
+CACHES = {cache.name: cache for cache in (zones_cache, users_cache)}
+
+_watches: List[Any] = []
+
+
+def _invalidating_listener(cache: ReadThroughCache):
+    initial = True
+
+    def on_snapshot(docs, changes, read_time):
+        nonlocal initial
+        if initial:
+            initial = False
+            return
+        cache.invalidate(ALL, IDS, *(change.document.id for change in changes))
+        response_cache.bump(cache.name)
+
+    return on_snapshot
+
+
+def start_invalidation_listeners() -> None:
+    """Watch each cached collection so changes made by other processes evict entries here too."""
+    if _watches:
+        return
+    for cache in CACHES.values():
+        _watches.append(db.collection(cache.name).on_snapshot(_invalidating_listener(cache)))
+    # Entries loaded before a listener attached may have missed changes it won't report.
+    for cache in CACHES.values():
+        cache.clear()
+        response_cache.bump(cache.name)
+
+
+def stop_invalidation_listeners() -> None:
+    for watch in _watches:
+        watch.unsubscribe()
+    _watches.clear()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -0,0 +1,174 @@
+"""
+Incremental clustering of signals into incidents.
+
+A signal's title and description become a hashed TF-IDF vector: tokens are hashed into a
+fixed feature space, term frequencies are damped with 1 + log(tf), and IDF is taken over
+the open clusters, so words every incident shares ("issue", "campus") carry little weight.
+A new signal joins the most similar open cluster of its category whose cosine similarity
+reaches the threshold, or opens a new one.
+
+Candidate clusters come from a MinHash LSH index over each cluster's top terms: a lookup
+hashes the signal into BANDS buckets and only scores the clusters sharing one of them,
+rather than every open incident. Clusters not seen within the window drop out.
+"""
+import functools
+import math
+import random
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are at be been by for from has have in is it its of on or the to was were with '
+    'this that there these those not no our we i my me you your they their he she his her as'.split()
+)
+
+FEATURES = 1 << 18
+BANDS = 32
+ROWS = 2
+# Terms kept per cluster; they define its vector and its MinHash signature.
+MAX_TERMS = 64
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(BANDS * ROWS)]
+
+
+def term_counts(*texts: str) -> Dict[str, int]:
+    """Token counts over the given texts, lowercased, without stopwords or one-letter tokens."""
+    counts: Counter = Counter()
+    for text in texts:
+        counts.update(token for token in TOKEN_RE.findall((text or '').lower())
+                      if len(token) > 1 and token not in STOPWORDS)
+    return dict(counts)
+
+
+def top_terms(counts: Dict[str, int], limit: int = MAX_TERMS) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit])
+
+
+def _feature(token: str) -> int:
+    return zlib.crc32(token.encode()) % FEATURES
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _token_hashes(token: str) -> Tuple[int, ...]:
+    h = zlib.crc32(token.encode())
+    return tuple((a * h + b) % _PRIME for a, b in _PERMUTATIONS)
+
+
+def _bands(terms: Iterable[str]) -> List[Tuple[int, Tuple[int, ...]]]:
+    hashes = [_token_hashes(token) for token in terms]
+    if not hashes:
+        return []
+    signature = [min(column) for column in zip(*hashes)]
+    return [(band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+@dataclass
+class Cluster:
+    id: str
+    category: str
+    terms: Dict[str, int]
+    last_seen: float  # epoch seconds
+    bands: List[Tuple[int, Tuple[int, ...]]] = field(default_factory=list)
+
+
+class IncidentIndex:
+    def __init__(self, threshold: float, window_seconds: float):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self._clusters: Dict[str, Cluster] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = defaultdict(set)
+        self._df: Counter = Counter()  # hashed feature -> clusters containing it
+        self._lock = threading.Lock()
+        self._swept_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    def add(self, cluster_id: str, category: str, terms: Dict[str, int], last_seen: float) -> None:
+        """Insert or replace a cluster, e.g. a loaded or just written incident, unless the index has a newer version."""
+        with self._lock:
+            current = self._clusters.get(cluster_id)
+            if current is not None and current.last_seen > last_seen:
+                return
+            terms = top_terms(terms)
+            if current is not None and terms.keys() == current.terms.keys():
+                # Same term set, so the same signature and document frequencies: skip re-hashing.
+                current.terms, current.last_seen = terms, last_seen
+                return
+            self._remove(cluster_id)
+            self._insert(Cluster(cluster_id, category, terms, last_seen))
+
+    def match(self, category: str, terms: Dict[str, int], now: float,
+              pending: Iterable[Tuple[str, str, Dict[str, int]]] = ()) -> Optional[str]:
+        """
+        The ID of the open cluster a signal's term counts belong to, or None for a new one. pending
+        holds (ID, category, terms) of clusters opened but not yet added, such as earlier signals of
+        the same batch. The index isn't changed; add() the cluster once its incident is written.
+        """
+        with self._lock:
+            if now - self._swept_at > 60:
+                self._sweep(now)
+            best, best_score = None, self.threshold
+            vector = self._vector(terms)
+            candidates = [(cluster.id, cluster.category, cluster.terms) for cluster in map(self._clusters.get, self._candidates(terms))
+                          if now - cluster.last_seen <= self.window_seconds]
+            for cluster_id, cluster_category, cluster_terms in candidates + list(pending):
+                if cluster_category != category:
+                    continue
+                score = self._cosine(vector, self._vector(cluster_terms))
+                if score >= best_score:
+                    best, best_score = cluster_id, score
+            return best
+
+    def _candidates(self, terms: Dict[str, int]) -> Set[str]:
+        found: Set[str] = set()
+        for key in _bands(top_terms(terms)):
+            found |= self._buckets.get(key, set())
+        return found
+
+    def _vector(self, terms: Dict[str, int]) -> Dict[int, float]:
+        total = len(self._clusters) + 1
+        vector: Dict[int, float] = defaultdict(float)
+        for token, count in terms.items():
+            feature = _feature(token)
+            idf = math.log((1 + total) / (1 + self._df.get(feature, 0))) + 1
+            vector[feature] += (1 + math.log(count)) * idf
+        return vector
+
+    @staticmethod
+    def _cosine(va: Dict[int, float], vb: Dict[int, float]) -> float:
+        dot = sum(weight * vb.get(feature, 0.0) for feature, weight in va.items())
+        norm = math.sqrt(sum(w * w for w in va.values())) * math.sqrt(sum(w * w for w in vb.values()))
+        return dot / norm if norm else 0.0
+
+    def _insert(self, cluster: Cluster) -> None:
+        cluster.bands = _bands(cluster.terms)
+        self._clusters[cluster.id] = cluster
+        for key in cluster.bands:
+            self._buckets[key].add(cluster.id)
+        self._df.update({_feature(token) for token in cluster.terms})
+
+    def _remove(self, cluster_id: str) -> None:
+        cluster = self._clusters.pop(cluster_id, None)
+        if cluster is None:
+            return
+        for key in cluster.bands:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(cluster_id)
+                if not bucket:
+                    del self._buckets[key]
+        self._df.subtract({_feature(token) for token in cluster.terms})
+
+    def _sweep(self, now: float) -> None:
+        for cluster_id in [c.id for c in self._clusters.values() if now - c.last_seen > self.window_seconds]:
+            self._remove(cluster_id)
+        self._df += Counter()  # drop zero counts
+        self._swept_at = now
@@ -1,7 +1,24 @@
-from typing import List, Optional, Dict, Any
-from firebase_config import db, SIGNALS_COLLECTION, ZONES_COLLECTION, USERS_COLLECTION, NOTIFICATIONS_COLLECTION
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Set, Tuple
+from firebase_admin import firestore
+from firebase_config import db, SIGNALS_COLLECTION, ZONES_COLLECTION, USERS_COLLECTION, NOTIFICATIONS_COLLECTION, COUNTERS_COLLECTION, STATS_COLLECTION, INCIDENTS_COLLECTION, SIGNALS_ARCHIVE_COLLECTION, NOTIFICATIONS_ARCHIVE_COLLECTION, INBOXES_COLLECTION
+from settings import STATS_BUCKET_SECONDS, STATS_TREND_POINTS, WRITE_BATCH_SIZE, CACHE_TTL_ZONES, ZONE_GRID_CELL_DEGREES, SIGNAL_ZONE_MAX_DISTANCE_M, CLUSTER_SIMILARITY, CLUSTER_WINDOW_HOURS, SEARCH_MAX_PREFIX_EXPANSIONS, RISK_HALF_LIFE_HOURS, HEATMAP_SIZE, HEATMAP_SIGMA_M, HEATMAP_REFRESH_SECONDS, FANOUT_CONCURRENCY
+from cache import ALL, IDS, zones_cache, users_cache
+import response_cache
+from spatial_index import ZoneGridIndex
+from clustering import IncidentIndex, term_counts, top_terms
+from search_index import SignalSearchIndex, TEXT_FIELDS, META_FIELDS
+from risk_scoring import RiskEngine
 from models import Signal, Zone, Stats, User, Notification, Coordinates
+from google.api_core import exceptions as gcp_exceptions
 from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
 
 SEED_SIGNALS = [
     {
@@ -85,32 +102,373 @@ SEED_NOTIFICATIONS = [
 ]
 
 
-def initialize_firestore():
-    signals_ref = db.collection(SIGNALS_COLLECTION)
-    if not list(signals_ref.limit(1).stream()):
-        print("Seeding signals collection...")
-        for signal in SEED_SIGNALS:
-            signals_ref.document(signal['id']).set(signal)
+def _seed_age(display: str) -> timedelta:
+    """Age behind a seed display string such as '12m ago'."""
+    amount = display.split()[0]
+    return timedelta(seconds=int(amount[:-1]) * {'m': 60, 'h': 3600, 'd': 86400}[amount[-1]])
+
+
+def _seed_documents() -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+    now = datetime.now(timezone.utc)
+    return {
+        SIGNALS_COLLECTION: [(signal['id'], {**signal, CREATED_AT: now - _seed_age(signal['timestamp']), UPDATED_AT: now - _seed_age(signal['timestamp'])})
+                             for signal in SEED_SIGNALS],
+        ZONES_COLLECTION: [(zone['id'], zone) for zone in SEED_ZONES],
+        USERS_COLLECTION: list(SEED_USERS.items()),
+        NOTIFICATIONS_COLLECTION: [(str(notif['id']), {**notif, CREATED_AT: now - _seed_age(notif['time'])}) for notif in SEED_NOTIFICATIONS],
+    }
+
+
+def _is_empty(collection: str) -> bool:
+    return not list(db.collection(collection).limit(1).select([]).stream())
+
+
+def initialize_firestore() -> Dict[str, Any]:
+    """
+    Seed empty collections and build the stats document if it's missing.
+    
+    The emptiness probes and the stats lookup run concurrently, and all seed documents
+    go out in batched commits, so a cold start costs about two round trips. Returns
+    timings (ms) and the collections that were seeded.
+    """
+    start = time.perf_counter()
+    seeds = _seed_documents()
+    with ThreadPoolExecutor(max_workers=len(seeds) + 2) as pool:
+        stats_probe = pool.submit(lambda: _stats_ref().get().exists)
+        migrations_probe = pool.submit(lambda: _migrations_ref().get().to_dict() or {})
+        empty = dict(zip(seeds, pool.map(_is_empty, seeds)))
+        stats_exists = stats_probe.result()
+        migrations = migrations_probe.result()
+    probed = time.perf_counter()
+    
+    writes = [(collection, doc_id, data) for collection, docs in seeds.items() if empty[collection] for doc_id, data in docs]
+    for chunk_start in range(0, len(writes), WRITE_BATCH_SIZE):
+        batch = db.batch()
+        for collection, doc_id, data in writes[chunk_start:chunk_start + WRITE_BATCH_SIZE]:
+            batch.set(db.collection(collection).document(doc_id), data)
+        batch.commit()
+    seeded = [collection for collection in seeds if empty[collection]]
+    if seeded:
+        print(f"Seeded {', '.join(seeded)}")
+    if empty[NOTIFICATIONS_COLLECTION]:
+        for future in fan_out([data for _, data in seeds[NOTIFICATIONS_COLLECTION]]):
+            future.result()
     
-    zones_ref = db.collection(ZONES_COLLECTION)
-    if not list(zones_ref.limit(1).stream()):
-        print("Seeding zones collection...")
-        for zone in SEED_ZONES:
-            zones_ref.document(zone['id']).set(zone)
+    if not stats_exists:
+        print("Building dashboard stats...")
+        rebuild_stats()
     
-    users_ref = db.collection(USERS_COLLECTION)
-    if not list(users_ref.limit(1).stream()):
-        print("Seeding users collection...")
-        for user_type, user_data in SEED_USERS.items():
-            users_ref.document(user_type).set(user_data)
+    if not migrations.get('createdAtBackfill'):
+        backfilled = backfill_created_at()
+        if backfilled:
+            print(f"Backfilled createdAt on {backfilled} documents")
+    
+    if not migrations.get('inboxBackfill'):
+        backfilled = backfill_inboxes()
+        if backfilled:
+            print(f"Backfilled {backfilled} inbox items")
+    
+    if not migrations.get('zoneCounters'):
+        # Seeded and older zones carry static counts until they are recounted from their signals.
+        print(f"Recounted {rebuild_zone_counters()} zones")
+        _migrations_ref().set({'zoneCounters': True}, merge=True)
+    
+    done = time.perf_counter()
+    return {
+        'probeMs': round((probed - start) * 1000, 1),
+        'seedMs': round((done - probed) * 1000, 1),
+        'seeded': seeded,
+    }
+
+
+class PreconditionFailed(Exception):
+    """The document no longer matches the version the caller sent in If-Match."""
+
+
+def document_etag(doc: Dict[str, Any]) -> str:
+    """Strong ETag derived from a document's content, leaving out the display times derived from createdAt."""
+    payload = json.dumps({k: v for k, v in doc.items() if k not in _DERIVED_FIELDS}, sort_keys=True, default=str).encode()
+    return f'"{hashlib.blake2b(payload, digest_size=12).hexdigest()}"'
+
+
+def _check_if_match(doc: Dict[str, Any], if_match: Optional[str]) -> None:
+    if if_match not in (None, '*') and if_match != document_etag(doc):
+        raise PreconditionFailed()
+
+
+def _read_versioned(doc_ref) -> Optional[Tuple[Dict[str, Any], Any]]:
+    doc = doc_ref.get()
+    return (doc.to_dict(), doc.update_time) if doc.exists else None
+
+
+# How many times a patch re-reads the document after another writer got there first.
+PATCH_ATTEMPTS = 3
+
+
+def _patch_document(doc_ref, updates: Dict[str, Any], load_prior, if_match: Optional[str] = None, on_written=None) -> Optional[Dict[str, Any]]:
+    """
+    Apply ``updates`` in a single write guarded by the prior version's update time, and build
+    the result from that prior state plus the patch instead of reading the document back.
+    
+    ``load_prior(fresh)`` returns ``(data, update_time)`` or None if the document doesn't exist;
+    with fresh=True it must bypass any cache. If the document changed after the prior state was
+    read, Firestore rejects the write and the patch is retried against a fresh read. An If-Match
+    that doesn't match a cached prior state is checked again against a fresh read before it fails.
+    Without an If-Match, a document still busy after PATCH_ATTEMPTS is patched unguarded and read back.
+    """
+    fresh = False
+    for _ in range(PATCH_ATTEMPTS):
+        prior = load_prior(fresh)
+        if prior is None:
+            return None
+        data, update_time = prior
+        if not fresh and if_match not in (None, '*') and if_match != document_etag(data):
+            # The cache may not have seen another worker's write yet.
+            fresh = True
+            continue
+        _check_if_match(data, if_match)
+        try:
+            result = doc_ref.update(updates, option=db.write_option(last_update_time=update_time))
+        except gcp_exceptions.NotFound:
+            return None
+        except gcp_exceptions.FailedPrecondition:
+            fresh = True
+            continue
+        merged = {**data, **updates}
+        if on_written is not None:
+            on_written(merged, result.update_time)
+        return merged
+    if if_match is not None:
+        raise PreconditionFailed()
+    # The caller sent no precondition, so a busy document shouldn't fail the request:
+    # apply the patch unguarded and read the result back.
+    try:
+        doc_ref.update(updates)
+    except gcp_exceptions.NotFound:
+        return None
+    written = load_prior(True)
+    if written is None:
+        return None
+    if on_written is not None:
+        on_written(*written)
+    return written[0]
+
+
+# ---- Timestamps ----
+#
+# Signals and notifications carry createdAt, a UTC datetime set when they are written. The
+# display strings the frontend shows (a signal's `timestamp`, a notification's `time`) are
+# still stored for older readers, but are recomputed from createdAt whenever one is read.
+# Signals also carry updatedAt, set on every write, for incremental exports; signals last
+# written before it existed have none.
+
+CREATED_AT = 'createdAt'
+UPDATED_AT = 'updatedAt'
+DISPLAY_TIME_FIELDS = {SIGNALS_COLLECTION: 'timestamp', NOTIFICATIONS_COLLECTION: 'time'}
+_DERIVED_FIELDS = tuple(DISPLAY_TIME_FIELDS.values())
+MIGRATIONS_DOC_ID = 'migrations'
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that this query can't have produced."""
+
+
+def relative_time(moment: datetime, now: Optional[datetime] = None) -> str:
+    seconds = ((now or datetime.now(timezone.utc)) - moment).total_seconds()
+    if seconds < 60:
+        return 'Just now'
+    if seconds < 3600:
+        return f'{int(seconds // 60)}m ago'
+    if seconds < 86400:
+        return f'{int(seconds // 3600)}h ago'
+    return f'{int(seconds // 86400)}d ago'
+
+
+def with_display_time(collection: str, doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Refresh a signal's or notification's display time from its createdAt, in place."""
+    if doc is not None and isinstance(doc.get(CREATED_AT), datetime):
+        doc[DISPLAY_TIME_FIELDS[collection]] = relative_time(doc[CREATED_AT])
+    return doc
+
+
+def _time_cursor(doc: Dict[str, Any], field: str = CREATED_AT) -> str:
+    return f"{doc[field].astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')}|{doc['id']}"
+
+
+def _decode_time_cursor(cursor: str, field: str = CREATED_AT) -> Dict[str, Any]:
+    moment_text, _, doc_id = cursor.partition('|')
+    try:
+        moment = datetime.fromisoformat(moment_text)
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if not doc_id or moment.tzinfo is None:
+        raise InvalidCursor(cursor)
+    return {field: moment, FieldPath.document_id(): doc_id}
+
+
+def _migrations_ref():
+    return db.collection(STATS_COLLECTION).document(MIGRATIONS_DOC_ID)
+
+
+def backfill_created_at() -> int:
+    """
+    Give signals and notifications written before createdAt existed their Firestore create
+    time, then mark the migration done. Returns how many documents were updated.
+    """
+    writer = db.bulk_writer()
+    count = 0
+    for collection in DISPLAY_TIME_FIELDS:
+        for doc in db.collection(collection).select([CREATED_AT]).stream():
+            if CREATED_AT not in (doc.to_dict() or {}):
+                writer.update(doc.reference, {CREATED_AT: doc.create_time})
+                count += 1
+    writer.close()
+    _migrations_ref().set({'createdAtBackfill': True}, merge=True)
+    return count
+
+
+# Prefix in front of the numeric part of document IDs, per collection.
+ID_PREFIXES = {
+    SIGNALS_COLLECTION: 's',
+    NOTIFICATIONS_COLLECTION: '',
+}
+
+
+def _max_existing_id(collection: str) -> int:
+    """Highest numeric ID currently in a collection. Only used to seed a missing counter."""
+    prefix = ID_PREFIXES[collection]
+    docs = db.collection(collection).select([]).stream()
+    numbers = [doc.id[len(prefix):] for doc in docs]
+    return max((int(n) for n in numbers if n.isdigit()), default=0)
+
+
+def _read_counter(transaction, collection: str) -> int:
+    snapshot = db.collection(COUNTERS_COLLECTION).document(collection).get(transaction=transaction)
+    if snapshot.exists:
+        return snapshot.get('next')
+    return _max_existing_id(collection) + 1
+
+
+def _write_counter(transaction, collection: str, next_id: int) -> None:
+    transaction.set(db.collection(COUNTERS_COLLECTION).document(collection), {'next': next_id})
+
+
+@firestore.transactional
+def _reserve_ids(transaction, collection: str, count: int) -> int:
+    start = _read_counter(transaction, collection)
+    _write_counter(transaction, collection, start + count)
+    return start
+
+
+def allocate_ids(collection: str, count: int = 1) -> List[int]:
+    """
+    Reserve ``count`` consecutive numeric IDs from the collection's counter document.
+    The read-increment-write runs in a transaction, so concurrent callers never get the same ID.
+    """
+    start = _reserve_ids(db.transaction(), collection, count)
+    return list(range(start, start + count))
+
+
+@firestore.transactional
+def _raise_counter_txn(transaction, collection: str, next_id: int) -> int:
+    next_id = max(_read_counter(transaction, collection), next_id)
+    _write_counter(transaction, collection, next_id)
+    return next_id
+
+
+def raise_counter(collection: str, doc_ids: List[str]) -> int:
+    """Move the collection's counter past the numeric IDs given (e.g. after a bulk import). Returns its next ID."""
+    prefix = ID_PREFIXES[collection]
+    numbers = [doc_id[len(prefix):] for doc_id in doc_ids if doc_id.startswith(prefix)]
+    highest = max((int(n) for n in numbers if n.isdigit()), default=0)
+    return _raise_counter_txn(db.transaction(), collection, highest + 1)
+
+
+def _query_collection(
+    collection: str,
+    filters: Dict[str, Any],
+    fields: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    time_range: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+    changed_since: Optional[datetime] = None,
+    parent=None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Run a filtered, projected, paginated query over a collection, or over the subcollection of
+    that name under the parent document. Filters with a value of None are skipped.
+    Pages are ordered by document ID; the returned cursor is the last ID on a full page, or None.
     
-    notifs_ref = db.collection(NOTIFICATIONS_COLLECTION)
-    if not list(notifs_ref.limit(1).stream()):
-        print("Seeding notifications collection...")
-        for notif in SEED_NOTIFICATIONS:
-            notifs_ref.document(str(notif['id'])).set(notif)
+    With time_range=(since, until), either of which may be None, only documents with createdAt
+    in [since, until) match and pages are ordered newest first, with (createdAt, ID) cursors.
+    With changed_since instead, only documents with updatedAt at or after it match, oldest
+    change first, with (updatedAt, ID) cursors.
+    """
+    display_field = DISPLAY_TIME_FIELDS.get(collection)
+    query = (parent or db).collection(collection)
+    for field, value in filters.items():
+        if value is not None:
+            query = query.where(filter=FieldFilter(field, '==', value))
+    if time_range is not None:
+        since, until = time_range
+        if since is not None:
+            query = query.where(filter=FieldFilter(CREATED_AT, '>=', since))
+        if until is not None:
+            query = query.where(filter=FieldFilter(CREATED_AT, '<', until))
+    if changed_since is not None:
+        query = query.where(filter=FieldFilter(UPDATED_AT, '>=', changed_since))
+    if fields is not None:
+        selected = set(fields) | {'id'}
+        if time_range is not None or display_field in selected:
+            selected.add(CREATED_AT)
+        if changed_since is not None:
+            selected.add(UPDATED_AT)
+        query = query.select(sorted(selected))
+    if changed_since is not None:
+        query = query.order_by(UPDATED_AT).order_by(FieldPath.document_id())
+        if cursor is not None:
+            query = query.start_after(_decode_time_cursor(cursor, UPDATED_AT))
+        if limit is not None:
+            query = query.limit(limit)
+    elif time_range is not None:
+        query = query.order_by(CREATED_AT, direction=firestore.Query.DESCENDING)
+        query = query.order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING)
+        if cursor is not None:
+            query = query.start_after(_decode_time_cursor(cursor))
+        if limit is not None:
+            query = query.limit(limit)
+    elif limit is not None or cursor is not None:
+        query = query.order_by(FieldPath.document_id())
+        if cursor is not None:
+            query = query.start_after({FieldPath.document_id(): cursor})
+        if limit is not None:
+            query = query.limit(limit)
     
-    print("Firestore initialization complete!")
+    docs = list(query.stream())
+    items = [doc.to_dict() for doc in docs]
+    next_cursor = None
+    if limit is not None and len(docs) == limit:
+        if changed_since is not None:
+            next_cursor = _time_cursor({**items[-1], 'id': docs[-1].id}, UPDATED_AT)
+        elif time_range is not None:
+            next_cursor = _time_cursor({**items[-1], 'id': docs[-1].id})
+        else:
+            next_cursor = docs[-1].id
+    if display_field is not None and (fields is None or display_field in fields):
+        for item in items:
+            with_display_time(collection, item)
+    if fields is not None:
+        for field in (CREATED_AT, UPDATED_AT):
+            if field not in fields:
+                for item in items:
+                    item.pop(field, None)
+    return items, next_cursor
+
+
+def query_signals(filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                  limit: Optional[int] = None, cursor: Optional[str] = None,
+                  time_range=None, changed_since: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return _query_collection(SIGNALS_COLLECTION, filters, fields, limit, cursor, time_range, changed_since)
 
 
 def get_all_signals() -> List[Dict[str, Any]]:
@@ -120,67 +478,581 @@ def get_all_signals() -> List[Dict[str, Any]]:
 
 def get_signal_by_id(signal_id: str) -> Optional[Dict[str, Any]]:
     doc = db.collection(SIGNALS_COLLECTION).document(signal_id).get()
-    return doc.to_dict() if doc.exists else None
+    return with_display_time(SIGNALS_COLLECTION, doc.to_dict()) if doc.exists else None
+
+
+# The most signals one _create_signals commit may hold. Each signal may write itself, its
+# notification, its incident and its zone, and the commit also writes the stats document and
+# the signal and notification counters once.
+SIGNALS_PER_COMMIT = max(1, (WRITE_BATCH_SIZE - 3) // 4)
 
 
-def create_signal(signal_data: Dict[str, Any]) -> Dict[str, Any]:
-    signals = get_all_signals()
-    max_id = max([int(s['id'][1:]) for s in signals], default=0)
-    new_id = f's{max_id + 1}'
+def _create_signals(transaction, signals: List[Dict[str, Any]], notifications: List[Optional[Dict[str, Any]]], touched_zones: Set[str],
+                    incidents_written: Dict[str, Dict[str, Any]], preassigned: bool = False) -> List[Dict[str, Any]]:
+    """
+    Create signals with their stats, zone and incident updates. notifications holds, per signal,
+    the notification to create or None; it is only written if the signal opened its incident
+    or raised its risk level. With preassigned, signals keep the IDs they carry (from
+    allocate_ids); otherwise they take IDs from the counter on every attempt, since a retried
+    transaction sees the IDs its aborted attempt wrote into the dicts. Returns the notifications written.
+    """
+    next_signal_id = None if preassigned else _read_counter(transaction, SIGNALS_COLLECTION)
+    next_notification_id = _read_counter(transaction, NOTIFICATIONS_COLLECTION) if any(notifications) else None
+    aggregates = _read_aggregates(transaction, signals)
+    incidents = _read_incidents(transaction, signals)
+    
+    for offset, signal_data in enumerate(signals):
+        if not preassigned:
+            signal_data['id'] = f's{next_signal_id + offset}'
+        # Stamped per attempt rather than copied from createdAt: a write-behind signal commits
+        # well after it was created, and incremental exports select by updatedAt.
+        signal_data[UPDATED_AT] = datetime.now(timezone.utc)
+        transaction.create(db.collection(SIGNALS_COLLECTION).document(signal_data['id']), signal_data)
+    if not preassigned:
+        _write_counter(transaction, SIGNALS_COLLECTION, next_signal_id + len(signals))
+    
+    notify = _write_incidents(transaction, incidents, signals)
+    incidents_written.clear()
+    incidents_written.update(incidents)
+    created = []
+    for notif_data, wanted in zip(notifications, notify):
+        if notif_data is not None and wanted:
+            notif_data['id'] = next_notification_id + len(created)
+            transaction.create(db.collection(NOTIFICATIONS_COLLECTION).document(str(notif_data['id'])), notif_data)
+            created.append(notif_data)
+    if created:
+        _write_counter(transaction, NOTIFICATIONS_COLLECTION, next_notification_id + len(created))
     
-    signal_data['id'] = new_id
-    db.collection(SIGNALS_COLLECTION).document(new_id).set(signal_data)
-    return signal_data
+    touched_zones.update(_write_aggregates(transaction, aggregates, [(None, signal_data) for signal_data in signals]))
+    return created
+
+
+def _signals_created(signals: List[Dict[str, Any]], notifications: List[Dict[str, Any]], touched_zones: Set[str],
+                     incidents_written: Dict[str, Dict[str, Any]]) -> None:
+    """Bring caches and in-memory indexes up to date after signals commit, and fan their notifications out."""
+    response_cache.bump(SIGNALS_COLLECTION)
+    response_cache.bump(INCIDENTS_COLLECTION)
+    _invalidate_zones(touched_zones)
+    _incidents_written(incidents_written)
+    for signal_data in signals:
+        _signal_written(signal_data)
+    fan_out(notifications)
+
+
+@firestore.transactional
+def _create_signal_txn(transaction, signal_data: Dict[str, Any], notification: Optional[Dict[str, Any]], touched_zones: Set[str],
+                       incidents_written: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _create_signals(transaction, [signal_data], [notification], touched_zones, incidents_written)
 
 
-def update_signal(signal_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def create_signal(signal_data: Dict[str, Any], notification: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    _assign_zone(signal_data)
+    _assign_incidents([signal_data])
+    touched_zones: Set[str] = set()
+    incidents_written: Dict[str, Dict[str, Any]] = {}
+    notifications = _create_signal_txn(db.transaction(), signal_data, notification, touched_zones, incidents_written)
+    _signals_created([signal_data], notifications, touched_zones, incidents_written)
+    return with_display_time(SIGNALS_COLLECTION, signal_data)
+
+
+@firestore.transactional
+def _ingest_signals_txn(transaction, signals: List[Dict[str, Any]], notifications: List[Optional[Dict[str, Any]]], touched_zones: Set[str],
+                        incidents_written: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _create_signals(transaction, signals, notifications, touched_zones, incidents_written)
+
+
+def ingest_signals(signals: List[Dict[str, Any]], notifications: List[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Create many signals (and their notifications, one entry or None per signal) in one
+    transaction: both ID blocks, every document and a single stats update commit together.
+    Callers keep each call under the per-commit write limit. Assigned IDs are written back
+    into the given dicts.
+    """
+    for signal_data in signals:
+        _assign_zone(signal_data)
+    _assign_incidents(signals)
+    touched_zones: Set[str] = set()
+    incidents_written: Dict[str, Dict[str, Any]] = {}
+    created = _ingest_signals_txn(db.transaction(), signals, notifications, touched_zones, incidents_written)
+    _signals_created(signals, created, touched_zones, incidents_written)
+    return signals
+
+
+@firestore.transactional
+def _persist_signals_txn(transaction, signals: List[Dict[str, Any]], notifications: List[Optional[Dict[str, Any]]], touched_zones: Set[str],
+                         incidents_written: Dict[str, Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    refs = [db.collection(SIGNALS_COLLECTION).document(signal_data['id']) for signal_data in signals]
+    stored = {snap.id for snap in transaction.get_all(refs) if snap.exists}
+    fresh = [(signal_data, notification) for signal_data, notification in zip(signals, notifications) if signal_data['id'] not in stored]
+    if not fresh:
+        return [], []
+    signals = [signal_data for signal_data, _ in fresh]
+    return signals, _create_signals(transaction, signals, [notification for _, notification in fresh], touched_zones, incidents_written, preassigned=True)
+
+
+def persist_signals(signals: List[Dict[str, Any]], notifications: List[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Like ingest_signals, for signals whose IDs were reserved beforehand (the write-behind log).
+    Signals already stored are skipped, so replaying a batch that did commit is harmless.
+    Returns the signals written.
+    """
+    for signal_data in signals:
+        _assign_zone(signal_data)
+    _assign_incidents(signals)
+    touched_zones: Set[str] = set()
+    incidents_written: Dict[str, Dict[str, Any]] = {}
+    written, created = _persist_signals_txn(db.transaction(), signals, notifications, touched_zones, incidents_written)
+    _signals_created(written, created, touched_zones, incidents_written)
+    return written
+
+
+@firestore.transactional
+def _update_signal_txn(transaction, signal_id: str, updates: Dict[str, Any], if_match: Optional[str], touched_zones: Set[str]) -> Optional[Dict[str, Any]]:
     doc_ref = db.collection(SIGNALS_COLLECTION).document(signal_id)
-    doc = doc_ref.get()
+    doc = doc_ref.get(transaction=transaction)
     if not doc.exists:
         return None
-    doc_ref.update(updates)
-    return doc_ref.get().to_dict()
+    old = doc.to_dict()
+    _check_if_match(old, if_match)
+    new = {**old, **updates}
+    aggregates = _read_aggregates(transaction, [old, new])
+    
+    transaction.update(doc_ref, updates)
+    touched_zones.update(_write_aggregates(transaction, aggregates, [(old, new)]))
+    return new
+
 
+def update_signal(signal_id: str, updates: Dict[str, Any], if_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Signal writes also move the stats and zone counters, so they read and write inside one transaction."""
+    touched_zones: Set[str] = set()
+    updates = {**updates, UPDATED_AT: datetime.now(timezone.utc)}
+    updated = _update_signal_txn(db.transaction(), signal_id, updates, if_match, touched_zones)
+    if updated is not None:
+        response_cache.bump(SIGNALS_COLLECTION)
+        _signal_written(updated)
+    _invalidate_zones(touched_zones)
+    return with_display_time(SIGNALS_COLLECTION, updated)
 
-def delete_signal(signal_id: str) -> bool:
+
+@firestore.transactional
+def _delete_signal_txn(transaction, signal_id: str, if_match: Optional[str], touched_zones: Set[str]) -> bool:
     doc_ref = db.collection(SIGNALS_COLLECTION).document(signal_id)
-    if not doc_ref.get().exists:
+    doc = doc_ref.get(transaction=transaction)
+    if not doc.exists:
         return False
-    doc_ref.delete()
+    old = doc.to_dict()
+    _check_if_match(old, if_match)
+    aggregates = _read_aggregates(transaction, [old])
+    
+    transaction.delete(doc_ref)
+    touched_zones.update(_write_aggregates(transaction, aggregates, [(old, None)]))
     return True
 
 
-def get_all_zones() -> List[Dict[str, Any]]:
+def delete_signal(signal_id: str, if_match: Optional[str] = None) -> bool:
+    touched_zones: Set[str] = set()
+    deleted = _delete_signal_txn(db.transaction(), signal_id, if_match, touched_zones)
+    if deleted:
+        response_cache.bump(SIGNALS_COLLECTION)
+        _signal_removed(signal_id)
+    _invalidate_zones(touched_zones)
+    return deleted
+
+
+# The most signals one _batch_signals_txn commit may hold. Each signal may write itself and
+# its zone, and the commit also writes the stats document once.
+BATCH_SIGNALS_PER_COMMIT = max(1, (WRITE_BATCH_SIZE - 1) // 2)
+
+
+@firestore.transactional
+def _batch_signals_txn(transaction, signal_ids: List[str], updates: Optional[Dict[str, Any]], touched_zones: Set[str]) -> List[str]:
+    refs = [db.collection(SIGNALS_COLLECTION).document(signal_id) for signal_id in signal_ids]
+    snapshots = [snap for snap in transaction.get_all(refs) if snap.exists]
+    changes = []
+    for snap in snapshots:
+        old = snap.to_dict()
+        changes.append((old, None if updates is None else {**old, **updates}))
+    aggregates = _read_aggregates(transaction, [signal for change in changes for signal in change])
+    
+    for snap in snapshots:
+        if updates is None:
+            transaction.delete(snap.reference)
+        else:
+            transaction.update(snap.reference, updates)
+    touched_zones.update(_write_aggregates(transaction, aggregates, changes))
+    return [snap.id for snap in snapshots]
+
+
+def _batch_signals(signal_ids: List[str], updates: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Update (or, with updates=None, delete) many signals. Each chunk of BATCH_SIGNALS_PER_COMMIT IDs is
+    one transaction that reads the chunk with a single batched get and adjusts the stats counters once.
+    """
+    unique_ids = list(dict.fromkeys(signal_ids))
+    if updates is not None:
+        updates = {**updates, UPDATED_AT: datetime.now(timezone.utc)}
+    processed: List[str] = []
+    touched_zones: Set[str] = set()
+    for start in range(0, len(unique_ids), BATCH_SIGNALS_PER_COMMIT):
+        chunk = unique_ids[start:start + BATCH_SIGNALS_PER_COMMIT]
+        processed.extend(_batch_signals_txn(db.transaction(), chunk, updates, touched_zones))
+    if processed:
+        response_cache.bump(SIGNALS_COLLECTION)
+    for signal_id in processed:
+        if updates is None:
+            _signal_removed(signal_id)
+        else:
+            _signal_patched(signal_id, updates)
+    _invalidate_zones(touched_zones)
+    found = set(processed)
+    return {'processed': processed, 'notFound': [signal_id for signal_id in unique_ids if signal_id not in found]}
+
+
+def batch_update_signals(signal_ids: List[str], updates: Dict[str, Any]) -> Dict[str, List[str]]:
+    return _batch_signals(signal_ids, updates)
+
+
+def batch_delete_signals(signal_ids: List[str]) -> Dict[str, List[str]]:
+    return _batch_signals(signal_ids, None)
+
+
+def query_zones(filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                limit: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    if fields is None and limit is None and cursor is None and all(value is None for value in filters.values()):
+        return get_all_zones(), None
+    return _query_collection(ZONES_COLLECTION, filters, fields, limit, cursor)
+
+
+def _load_all_zones() -> List[Dict[str, Any]]:
     docs = db.collection(ZONES_COLLECTION).stream()
     return [doc.to_dict() for doc in docs]
 
 
-def get_zone_by_id(zone_id: str) -> Optional[Dict[str, Any]]:
-    doc = db.collection(ZONES_COLLECTION).document(zone_id).get()
+def get_all_zones() -> List[Dict[str, Any]]:
+    return zones_cache.get_or_load(ALL, _load_all_zones)
+
+
+# ---- Zone assignment ----
+#
+# Signals that carry lat/lng are assigned to the nearest zone through an in-memory grid
+# index over zone latLng values. The index is rebuilt from the (cached) zone list at most
+# once per CACHE_TTL_ZONES, since zones are rarely added or moved.
+
+_zone_index = ZoneGridIndex(ZONE_GRID_CELL_DEGREES)
+_zone_index_built_at: Optional[float] = None
+
+
+def zone_index() -> ZoneGridIndex:
+    global _zone_index_built_at
+    if _zone_index_built_at is None or time.monotonic() - _zone_index_built_at > CACHE_TTL_ZONES:
+        _zone_index.rebuild(
+            (zone['id'], zone['latLng'][0], zone['latLng'][1])
+            for zone in get_all_zones() if len(zone.get('latLng') or []) == 2
+        )
+        _zone_index_built_at = time.monotonic()
+    return _zone_index
+
+
+def _assign_zone(signal_data: Dict[str, Any]) -> None:
+    if signal_data.get('zoneId') or signal_data.get('lat') is None or signal_data.get('lng') is None:
+        return
+    match = zone_index().nearest(signal_data['lat'], signal_data['lng'], SIGNAL_ZONE_MAX_DISTANCE_M)
+    if match is not None:
+        signal_data['zoneId'] = match[0]
+
+
+def nearby_zones(lat: float, lng: float, radius_m: float) -> List[Dict[str, Any]]:
+    """Zones within radius_m of a point, nearest first, each with its distanceMeters."""
+    matches = zone_index().within(lat, lng, radius_m)
+    zones = {zone['id']: zone for zone in get_all_zones()}
+    return [{**zones[zone_id], 'distanceMeters': round(distance, 1)} for zone_id, distance in matches if zone_id in zones]
+
+
+# ---- Search ----
+#
+# search_index.py keeps an in-memory inverted index over signals. It is built from a projected
+# scan at startup and kept current by the signal write paths above, once their commits succeed
+# (see _signal_written below).
+
+signal_search = SignalSearchIndex(SEARCH_MAX_PREFIX_EXPANSIONS)
+
+
+class SearchUnavailable(Exception):
+    """The search index hasn't finished building."""
+
+
+def build_search_index() -> int:
+    """(Re)build the search index from a scan of the indexed fields. Returns how many signals it holds."""
+    docs = db.collection(SIGNALS_COLLECTION).select(list(TEXT_FIELDS + META_FIELDS)).stream()
+    signal_search.rebuild({**doc.to_dict(), 'id': doc.id} for doc in docs)
+    return len(signal_search)
+
+
+def search_signals(query: str, filters: Dict[str, Any], limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of signals matching query, best first, fetched with a single batched get.
+    The cursor is the offset of the next page.
+    """
+    if not signal_search.ready.is_set():
+        raise SearchUnavailable()
+    if cursor is not None and not cursor.isdigit():
+        raise InvalidCursor(cursor)
+    offset = int(cursor or 0)
+    signal_ids, total = signal_search.search(query, filters, offset, limit)
+    refs = [db.collection(SIGNALS_COLLECTION).document(signal_id) for signal_id in signal_ids]
+    docs = {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists} if refs else {}
+    items = [with_display_time(SIGNALS_COLLECTION, docs[signal_id]) for signal_id in signal_ids if signal_id in docs]
+    return items, str(offset + limit) if offset + limit < total else None
+
+
+# ---- Risk scoring ----
+#
+# risk_scoring.py keeps time-decayed, severity-weighted signal mass per zone and on a heatmap
+# raster over the zones. Like the search index, it is built from a projected scan at startup
+# (with the zones as they are then) and kept current by the signal write paths.
+
+risk_engine = RiskEngine(RISK_HALF_LIFE_HOURS, HEATMAP_SIZE, HEATMAP_SIGMA_M)
+RISK_FIELDS = ['riskLevel', 'status', 'zoneId', 'lat', 'lng', CREATED_AT]
+_heatmap: Optional[Tuple[Tuple[int, int], response_cache.EncodedResponse]] = None
+
+
+class ScoringUnavailable(Exception):
+    """The risk engine hasn't finished building."""
+
+
+def build_risk_engine() -> int:
+    """(Re)build the risk engine from the zones and a scan of the scored signal fields. Returns how many signals it holds."""
+    docs = db.collection(SIGNALS_COLLECTION).select(RISK_FIELDS).stream()
+    risk_engine.rebuild(get_all_zones(), ({**doc.to_dict(), 'id': doc.id} for doc in docs), time.time())
+    return risk_engine.stats()['signals']
+
+
+def zone_risk() -> List[Dict[str, Any]]:
+    if not risk_engine.ready.is_set():
+        raise ScoringUnavailable()
+    return risk_engine.zone_scores(time.time())
+
+
+def get_heatmap() -> response_cache.EncodedResponse:
+    """
+    The encoded heatmap raster. It is re-rendered when a signal changes, and otherwise every
+    HEATMAP_REFRESH_SECONDS as the signals decay.
+    """
+    global _heatmap
+    if not risk_engine.ready.is_set():
+        raise ScoringUnavailable()
+    now = time.time()
+    key = (risk_engine.version, int(now // HEATMAP_REFRESH_SECONDS))
+    cached = _heatmap
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    body = risk_engine.raster(now)
+    entry = response_cache.encode(body, {
+        'X-Heatmap-Width': str(risk_engine.width),
+        'X-Heatmap-Height': str(risk_engine.height),
+        'X-Heatmap-Bounds': ','.join(f'{edge:.6f}' for edge in risk_engine.bounds),
+    })
+    _heatmap = (key, entry)
+    return entry
+
+
+# The signal write paths report each committed change to both in-memory views.
+
+def _signal_written(signal: Dict[str, Any]) -> None:
+    signal_search.upsert(signal)
+    risk_engine.upsert(signal, time.time())
+
+
+def _signal_patched(signal_id: str, updates: Dict[str, Any]) -> None:
+    signal_search.update_meta(signal_id, updates)
+    risk_engine.update(signal_id, updates, time.time())
+
+
+def _signal_removed(signal_id: str) -> None:
+    signal_search.remove(signal_id)
+    risk_engine.remove(signal_id)
+
+
+# ---- Incidents ----
+#
+# Every new signal is folded into an incident (clustering.py): the most similar incident of
+# its category seen within CLUSTER_WINDOW_HOURS, or a new one. The in-memory index is loaded
+# from the incidents active in that window, and a listener on incidents seen since then keeps
+# it up to date with other processes' writes. Incident documents are written in the signal's
+# transaction, and the index only takes them once that commits. Only a signal that opens an
+# incident or raises its risk level gets a notification, so a burst of near-identical reports
+# notifies once.
+
+RISK_RANK = {'Stable': 0, 'Low': 1, 'Moderate': 2, 'Critical': 3}
+
+_incident_index = IncidentIndex(CLUSTER_SIMILARITY, CLUSTER_WINDOW_HOURS * 3600)
+_incident_index_loaded = False
+_incident_index_lock = threading.Lock()
+_incident_watch = None
+
+
+def _index_incident(incident: Dict[str, Any]) -> None:
+    _incident_index.add(incident['id'], incident.get('category', ''), incident.get('terms') or {}, incident['lastSeen'].timestamp())
+
+
+def _on_incidents_snapshot(docs, changes, read_time) -> None:
+    for change in changes:
+        if change.document.exists:
+            _index_incident({**change.document.to_dict(), 'id': change.document.id})
+
+
+def incident_index() -> IncidentIndex:
+    global _incident_index_loaded, _incident_watch
+    if not _incident_index_loaded:
+        with _incident_index_lock:
+            if not _incident_index_loaded:
+                incidents = db.collection(INCIDENTS_COLLECTION).where(
+                    filter=FieldFilter('lastSeen', '>=', datetime.now(timezone.utc) - timedelta(hours=CLUSTER_WINDOW_HOURS)))
+                # Listening first means nothing written during the load is missed; add() is idempotent.
+                _incident_watch = incidents.on_snapshot(_on_incidents_snapshot)
+                for doc in incidents.stream():
+                    _index_incident({**doc.to_dict(), 'id': doc.id})
+                _incident_index_loaded = True
+    return _incident_index
+
+
+def stop_incident_watch() -> None:
+    global _incident_watch
+    if _incident_watch is not None:
+        _incident_watch.unsubscribe()
+        _incident_watch = None
+
+
+def _signal_terms(signal_data: Dict[str, Any]) -> Dict[str, int]:
+    return term_counts(signal_data.get('title', ''), signal_data.get('description', ''))
+
+
+def _assign_incidents(signals: List[Dict[str, Any]]) -> None:
+    """
+    Pick each signal's incident without changing the index; _incidents_written adds them after
+    the commit. A signal may join an incident opened by an earlier signal of the same batch.
+    """
+    opened: List[Tuple[str, str, Dict[str, int]]] = []
+    for signal_data in signals:
+        if signal_data.get('incidentId'):
+            continue
+        seen = signal_data.get(CREATED_AT) or datetime.now(timezone.utc)
+        category, terms = signal_data.get('category', ''), _signal_terms(signal_data)
+        incident_id = incident_index().match(category, terms, seen.timestamp(), opened)
+        if incident_id is None:
+            incident_id = db.collection(INCIDENTS_COLLECTION).document().id
+            opened.append((incident_id, category, terms))
+        signal_data['incidentId'] = incident_id
+
+
+def _incidents_written(incidents: Dict[str, Dict[str, Any]]) -> None:
+    for incident in incidents.values():
+        _index_incident(incident)
+
+
+def _read_incidents(transaction, signals: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    incident_ids = sorted({signal['incidentId'] for signal in signals if signal.get('incidentId')})
+    refs = [db.collection(INCIDENTS_COLLECTION).document(incident_id) for incident_id in incident_ids]
+    return {snap.id: snap.to_dict() for snap in transaction.get_all(refs) if snap.exists} if refs else {}
+
+
+def _write_incidents(transaction, incidents: Dict[str, Dict[str, Any]], signals: List[Dict[str, Any]]) -> List[bool]:
+    """Fold new signals into their incidents. Returns, per signal, whether it opened its incident or raised its risk level."""
+    notify: List[bool] = []
+    changed: Set[str] = set()
+    for signal in signals:
+        incident_id = signal.get('incidentId')
+        if not incident_id:
+            notify.append(True)
+            continue
+        seen = signal.get(CREATED_AT) or datetime.now(timezone.utc)
+        risk_level = signal.get('riskLevel', 'Low')
+        incident = incidents.get(incident_id)
+        if incident is None:
+            incident = incidents[incident_id] = {
+                'id': incident_id,
+                'title': signal.get('title', ''),
+                'category': signal.get('category', ''),
+                'location': signal.get('location', ''),
+                'riskLevel': risk_level,
+                'signalCount': 0,
+                'zoneIds': [],
+                'terms': {},
+                CREATED_AT: seen,
+            }
+            notify.append(True)
+        elif RISK_RANK.get(risk_level, 0) > RISK_RANK.get(incident.get('riskLevel'), 0):
+            incident['riskLevel'] = risk_level
+            notify.append(True)
+        else:
+            notify.append(False)
+        incident['signalCount'] = incident.get('signalCount', 0) + 1
+        incident['lastSeen'] = seen
+        if signal.get('zoneId') and signal['zoneId'] not in incident.setdefault('zoneIds', []):
+            incident['zoneIds'].append(signal['zoneId'])
+        incident['terms'] = top_terms(Counter(incident.get('terms') or {}) + Counter(_signal_terms(signal)))
+        changed.add(incident_id)
+    for incident_id in changed:
+        transaction.set(db.collection(INCIDENTS_COLLECTION).document(incident_id), incidents[incident_id])
+    return notify
+
+
+def query_incidents(filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                    limit: Optional[int] = None, cursor: Optional[str] = None,
+                    time_range=None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return _query_collection(INCIDENTS_COLLECTION, filters, fields, limit, cursor, time_range)
+
+
+def get_incident_by_id(incident_id: str) -> Optional[Dict[str, Any]]:
+    doc = db.collection(INCIDENTS_COLLECTION).document(incident_id).get()
     return doc.to_dict() if doc.exists else None
 
 
-def update_zone(zone_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    doc_ref = db.collection(ZONES_COLLECTION).document(zone_id)
-    doc = doc_ref.get()
-    if not doc.exists:
-        return None
-    doc_ref.update(updates)
-    return doc_ref.get().to_dict()
+def _invalidate_zones(zone_ids: Set[str]) -> None:
+    if zone_ids:
+        zones_cache.invalidate(ALL, *zone_ids)
+        response_cache.bump(ZONES_COLLECTION)
+
+
+def _cached_versioned(cache, doc_ref, fresh: bool = False) -> Optional[Tuple[Dict[str, Any], Any]]:
+    """(data, update_time) for a document, served from ``cache`` unless ``fresh``."""
+    if fresh:
+        cache.invalidate(doc_ref.id)
+    return cache.get_or_load(doc_ref.id, lambda: _read_versioned(doc_ref))
+
+
+def _patch_cached(cache, doc_ref, updates: Dict[str, Any], if_match: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Patch a cached document; on a cache hit with no concurrent writer this is one RPC."""
+    def on_written(merged, update_time):
+        cache.invalidate(ALL)
+        response_cache.bump(cache.name)
+        cache.put(doc_ref.id, (merged, update_time))
+    
+    return _patch_document(doc_ref, updates, lambda fresh: _cached_versioned(cache, doc_ref, fresh), if_match, on_written)
+
+
+def get_zone_by_id(zone_id: str) -> Optional[Dict[str, Any]]:
+    versioned = _cached_versioned(zones_cache, db.collection(ZONES_COLLECTION).document(zone_id))
+    return versioned[0] if versioned else None
+
+
+def update_zone(zone_id: str, updates: Dict[str, Any], if_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    return _patch_cached(zones_cache, db.collection(ZONES_COLLECTION).document(zone_id), updates, if_match)
 
 
 def get_user_by_type(user_type: str) -> Optional[Dict[str, Any]]:
-    doc = db.collection(USERS_COLLECTION).document(user_type).get()
-    return doc.to_dict() if doc.exists else None
+    versioned = _cached_versioned(users_cache, db.collection(USERS_COLLECTION).document(user_type))
+    return versioned[0] if versioned else None
 
 
-def update_user(user_type: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    doc_ref = db.collection(USERS_COLLECTION).document(user_type)
-    doc = doc_ref.get()
-    if not doc.exists:
-        return None
-    doc_ref.update(updates)
-    return doc_ref.get().to_dict()
+def update_user(user_type: str, updates: Dict[str, Any], if_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    return _patch_cached(users_cache, db.collection(USERS_COLLECTION).document(user_type), updates, if_match)
+
+
+def query_notifications(filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                        limit: Optional[int] = None, cursor: Optional[str] = None,
+                        time_range=None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return _query_collection(NOTIFICATIONS_COLLECTION, filters, fields, limit, cursor, time_range)
 
 
 def get_all_notifications() -> List[Dict[str, Any]]:
@@ -190,44 +1062,594 @@ def get_all_notifications() -> List[Dict[str, Any]]:
 
 def get_notification_by_id(notification_id: int) -> Optional[Dict[str, Any]]:
     doc = db.collection(NOTIFICATIONS_COLLECTION).document(str(notification_id)).get()
-    return doc.to_dict() if doc.exists else None
+    return with_display_time(NOTIFICATIONS_COLLECTION, doc.to_dict()) if doc.exists else None
 
 
-def update_notification(notification_id: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def update_notification(notification_id: int, updates: Dict[str, Any], if_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
     doc_ref = db.collection(NOTIFICATIONS_COLLECTION).document(str(notification_id))
-    doc = doc_ref.get()
-    if not doc.exists:
-        return None
-    doc_ref.update(updates)
-    return doc_ref.get().to_dict()
+    updated = _patch_document(doc_ref, updates, lambda fresh: _read_versioned(doc_ref), if_match)
+    return with_display_time(NOTIFICATIONS_COLLECTION, updated)
 
 
 def create_notification(notif_data: Dict[str, Any]) -> Dict[str, Any]:
-    notifications = get_all_notifications()
-    max_id = max([n['id'] for n in notifications], default=0)
-    new_id = max_id + 1
+    new_id = allocate_ids(NOTIFICATIONS_COLLECTION)[0]
     
     notif_data['id'] = new_id
-    db.collection(NOTIFICATIONS_COLLECTION).document(str(new_id)).set(notif_data)
-    return notif_data
+    db.collection(NOTIFICATIONS_COLLECTION).document(str(new_id)).create(notif_data)
+    fan_out([notif_data])
+    return with_display_time(NOTIFICATIONS_COLLECTION, notif_data)
 
 
-def mark_all_notifications_read() -> None:
-    docs = db.collection(NOTIFICATIONS_COLLECTION).stream()
-    for doc in docs:
-        doc.reference.update({'read': True})
+def mark_all_notifications_read() -> int:
+    """Mark every unread notification read through a BulkWriter. Returns how many were updated."""
+    unread = db.collection(NOTIFICATIONS_COLLECTION).where(filter=FieldFilter('read', '==', False)).select([])
+    writer = db.bulk_writer()
+    count = 0
+    for doc in unread.stream():
+        writer.update(doc.reference, {'read': True})
+        count += 1
+    writer.close()
+    return count
 
 
-def get_stats() -> Dict[str, Any]:
-    signals = get_all_signals()
-    active_count = len([s for s in signals if s.get('status') != 'Resolved'])
-    critical_count = len([s for s in signals if s.get('riskLevel') == 'Critical'])
+# ---- Inboxes ----
+#
+# Every user (a users document) has an inbox. inboxes/{userId} holds its unread and total
+# counts, and its notifications subcollection a copy of each notification with that user's
+# read flag, so reading or clearing one user's notifications leaves everyone else's alone
+# and the unread count is a single document read.
+#
+# New notifications are fanned out to every inbox once their own commit succeeds, in the
+# background: each batch creates the new items for a group of users plus one Increment of
+# each of their counts, so counts always match items, and FANOUT_CONCURRENCY batches
+# commit at a time. A batch that fails, or finds an item already there (the backfill got to
+# it first), is retried with backoff as a transaction that re-reads the items and copies and
+# counts only the missing ones. Read changes update the items and the count in one transaction.
+
+_fanout_pool: Optional[ThreadPoolExecutor] = None
+
+# Attempts per fan-out batch, and the wait before the first retry (doubled after each).
+FANOUT_ATTEMPTS = 5
+FANOUT_RETRY_SECONDS = 0.5
+
+
+def _inbox_ref(user_id: str):
+    return db.collection(INBOXES_COLLECTION).document(user_id)
+
+
+def _load_user_ids() -> List[str]:
+    return [doc.id for doc in db.collection(USERS_COLLECTION).select([]).stream()]
+
+
+def _get_fanout_pool() -> ThreadPoolExecutor:
+    global _fanout_pool
+    if _fanout_pool is None:
+        _fanout_pool = ThreadPoolExecutor(max_workers=FANOUT_CONCURRENCY, thread_name_prefix='fanout')
+    return _fanout_pool
+
+
+def _inbox_item(notification: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: notification[field] for field in ('id', 'title', 'time', 'read', CREATED_AT) if field in notification}
+
+
+def _write_inbox_items(writer, user_id: str, items: List[Dict[str, Any]]) -> None:
+    inbox = _inbox_ref(user_id)
+    for item in items:
+        writer.create(inbox.collection(NOTIFICATIONS_COLLECTION).document(str(item['id'])), item)
+    unread = sum(1 for item in items if not item.get('read'))
+    writer.set(inbox, {'unread': firestore.Increment(unread), 'total': firestore.Increment(len(items))}, merge=True)
+
+
+@firestore.transactional
+def _copy_missing_txn(transaction, user_ids: List[str], items: List[Dict[str, Any]]) -> int:
+    refs = [_inbox_ref(user_id).collection(NOTIFICATIONS_COLLECTION).document(str(item['id'])) for user_id in user_ids for item in items]
+    have = {snap.reference.path for snap in transaction.get_all(refs) if snap.exists}
+    copied = 0
+    for user_id in user_ids:
+        items_ref = _inbox_ref(user_id).collection(NOTIFICATIONS_COLLECTION)
+        missing = [item for item in items if items_ref.document(str(item['id'])).path not in have]
+        if missing:
+            _write_inbox_items(transaction, user_id, missing)
+            copied += len(missing)
+    return copied
+
+
+def _commit_inbox_batch(user_ids: List[str], items: List[Dict[str, Any]]) -> None:
+    """Copy items into the users' inboxes, retrying until they are there or FANOUT_ATTEMPTS run out."""
+    for attempt in range(FANOUT_ATTEMPTS):
+        try:
+            if attempt == 0:
+                batch = db.batch()
+                for user_id in user_ids:
+                    _write_inbox_items(batch, user_id, items)
+                batch.commit()
+            else:
+                _copy_missing_txn(db.transaction(), user_ids, items)
+            return
+        except gcp_exceptions.Conflict:
+            # Some items are already there; the transaction copies only the rest.
+            continue
+        except Exception as exc:
+            if attempt == FANOUT_ATTEMPTS - 1:
+                raise
+            print(f"Notification fan-out batch failed, retrying: {exc}")
+            time.sleep(FANOUT_RETRY_SECONDS * 2 ** attempt)
+
+
+def _report_fanout(future: Future) -> None:
+    if future.exception() is not None:
+        print(f"Notification fan-out batch failed after {FANOUT_ATTEMPTS} attempts: {future.exception()}")
+
+
+def fan_out(notifications: List[Dict[str, Any]]) -> List[Future]:
+    """Copy notifications into every user's inbox in the background. Returns one future per batch."""
+    if not notifications:
+        return []
+    items = [_inbox_item(notification) for notification in notifications]
+    user_ids = users_cache.get_or_load(IDS, _load_user_ids)
+    futures = []
+    # A user's items and count must share a batch, so a batch holds as many users as fit.
+    for start in range(0, len(items), WRITE_BATCH_SIZE - 1):
+        group = items[start:start + WRITE_BATCH_SIZE - 1]
+        users_per_batch = WRITE_BATCH_SIZE // (len(group) + 1)
+        for offset in range(0, len(user_ids), users_per_batch):
+            future = _get_fanout_pool().submit(_commit_inbox_batch, user_ids[offset:offset + users_per_batch], group)
+            future.add_done_callback(_report_fanout)
+            futures.append(future)
+    return futures
+
+
+def backfill_inboxes() -> int:
+    """
+    Copy the notifications written before inboxes existed into every user's inbox, counting
+    them into unread and total, then mark the migration done. Each chunk is checked again in
+    its transaction and only missing items are copied and counted, so a repeated run, another
+    worker's run or a concurrent fan-out never counts an item twice. Returns how many were copied.
+    """
+    items = [_inbox_item(doc.to_dict()) for doc in db.collection(NOTIFICATIONS_COLLECTION).stream()]
+    futures = []
+    if items:
+        for user_id in _load_user_ids():
+            have = {doc.id for doc in _inbox_ref(user_id).collection(NOTIFICATIONS_COLLECTION).select([]).stream()}
+            missing = [item for item in items if str(item['id']) not in have]
+            for start in range(0, len(missing), WRITE_BATCH_SIZE - 1):
+                futures.append(_get_fanout_pool().submit(_copy_missing_txn, db.transaction(), [user_id], missing[start:start + WRITE_BATCH_SIZE - 1]))
+    count = sum(future.result() for future in futures)
+    _migrations_ref().set({'inboxBackfill': True}, merge=True)
+    return count
+
+
+def _inbox_content(notification: Dict[str, Any]) -> Dict[str, Any]:
+    # The read flag is the user's own; the rest follows the notification.
+    return {field: value for field, value in _inbox_item(notification).items() if field != 'read'}
+
+
+def _is_stale_copy(item: Dict[str, Any], notification: Dict[str, Any]) -> bool:
+    return any(item.get(field) != value for field, value in _inbox_content(notification).items())
+
+
+@firestore.transactional
+def _sync_inbox_txn(transaction, user_id: str, item_ids: List[str], notifications: Dict[str, Dict[str, Any]]) -> Tuple[int, int]:
+    items_ref = _inbox_ref(user_id).collection(NOTIFICATIONS_COLLECTION)
+    removed = unread = refreshed = 0
+    for snapshot in transaction.get_all([items_ref.document(item_id) for item_id in item_ids]):
+        if not snapshot.exists:
+            continue
+        item, notification = snapshot.to_dict(), notifications.get(snapshot.id)
+        if notification is None:
+            transaction.delete(snapshot.reference)
+            removed += 1
+            unread += not item.get('read')
+        elif _is_stale_copy(item, notification):
+            transaction.update(snapshot.reference, _inbox_content(notification))
+            refreshed += 1
+    if removed:
+        transaction.set(_inbox_ref(user_id), {'unread': firestore.Increment(-unread), 'total': firestore.Increment(-removed)}, merge=True)
+    return removed, refreshed
+
+
+def sync_inboxes() -> Dict[str, int]:
+    """
+    Bring every inbox in line with the notifications and users after they were bulk loaded:
+    copies of deleted notifications are removed and uncounted, copies of changed ones take
+    their new content, missing ones are copied by backfill_inboxes, and inboxes of deleted
+    users are emptied and removed. Returns how many items were removed, refreshed and copied.
+    """
+    notifications = {str(item['id']): item for item in (doc.to_dict() for doc in db.collection(NOTIFICATIONS_COLLECTION).stream())}
+    user_ids = set(_load_user_ids())
+    removed = refreshed = 0
+    for inbox in db.collection(INBOXES_COLLECTION).select([]).stream():
+        kept = notifications if inbox.id in user_ids else {}
+        stale = []
+        for doc in _inbox_ref(inbox.id).collection(NOTIFICATIONS_COLLECTION).stream():
+            notification = kept.get(doc.id)
+            if notification is None or _is_stale_copy(doc.to_dict(), notification):
+                stale.append(doc.id)
+        for start in range(0, len(stale), WRITE_BATCH_SIZE - 1):
+            counts = _sync_inbox_txn(db.transaction(), inbox.id, stale[start:start + WRITE_BATCH_SIZE - 1], kept)
+            removed += counts[0]
+            refreshed += counts[1]
+        if inbox.id not in user_ids:
+            inbox.reference.delete()
+    return {'removed': removed, 'refreshed': refreshed, 'copied': backfill_inboxes()}
+
+
+def shutdown_fanout() -> None:
+    """Wait for queued fan-out batches to commit."""
+    global _fanout_pool
+    if _fanout_pool is not None:
+        _fanout_pool.shutdown(wait=True)
+    _fanout_pool = None
+
+
+def query_inbox(user_id: str, filters: Dict[str, Any], fields: Optional[List[str]] = None,
+                limit: Optional[int] = None, cursor: Optional[str] = None,
+                time_range=None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    return _query_collection(NOTIFICATIONS_COLLECTION, filters, fields, limit, cursor, time_range, parent=_inbox_ref(user_id))
+
+
+def get_unread_count(user_id: str) -> Optional[int]:
+    """The user's unread count, or None if there is no such user."""
+    inbox = _inbox_ref(user_id).get()
+    if inbox.exists:
+        return inbox.to_dict().get('unread', 0)
+    return 0 if get_user_by_type(user_id) is not None else None
+
+
+@firestore.transactional
+def _update_inbox_txn(transaction, user_id: str, notification_id: int, updates: Dict[str, Any], if_match: Optional[str]) -> Optional[Dict[str, Any]]:
+    item_ref = _inbox_ref(user_id).collection(NOTIFICATIONS_COLLECTION).document(str(notification_id))
+    snapshot = item_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    old = snapshot.to_dict()
+    _check_if_match(old, if_match)
+    new = {**old, **updates}
+    transaction.update(item_ref, updates)
+    change = int(not new.get('read')) - int(not old.get('read'))
+    if change:
+        transaction.set(_inbox_ref(user_id), {'unread': firestore.Increment(change)}, merge=True)
+    return new
+
+
+def update_inbox_notification(user_id: str, notification_id: int, updates: Dict[str, Any], if_match: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    updated = _update_inbox_txn(db.transaction(), user_id, notification_id, updates, if_match)
+    return with_display_time(NOTIFICATIONS_COLLECTION, updated)
+
+
+@firestore.transactional
+def _mark_inbox_read_txn(transaction, user_id: str, notification_ids: List[str]) -> int:
+    items = _inbox_ref(user_id).collection(NOTIFICATIONS_COLLECTION)
+    unread = [snap for snap in transaction.get_all([items.document(notification_id) for notification_id in notification_ids])
+              if snap.exists and not snap.to_dict().get('read')]
+    for snap in unread:
+        transaction.update(snap.reference, {'read': True})
+    if unread:
+        transaction.set(_inbox_ref(user_id), {'unread': firestore.Increment(-len(unread))}, merge=True)
+    return len(unread)
+
+
+def mark_inbox_read(user_id: str) -> int:
+    """
+    Mark every unread item in one user's inbox read. Each chunk is re-read in its transaction,
+    so an item marked read in between isn't counted twice. Returns how many were updated.
+    """
+    count = 0
+    cursor = None
+    while True:
+        docs, cursor = _query_collection(NOTIFICATIONS_COLLECTION, {'read': False}, [], WRITE_BATCH_SIZE - 1, cursor, parent=_inbox_ref(user_id))
+        if docs:
+            count += _mark_inbox_read_txn(db.transaction(), user_id, [str(doc['id']) for doc in docs])
+        if cursor is None:
+            return count
+
+
+# ---- Archival ----
+#
+# Resolved signals and read notifications older than a cutoff move to the *_archive
+# collections, so the hot collections (and the full scans behind stats rebuilds) stay
+# bounded. Candidates come from an indexed createdAt range query; each chunk is then
+# re-read and moved in one transaction, so a document reopened or marked unread in
+# between stays put. Archived signals leave the stats and zone counters like deletes.
+
+# The most documents one archive commit may hold. Each archived signal may write its archive
+# copy, its delete and its zone, and the commit also writes the stats document once.
+ARCHIVE_CHUNK_SIZE = max(1, (WRITE_BATCH_SIZE - 1) // 3)
+
+
+@firestore.transactional
+def _archive_signals_txn(transaction, signal_ids: List[str], cutoff: datetime, archived_at: datetime, touched_zones: Set[str]) -> List[str]:
+    refs = [db.collection(SIGNALS_COLLECTION).document(signal_id) for signal_id in signal_ids]
+    snapshots = [snap for snap in transaction.get_all(refs) if snap.exists]
+    olds = [snap.to_dict() for snap in snapshots]
+    moving = [(snap, old) for snap, old in zip(snapshots, olds) if old.get('status') == 'Resolved' and old.get(CREATED_AT) and old[CREATED_AT] < cutoff]
+    aggregates = _read_aggregates(transaction, [old for _, old in moving])
+    
+    for snap, old in moving:
+        transaction.set(db.collection(SIGNALS_ARCHIVE_COLLECTION).document(snap.id), {**old, 'archivedAt': archived_at})
+        transaction.delete(snap.reference)
+    touched_zones.update(_write_aggregates(transaction, aggregates, [(old, None) for _, old in moving]))
+    return [snap.id for snap, _ in moving]
+
+
+@firestore.transactional
+def _archive_notifications_txn(transaction, notification_ids: List[str], cutoff: datetime, archived_at: datetime) -> int:
+    refs = [db.collection(NOTIFICATIONS_COLLECTION).document(notification_id) for notification_id in notification_ids]
+    moving = [(snap, snap.to_dict()) for snap in transaction.get_all(refs) if snap.exists]
+    moving = [(snap, old) for snap, old in moving if old.get('read') and old.get(CREATED_AT) and old[CREATED_AT] < cutoff]
+    
+    for snap, old in moving:
+        transaction.set(db.collection(NOTIFICATIONS_ARCHIVE_COLLECTION).document(snap.id), {**old, 'archivedAt': archived_at})
+        transaction.delete(snap.reference)
+    return len(moving)
+
+
+def _archive_candidates(collection: str, filters: Dict[str, Any], cutoff: datetime):
+    """Yield chunks of IDs matching filters with createdAt before cutoff."""
+    cursor = None
+    while True:
+        docs, cursor = _query_collection(collection, filters, [], ARCHIVE_CHUNK_SIZE, cursor, (None, cutoff))
+        if docs:
+            yield [str(doc['id']) for doc in docs]
+        if cursor is None:
+            return
+
+
+def archive_old_documents(older_than_days: float) -> Dict[str, int]:
+    """Move resolved signals and read notifications created more than older_than_days ago to the archive collections."""
+    archived_at = datetime.now(timezone.utc)
+    cutoff = archived_at - timedelta(days=older_than_days)
+    touched_zones: Set[str] = set()
+    signals = 0
+    for chunk in _archive_candidates(SIGNALS_COLLECTION, {'status': 'Resolved'}, cutoff):
+        for signal_id in _archive_signals_txn(db.transaction(), chunk, cutoff, archived_at, touched_zones):
+            _signal_removed(signal_id)
+            signals += 1
+    notifications = 0
+    for chunk in _archive_candidates(NOTIFICATIONS_COLLECTION, {'read': True}, cutoff):
+        notifications += _archive_notifications_txn(db.transaction(), chunk, cutoff, archived_at)
+    if signals:
+        response_cache.bump(SIGNALS_COLLECTION)
+    _invalidate_zones(touched_zones)
+    return {'signals': signals, 'notifications': notifications}
+
+# ---- Dashboard stats ----
+#
+# One document (stats/dashboard) holds the aggregate counters behind /api/stats.
+# Every signal write updates it in the same transaction, using the difference between
+# the signal's contribution before and after the write.
+#
+#   activeSignals    signals whose status is not Resolved
+#   criticalSignals  signals with riskLevel Critical (any status)
+#   byCategory       active signals per category
+#   byZone           active signals per zoneId (signals without a zoneId are not counted)
+#   history          {bucket start (ISO, UTC): health score at the end of that bucket}
+
+STATS_DOC_ID = 'dashboard'
+
+
+def _stats_ref():
+    return db.collection(STATS_COLLECTION).document(STATS_DOC_ID)
+
+
+def _empty_stats() -> Dict[str, Any]:
+    return {'activeSignals': 0, 'criticalSignals': 0, 'byCategory': {}, 'byZone': {}, 'history': {}}
+
+
+def _signal_contribution(signal: Optional[Dict[str, Any]]) -> Dict[tuple, int]:
+    contribution: Dict[tuple, int] = {}
+    if signal is None:
+        return contribution
+    if signal.get('status') != 'Resolved':
+        contribution[('activeSignals',)] = 1
+        contribution[('byCategory', signal.get('category', 'Uncategorized'))] = 1
+        if signal.get('zoneId'):
+            contribution[('byZone', signal['zoneId'])] = 1
+    if signal.get('riskLevel') == 'Critical':
+        contribution[('criticalSignals',)] = 1
+    return contribution
+
+
+def _apply_signal_change(stats: Dict[str, Any], old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> bool:
+    """Adjust the counters in ``stats`` for a signal going from ``old`` to ``new``. Returns whether anything changed."""
+    before, after = _signal_contribution(old), _signal_contribution(new)
+    changed = False
+    for key in before.keys() | after.keys():
+        delta = after.get(key, 0) - before.get(key, 0)
+        if not delta:
+            continue
+        changed = True
+        if len(key) == 1:
+            stats[key[0]] = stats.get(key[0], 0) + delta
+        else:
+            group = stats.setdefault(key[0], {})
+            group[key[1]] = group.get(key[1], 0) + delta
+            if group[key[1]] <= 0:
+                del group[key[1]]
+    return changed
+
+
+def _health_score(stats: Dict[str, Any]) -> int:
+    # Once the risk engine is built, its time-decayed score replaces the counter-based one.
+    if risk_engine.ready.is_set():
+        return risk_engine.health_score(time.time())
+    health = 100 - (stats.get('activeSignals', 0) * 2) - (stats.get('criticalSignals', 0) * 3)
+    return max(0, min(100, health))
+
+
+def _bucket_start(moment: datetime) -> int:
+    return int(moment.timestamp()) // STATS_BUCKET_SECONDS * STATS_BUCKET_SECONDS
+
+
+def _bucket_key(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _record_health(stats: Dict[str, Any], now: datetime) -> None:
+    """Store the current health score in this bucket and drop buckets that fell out of the trend window."""
+    history = stats.setdefault('history', {})
+    current = _bucket_start(now)
+    history[_bucket_key(current)] = _health_score(stats)
     
-    health = 100 - (active_count * 2) - (critical_count * 3)
-    health = max(0, min(100, health))
+    window_start = _bucket_key(current - (STATS_TREND_POINTS - 1) * STATS_BUCKET_SECONDS)
+    older = sorted(key for key in history if key < window_start)
+    # Keep the newest bucket before the window so the first trend point can be carried forward.
+    for key in older[:-1]:
+        del history[key]
+
+
+def _trend(stats: Dict[str, Any], now: datetime) -> List[int]:
+    """Health score at the end of each of the last STATS_TREND_POINTS buckets, carrying values forward across quiet buckets."""
+    history = stats.get('history', {})
+    keys = sorted(history)
+    current = _bucket_start(now)
+    trend = []
+    for i in range(STATS_TREND_POINTS - 1, -1, -1):
+        bucket = _bucket_key(current - i * STATS_BUCKET_SECONDS)
+        known = [key for key in keys if key <= bucket]
+        if known:
+            trend.append(history[known[-1]])
+    return trend or [_health_score(stats)]
+
+
+def _read_stats(transaction) -> Dict[str, Any]:
+    snapshot = _stats_ref().get(transaction=transaction)
+    if snapshot.exists:
+        return snapshot.to_dict()
+    return _compute_stats()
+
+
+def _write_stats(transaction, stats: Dict[str, Any], changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+    """Apply (old, new) signal changes to ``stats`` and write it once if any counter moved."""
+    changed = [_apply_signal_change(stats, old, new) for old, new in changes]
+    if any(changed):
+        _record_health(stats, datetime.now(timezone.utc))
+        transaction.set(_stats_ref(), stats)
+
+
+# ---- Zone counters ----
+#
+# Zones keep activeByRisk (active assigned signals per riskLevel). signalCount is their
+# sum and riskLevel is the most severe level present, or Stable when there is none. A zone
+# that predates this starts counting from zero the first time a signal touches it.
+
+ZONE_RISK_ORDER = ('Critical', 'Moderate', 'Low')
+
+
+def _zone_risk_level(active_by_risk: Dict[str, int]) -> str:
+    for level in ZONE_RISK_ORDER:
+        if active_by_risk.get(level, 0) > 0:
+            return level
+    return 'Stable'
+
+
+def _zone_counters(active_by_risk: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        'activeByRisk': active_by_risk,
+        'signalCount': sum(active_by_risk.values()),
+        'riskLevel': _zone_risk_level(active_by_risk),
+    }
+
+
+def _zone_ids(signals: List[Optional[Dict[str, Any]]]) -> List[str]:
+    return sorted({signal['zoneId'] for signal in signals if signal and signal.get('zoneId')})
+
+
+def _read_zones(transaction, zone_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if not zone_ids:
+        return {}
+    refs = [db.collection(ZONES_COLLECTION).document(zone_id) for zone_id in zone_ids]
+    return {snap.id: snap.to_dict() for snap in transaction.get_all(refs) if snap.exists}
+
+
+def _write_zones(transaction, zones: Dict[str, Dict[str, Any]], changes) -> Set[str]:
+    deltas: Dict[Tuple[str, str], int] = {}
+    for old, new in changes:
+        for signal, sign in ((old, -1), (new, 1)):
+            if signal and signal.get('zoneId') and signal.get('status') != 'Resolved':
+                key = (signal['zoneId'], signal.get('riskLevel', 'Low'))
+                deltas[key] = deltas.get(key, 0) + sign
     
+    touched: Set[str] = set()
+    for (zone_id, risk_level), delta in deltas.items():
+        if not delta or zone_id not in zones:
+            continue
+        counts = zones[zone_id].setdefault('activeByRisk', {})
+        counts[risk_level] = counts.get(risk_level, 0) + delta
+        if counts[risk_level] <= 0:
+            del counts[risk_level]
+        touched.add(zone_id)
+    
+    for zone_id in touched:
+        transaction.update(db.collection(ZONES_COLLECTION).document(zone_id), _zone_counters(zones[zone_id]['activeByRisk']))
+    return touched
+
+
+def rebuild_zone_counters() -> int:
+    """Recount every zone's counters from a full signals scan, like rebuild_stats. Returns how many zones were written."""
+    counts: Dict[str, Dict[str, int]] = {doc.id: {} for doc in db.collection(ZONES_COLLECTION).select([]).stream()}
+    for doc in db.collection(SIGNALS_COLLECTION).select(['zoneId', 'riskLevel', 'status']).stream():
+        signal = doc.to_dict()
+        if signal.get('zoneId') in counts and signal.get('status') != 'Resolved':
+            active_by_risk = counts[signal['zoneId']]
+            risk_level = signal.get('riskLevel', 'Low')
+            active_by_risk[risk_level] = active_by_risk.get(risk_level, 0) + 1
+    zone_ids = list(counts)
+    for start in range(0, len(zone_ids), WRITE_BATCH_SIZE):
+        batch = db.batch()
+        for zone_id in zone_ids[start:start + WRITE_BATCH_SIZE]:
+            batch.update(db.collection(ZONES_COLLECTION).document(zone_id), _zone_counters(counts[zone_id]))
+        batch.commit()
+    _invalidate_zones(set(zone_ids))
+    return len(zone_ids)
+
+
+def _read_aggregates(transaction, signals: List[Optional[Dict[str, Any]]]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """Everything a signal write adjusts besides the signal itself: the stats document and the signals' zones."""
+    return _read_stats(transaction), _read_zones(transaction, _zone_ids(signals))
+
+
+def _write_aggregates(transaction, aggregates, changes) -> Set[str]:
+    """Apply (old, new) signal changes to the stats document and zones. Returns the zone IDs written."""
+    stats, zones = aggregates
+    _write_stats(transaction, stats, changes)
+    return _write_zones(transaction, zones, changes)
+
+
+def _compute_stats() -> Dict[str, Any]:
+    stats = _empty_stats()
+    for signal in get_all_signals():
+        _apply_signal_change(stats, None, signal)
+    return stats
+
+
+def rebuild_stats() -> Dict[str, Any]:
+    """Recount the stats document from a full signals scan, keeping its health history."""
+    existing = _stats_ref().get()
+    stats = _compute_stats()
+    if existing.exists:
+        stats['history'] = existing.get('history') or {}
+    _record_health(stats, datetime.now(timezone.utc))
+    _stats_ref().set(stats)
+    return stats
+
+
+def stats_view(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a stats document into the Stats response."""
+    health = _health_score(stats)
+    # The current bucket ends now, so its trend point is the live score rather than the one last recorded.
+    trend = _trend(stats, datetime.now(timezone.utc))[:-1] + [health]
     return {
         'healthScore': health,
-        'activeSignals': active_count,
-        'trend': [65, 70, 68, 75, 80, 85, health]
+        'activeSignals': stats.get('activeSignals', 0),
+        'criticalSignals': stats.get('criticalSignals', 0),
+        'byCategory': stats.get('byCategory', {}),
+        'byZone': stats.get('byZone', {}),
+        'trend': trend
     }
+
+
+def get_stats() -> Dict[str, Any]:
+    snapshot = _stats_ref().get()
+    stats = snapshot.to_dict() if snapshot.exists else rebuild_stats()
+    return stats_view(stats)
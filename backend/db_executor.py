@@ -0,0 +1,69 @@
+"""
+Bounded thread-pool executor for running blocking Firestore calls off the event loop.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from settings import FIRESTORE_MAX_CONCURRENCY
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_max_concurrency = FIRESTORE_MAX_CONCURRENCY
+_in_flight = 0
+_waiting = 0
+
+
+def configure(max_concurrency: int) -> None:
+    """Change the concurrency limit. Takes effect for executors created afterwards."""
+    global _max_concurrency
+    shutdown()
+    _max_concurrency = max_concurrency
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_max_concurrency, thread_name_prefix='firestore')
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(_max_concurrency)
+    return _semaphore
+
+
+async def run(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking call in the pool, waiting for a free slot first."""
+    global _in_flight, _waiting
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context so per-request state (metrics.request_stats) follows the call.
+    context = contextvars.copy_context()
+    semaphore = _get_semaphore()
+    _waiting += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _waiting -= 1
+    _in_flight += 1
+    try:
+        return await loop.run_in_executor(_get_executor(), functools.partial(context.run, fn, *args, **kwargs))
+    finally:
+        _in_flight -= 1
+        semaphore.release()
+
+
+def stats() -> Dict[str, int]:
+    return {'maxConcurrency': _max_concurrency, 'inFlight': _in_flight, 'waiting': _waiting}
+
+
+def shutdown() -> None:
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+    _executor = None
+    _semaphore = None
@@ -2,23 +2,72 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 import json
+import threading
 
-if not firebase_admin._apps:
-    # Try to get from environment variable first (for Render)
-    firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
-    if firebase_creds_json:
-        cred_dict = json.loads(firebase_creds_json)
-        cred = credentials.Certificate(cred_dict)
-    else:
-        # Fall back to local file (for local development)
-        SERVICE_ACCOUNT_PATH = os.path.join(os.path.dirname(__file__), 'serviceAccountKey.json')
-        cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
-    
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+# The Firestore client is created on first use rather than at import time, so importing
+# the app (and a cold start that never touches Firestore before its first request) does
+# no credential loading or channel setup. `db` is a stand-in that forwards to the client.
+# With FIRESTORE_SKIP_SEED_CHECK set, startup itself never creates it: the cache listeners
+# start once it exists, and the search index and risk engine are built in the background.
+
+_client = None
+_client_lock = threading.Lock()
+_client_hooks = []
+
+
+def _create_client():
+    if not firebase_admin._apps:
+        # Try to get from environment variable first (for Render)
+        firebase_creds_json = os.getenv('FIREBASE_CREDENTIALS')
+        if firebase_creds_json:
+            cred_dict = json.loads(firebase_creds_json)
+            cred = credentials.Certificate(cred_dict)
+        else:
+            # Fall back to local file (for local development)
+            SERVICE_ACCOUNT_PATH = os.path.join(os.path.dirname(__file__), 'serviceAccountKey.json')
+            cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+
+        firebase_admin.initialize_app(cred)
+
+    return firestore.client()
+
+
+def get_db():
+    """The Firestore client, created on the first call."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = _create_client()
+                for hook in _client_hooks:
+                    hook(client)
+                _client = client
+    return _client
+
+
+def on_client_created(hook) -> None:
+    """Call hook(client) once the client exists (immediately if it already does)."""
+    with _client_lock:
+        if _client is None:
+            _client_hooks.append(hook)
+            return
+    hook(_client)
+
+
+class _LazyClient:
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+
+db = _LazyClient()
 
 SIGNALS_COLLECTION = 'signals'
 ZONES_COLLECTION = 'zones'
 USERS_COLLECTION = 'users'
 NOTIFICATIONS_COLLECTION = 'notifications'
+COUNTERS_COLLECTION = 'counters'
+STATS_COLLECTION = 'stats'
+INCIDENTS_COLLECTION = 'incidents'
+SIGNALS_ARCHIVE_COLLECTION = 'signals_archive'
+NOTIFICATIONS_ARCHIVE_COLLECTION = 'notifications_archive'
+INBOXES_COLLECTION = 'inboxes'
@@ -0,0 +1,209 @@
+"""
+Bulk signal ingest for sensor feeds and other high-volume reporters.
+
+Items are validated against SignalCreate one by one, so a bad item is reported without
+failing its neighbours. Valid items go into an async write queue that coalesces them,
+across requests, into batched commits of up to INGEST_FLUSH_SIZE signals. A batch is
+flushed when it is full or INGEST_FLUSH_INTERVAL seconds after its first item arrived.
+"""
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+import database
+import metrics
+from db_executor import run
+from models import SignalCreate
+from settings import INGEST_FLUSH_SIZE, INGEST_FLUSH_INTERVAL
+
+
+def signal_document(signal: SignalCreate) -> Dict[str, Any]:
+    document = {
+        'title': signal.title,
+        'category': signal.category,
+        'location': signal.location,
+        'timestamp': "Just now",
+        'riskLevel': signal.riskLevel,
+        'description': signal.description,
+        'status': "Open",
+        'createdAt': datetime.now(timezone.utc),
+    }
+    if signal.lat is not None and signal.lng is not None:
+        document['lat'] = signal.lat
+        document['lng'] = signal.lng
+    return document
+
+
+def notification_document(signal: SignalCreate) -> Dict[str, Any]:
+    return {
+        'title': f"New Signal: {signal.title[:30]}...",
+        'time': "Just now",
+        'read': False,
+        'createdAt': datetime.now(timezone.utc),
+    }
+
+
+class IngestQueue:
+    def __init__(self, flush_size: int = INGEST_FLUSH_SIZE, flush_interval: float = INGEST_FLUSH_INTERVAL):
+        self.flush_size = max(1, min(flush_size, database.SIGNALS_PER_COMMIT))
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[SignalCreate, bool, asyncio.Future]] = []
+        self._has_items = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushed_items = 0
+        self.flushes = 0
+        self.failed_items = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = metrics.start_background_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush whatever is queued, then stop the worker."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._has_items.set()
+        self._full.set()
+        await self._task
+        self._task = None
+        self._stopping = False
+
+    def submit(self, signal: SignalCreate, notify: bool) -> asyncio.Future:
+        """Queue one validated signal; the future resolves to the stored signal dict."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((signal, notify, future))
+        self._has_items.set()
+        if len(self._pending) >= self.flush_size:
+            self._full.set()
+        return future
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_items.wait()
+            if self._stopping and not self._pending:
+                return
+            if len(self._pending) < self.flush_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush()
+
+    async def _flush(self) -> None:
+        batch = self._pending[:self.flush_size]
+        del self._pending[:self.flush_size]
+        if len(self._pending) < self.flush_size and not self._stopping:
+            self._full.clear()
+        if not self._pending and not self._stopping:
+            self._has_items.clear()
+        if not batch:
+            return
+
+        signals = [signal_document(signal) for signal, _, _ in batch]
+        notifications = [notification_document(signal) if notify else None for signal, notify, _ in batch]
+        try:
+            stored = await run(database.ingest_signals, signals, notifications)
+        except Exception as exc:
+            self.failed_items += len(batch)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.flushes += 1
+        self.flushed_items += len(batch)
+        for (_, _, future), signal_data in zip(batch, stored):
+            if not future.done():
+                future.set_result(signal_data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'depth': self.depth,
+            'flushes': self.flushes,
+            'flushedItems': self.flushed_items,
+            'failedItems': self.failed_items,
+        }
+
+
+queue: Optional[IngestQueue] = None
+
+
+def get_queue() -> IngestQueue:
+    global queue
+    if queue is None:
+        queue = IngestQueue()
+    return queue
+
+
+async def iter_list(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Yield one parsed value (or the JSONDecodeError) per non-blank line of an NDJSON body."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as exc:
+        return exc
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'item'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+async def ingest(items: AsyncIterator[Any], notify: bool, max_items: int) -> Dict[str, Any]:
+    """Validate and queue every item, then wait for their commits. Returns per-item results in input order."""
+    q = get_queue()
+    results: List[Optional[Dict[str, Any]]] = []
+    waiting: List[Tuple[int, asyncio.Future]] = []
+    index = 0
+    async for item in items:
+        if index >= max_items:
+            results.append({'index': index, 'error': f"Too many items; at most {max_items} per request"})
+            break
+        if isinstance(item, Exception):
+            results.append({'index': index, 'error': f"Invalid JSON: {item}"})
+        else:
+            try:
+                signal = SignalCreate.model_validate(item)
+            except ValidationError as exc:
+                results.append({'index': index, 'error': _error_message(exc)})
+            else:
+                results.append(None)
+                waiting.append((index, q.submit(signal, notify)))
+        index += 1
+
+    outcomes = await asyncio.gather(*(future for _, future in waiting), return_exceptions=True)
+    for (item_index, _), outcome in zip(waiting, outcomes):
+        if isinstance(outcome, Exception):
+            results[item_index] = {'index': item_index, 'error': f"Write failed: {outcome}"}
+        else:
+            results[item_index] = {'index': item_index, 'id': outcome['id']}
+
+    accepted = sum(1 for result in results if 'id' in result)
+    return {'accepted': accepted, 'rejected': len(results) - accepted, 'results': results}
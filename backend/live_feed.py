@@ -0,0 +1,191 @@
+"""
+Process-wide live feed of Firestore changes.
+
+One on_snapshot listener per watched collection (plus the stats document) is shared by
+every connected client. Listener callbacks arrive on Firestore's background threads and
+are handed to the event loop, which numbers each change and fans it out to per-client
+queues.
+
+Event IDs look like "<process epoch>-<sequence>". A reconnecting client sends the last
+one it saw as Last-Event-ID; if it came from this process and is still in the replay
+buffer the missed events are replayed, otherwise the client is told to resync.
+"""
+import asyncio
+import json
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+
+import database
+from firebase_config import db, SIGNALS_COLLECTION, NOTIFICATIONS_COLLECTION, STATS_COLLECTION
+from settings import LIVE_FEED_HISTORY, LIVE_FEED_CLIENT_QUEUE
+
+TOPICS = ('signals', 'notifications', 'stats')
+
+
+@dataclass
+class FeedEvent:
+    id: str
+    event: str
+    data: str
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {self.data}\n\n"
+
+
+class Subscription:
+    """One connected client. Its queue is bounded; a client that falls behind gets a single resync event."""
+
+    def __init__(self, topics: Set[str], queue_size: int):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, event: FeedEvent, resync: FeedEvent) -> None:
+        if event.event != 'resync' and event.event not in self.topics:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: discard its backlog and have it refetch instead of buffering without bound.
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(resync)
+
+
+class LiveFeed:
+    def __init__(self, history_size: int = LIVE_FEED_HISTORY, client_queue_size: int = LIVE_FEED_CLIENT_QUEUE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self._history: Deque[FeedEvent] = deque(maxlen=history_size)
+        self._client_queue_size = client_queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._watches: List[Any] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Register the shared snapshot listeners. Safe to call more than once."""
+        if self._loop is not None:
+            return
+        self._loop = loop
+        self._watches = [
+            db.collection(SIGNALS_COLLECTION).on_snapshot(self._listener('signals', SIGNALS_COLLECTION)),
+            db.collection(NOTIFICATIONS_COLLECTION).on_snapshot(self._listener('notifications', NOTIFICATIONS_COLLECTION)),
+            db.collection(STATS_COLLECTION).document(database.STATS_DOC_ID).on_snapshot(self._stats_listener()),
+        ]
+
+    def stop(self) -> None:
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+        self._loop = None
+
+    # -- Firestore callbacks (background threads) --
+
+    def _listener(self, topic: str, collection: str):
+        initial = True
+
+        def on_snapshot(docs, changes, read_time):
+            nonlocal initial
+            if initial:
+                # The first callback is the full current result set, which clients already fetched over REST.
+                initial = False
+                return
+            diffs = [
+                {
+                    'type': change.type.name.lower(),
+                    'id': change.document.id,
+                    'data': database.with_display_time(collection, change.document.to_dict()) if change.type.name != 'REMOVED' else None,
+                }
+                for change in changes
+            ]
+            if diffs:
+                self._dispatch(topic, diffs)
+
+        return on_snapshot
+
+    def _stats_listener(self):
+        initial = True
+
+        def on_snapshot(docs, changes, read_time):
+            nonlocal initial
+            if initial:
+                initial = False
+                return
+            for doc in docs:
+                if doc.exists:
+                    self._dispatch('stats', database.stats_view(doc.to_dict()))
+
+        return on_snapshot
+
+    def _dispatch(self, topic: str, payload: Any) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._publish, topic, json.dumps(jsonable_encoder(payload)))
+
+    # -- Event loop side --
+
+    def _next_id(self) -> str:
+        self._sequence += 1
+        return f"{self.epoch}-{self._sequence}"
+
+    def _resync_event(self) -> FeedEvent:
+        return FeedEvent(id=f"{self.epoch}-{self._sequence}", event='resync', data='{}')
+
+    def _publish(self, topic: str, data: str) -> None:
+        event = FeedEvent(id=self._next_id(), event=topic, data=data)
+        self._history.append(event)
+        resync = self._resync_event()
+        for subscription in list(self._subscribers):
+            subscription.offer(event, resync)
+
+    def _replay(self, last_event_id: str) -> Optional[List[FeedEvent]]:
+        """Events after last_event_id, or None if they can't be replayed from this process."""
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence_number = int(sequence)
+        if sequence_number == self._sequence:
+            return []
+        oldest = int(self._history[0].id.partition('-')[2]) if self._history else self._sequence + 1
+        if sequence_number < oldest - 1 or sequence_number > self._sequence:
+            return None
+        return [event for event in self._history if int(event.id.partition('-')[2]) > sequence_number]
+
+    def subscribe(self, topics: Set[str], last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(topics, self._client_queue_size)
+        if last_event_id:
+            missed = self._replay(last_event_id)
+            if missed is None:
+                subscription.offer(self._resync_event(), self._resync_event())
+            else:
+                for event in missed:
+                    subscription.offer(event, self._resync_event())
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'clients': len(self._subscribers),
+            'listeners': len(self._watches),
+            'lastEventId': f"{self.epoch}-{self._sequence}",
+            'droppedEvents': sum(s.dropped for s in self._subscribers),
+        }
+
+
+feed = LiveFeed()
@@ -1,17 +1,125 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
+import time
 
-from routers import signals, zones, stats, users, notifications
-import database as db
+from routers import signals, zones, stats, users, notifications, stream, incidents
+from routers.listing import NEXT_CURSOR_HEADER
+from export import NEXT_CHANGED_SINCE_HEADER
+import async_database as db
+from database import InvalidCursor, PreconditionFailed, ScoringUnavailable, SearchUnavailable, risk_engine, signal_search
+import db_executor
+from live_feed import feed
+from settings import CACHE_SNAPSHOT_INVALIDATION, FIRESTORE_SKIP_SEED_CHECK, ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL_SECONDS, SEARCH_INDEX_ENABLED
+import cache
+import ingest
+import write_behind
+import shared_state
+import metrics
+import response_cache
+import firebase_config
+
+firebase_config.on_client_created(metrics.instrument_firestore)
+
+# Startup phase timings in ms, reported by /health.
+startup = {}
+
+
+async def archive_periodically():
+    """Move old resolved signals and read notifications to the archive collections every ARCHIVE_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        try:
+            archived = await db.archive_old_documents(ARCHIVE_AFTER_DAYS)
+        except Exception as exc:
+            print(f"Archival failed: {exc}")
+            continue
+        if archived['signals'] or archived['notifications']:
+            print(f"Archived {archived['signals']} signals and {archived['notifications']} notifications")
+
+
+async def start_invalidation_listeners():
+    start = time.perf_counter()
+    try:
+        await db_executor.run(cache.start_invalidation_listeners)
+    except Exception as exc:
+        print(f"Cache invalidation listeners failed to start: {exc}")
+        return
+    startup['listenersMs'] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def build_search_index():
+    start = time.perf_counter()
+    try:
+        count = await db.build_search_index()
+    except Exception as exc:
+        print(f"Search index build failed: {exc}")
+        return
+    startup['searchIndexMs'] = round((time.perf_counter() - start) * 1000, 1)
+    print(f"Search index built over {count} signals in {startup['searchIndexMs']}ms")
+
+
+async def build_risk_engine():
+    start = time.perf_counter()
+    try:
+        count = await db.build_risk_engine()
+    except Exception as exc:
+        print(f"Risk engine build failed: {exc}")
+        return
+    startup['riskEngineMs'] = round((time.perf_counter() - start) * 1000, 1)
+    print(f"Risk engine built over {count} signals in {startup['riskEngineMs']}ms")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Initializing Firebase Firestore...")
-    db.initialize_firestore()
+    start = time.perf_counter()
+    if FIRESTORE_SKIP_SEED_CHECK:
+        print("Skipping Firestore seed check (FIRESTORE_SKIP_SEED_CHECK)")
+    else:
+        startup.update(await db.initialize_firestore())
+    background = []
+    if CACHE_SNAPSHOT_INVALIDATION:
+        # Started in the background once the Firestore client exists, so a worker that skips the seed check
+        # doesn't create the client at startup just for the listeners, and one that doesn't isn't held up by them.
+        loop = asyncio.get_running_loop()
+
+        def on_client_created(client):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(lambda: background.append(metrics.start_background_task(start_invalidation_listeners())))
+        firebase_config.on_client_created(on_client_created)
+    if write_behind.get_log() is not None:
+        await write_behind.get_log().start()
+    startup['totalMs'] = round((time.perf_counter() - start) * 1000, 1)
+    print(f"Startup complete in {startup['totalMs']}ms: {startup}")
+    if SEARCH_INDEX_ENABLED:
+        # Built in the background so a large collection doesn't hold up startup; search answers 503 until it's ready.
+        background.append(metrics.start_background_task(build_search_index()))
+    # Likewise for the risk engine: zone risk and the heatmap answer 503, and stats use the counter-based health score, until it's ready.
+    # With shared state only the refresher builds it, on taking that role; the other workers serve its results.
+    def start_risk_engine():
+        background.append(metrics.start_background_task(build_risk_engine()))
+    if shared_state.get_state() is not None:
+        shared_state.get_state().start(start_risk_engine)
+    else:
+        start_risk_engine()
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        background.append(metrics.start_background_task(archive_periodically()))
     yield
     print("Shutting down...")
+    for task in background:
+        task.cancel()
+    if shared_state.get_state() is not None:
+        await shared_state.get_state().stop()
+    await ingest.get_queue().stop()
+    if write_behind.get_log() is not None:
+        await write_behind.get_log().stop()
+    feed.stop()
+    cache.stop_invalidation_listeners()
+    await db.stop_incident_watch()
+    await db.shutdown_fanout()
+    db_executor.shutdown()
 
 
 app = FastAPI(
@@ -33,15 +141,39 @@ app.add_middleware(
         "http://localhost:5173",
     ],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, NEXT_CHANGED_SINCE_HEADER, "ETag", "X-Heatmap-Width", "X-Heatmap-Height", "X-Heatmap-Bounds"],
 )
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+
+@app.exception_handler(PreconditionFailed)
+async def precondition_failed_handler(request: Request, exc: PreconditionFailed):
+    return JSONResponse(status_code=412, content={"detail": "Resource was modified; fetch it again and retry"})
+
+
+@app.exception_handler(SearchUnavailable)
+async def search_unavailable_handler(request: Request, exc: SearchUnavailable):
+    return JSONResponse(status_code=503, content={"detail": "Search index is still building"}, headers={"Retry-After": "5"})
+
+
+@app.exception_handler(ScoringUnavailable)
+async def scoring_unavailable_handler(request: Request, exc: ScoringUnavailable):
+    return JSONResponse(status_code=503, content={"detail": "Risk scores are still being computed"}, headers={"Retry-After": "5"})
+
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": "Invalid cursor"})
 
 app.include_router(signals.router, prefix="/api")
 app.include_router(zones.router, prefix="/api")
 app.include_router(stats.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(notifications.router, prefix="/api")
+app.include_router(stream.router, prefix="/api")
+app.include_router(incidents.router, prefix="/api")
 
 
 @app.get("/")
@@ -54,6 +186,13 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "database": "Firebase Firestore"}
+    return {"status": "healthy", "database": "Firebase Firestore", "startup": startup, "caches": cache.stats(),
+            "responseCache": response_cache.responses.stats(), "search": signal_search.stats(), "risk": risk_engine.stats(),
+            "writeBehind": write_behind.stats(), "sharedState": shared_state.stats()}
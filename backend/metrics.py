@@ -0,0 +1,310 @@
+"""
+Request and Firestore metrics in the Prometheus text exposition format, served on /metrics.
+
+RequestMetricsMiddleware times every request and keeps a RequestStats in a context
+variable while it runs. instrument_firestore wraps the RPC methods of the Firestore
+client, so each RPC, and each document it reads, streams or writes, is added to the
+current request's RequestStats; db_executor.run carries the context into its worker
+threads. When the request finishes its counts are folded into per-route totals and a
+documents-read-per-request histogram, which is where full-collection scans show up.
+RPCs made outside a request (startup, ingest flushes, listeners) are reported under
+route="(background)".
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import cache
+import db_executor
+import ingest
+import response_cache
+import write_behind
+from live_feed import feed
+
+BACKGROUND = '(background)'
+UNMATCHED = '(unmatched)'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DOCUMENT_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# GAPIC methods the synchronous Firestore client calls. The streaming ones yield documents.
+RPC_METHODS = (
+    'batch_get_documents', 'run_query', 'run_aggregation_query', 'commit', 'batch_write',
+    'begin_transaction', 'rollback', 'list_documents', 'list_collection_ids', 'partition_query',
+)
+
+
+class RequestStats:
+    def __init__(self):
+        self.rpcs: Counter = Counter()
+        self.documents_read = 0
+        self.documents_streamed = 0
+        self.documents_written = 0
+        self._lock = threading.Lock()
+
+    def add(self, rpc: Optional[str] = None, read: int = 0, streamed: int = 0, written: int = 0) -> None:
+        # Several executor threads may work for the same request at once.
+        with self._lock:
+            if rpc:
+                self.rpcs[rpc] += 1
+            self.documents_read += read
+            self.documents_streamed += streamed
+            self.documents_written += written
+
+
+request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar('request_stats', default=None)
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        # Per series: one cumulative count per bucket, then sum and count.
+        series = self.series.setdefault(labels, [0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+_lock = threading.Lock()
+_requests: Counter = Counter()  # (method, route, status)
+_durations = _Histogram(LATENCY_BUCKETS)  # (method, route)
+_documents_per_request = _Histogram(DOCUMENT_BUCKETS)  # (method, route)
+_rpcs: Counter = Counter()  # (method, route, rpc)
+_documents: Dict[str, Counter] = defaultdict(Counter)  # kind -> (method, route)
+_background = RequestStats()
+
+
+def record_rpc(rpc: Optional[str] = None, read: int = 0, streamed: int = 0, written: int = 0) -> None:
+    stats = request_stats.get()
+    (stats if stats is not None else _background).add(rpc, read, streamed, written)
+
+
+def start_background_task(coroutine) -> asyncio.Task:
+    """
+    Run coroutine as a task in an empty context, so its RPCs are reported as background work
+    rather than against whichever request happened to start it.
+    """
+    return contextvars.Context().run(asyncio.get_running_loop().create_task, coroutine)
+
+
+def _finish_request(method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+    labels = (method, route)
+    with _lock:
+        _requests[(method, route, str(status))] += 1
+        _durations.observe(labels, seconds)
+        _documents_per_request.observe(labels, stats.documents_read)
+        for rpc, count in stats.rpcs.items():
+            _rpcs[(method, route, rpc)] += count
+        _documents['read'][labels] += stats.documents_read
+        _documents['streamed'][labels] += stats.documents_streamed
+        _documents['written'][labels] += stats.documents_written
+
+
+class RequestMetricsMiddleware:
+    """Plain ASGI middleware, so streaming responses (SSE) pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_stats.reset(token)
+            _finish_request(scope['method'], _route_template(scope), status, time.perf_counter() - start, stats)
+
+
+def _route_template(scope) -> str:
+    """
+    Label requests by route template, never the raw path, to keep the number of series bounded:
+    /api/signals/s12 becomes /api/signals/{signal_id}, using the params the router matched.
+    """
+    if scope.get('route') is None:
+        return UNMATCHED
+    segments = scope['path'].split('/')
+    for name, value in scope.get('path_params', {}).items():
+        for i in range(len(segments) - 1, -1, -1):
+            if segments[i] == str(value):
+                segments[i] = '{' + name + '}'
+                break
+    return '/'.join(segments)
+
+
+# ---- Firestore client instrumentation ----
+
+def _request_field(args, kwargs, name: str) -> Any:
+    request = kwargs.get('request', args[0] if args else None)
+    if request is None:
+        return None
+    if isinstance(request, dict):
+        return request.get(name)
+    return getattr(request, name, None)
+
+
+def _counted_stream(responses: Iterable[Any], field: str, streamed: bool):
+    count = 0
+    try:
+        for response in responses:
+            if field in response:
+                count += 1
+            yield response
+    finally:
+        record_rpc(read=count, streamed=count if streamed else 0)
+
+
+def _instrument_method(name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        writes = len(_request_field(args, kwargs, 'writes') or ()) if name in ('commit', 'batch_write') else 0
+        record_rpc(name, written=writes)
+        result = method(*args, **kwargs)
+        if name == 'batch_get_documents':
+            return _counted_stream(result, 'found', streamed=False)
+        if name == 'run_query':
+            return _counted_stream(result, 'document', streamed=True)
+        return result
+    return wrapper
+
+
+def instrument_firestore(client) -> None:
+    """Count the RPCs issued through this client. Safe to call more than once."""
+    if getattr(client, '_metrics_instrumented', False):
+        return
+    listeners = getattr(client, 'rpc_listeners', None)
+    if listeners is not None:
+        # benchmarks/fake_firestore.py reports its simulated RPCs through this hook.
+        listeners.append(lambda rpc, reads, writes: record_rpc(
+            rpc, read=reads, streamed=reads if rpc == 'run_query' else 0, written=writes
+        ))
+    else:
+        api = client._firestore_api
+        for name in RPC_METHODS:
+            if hasattr(api, name):
+                setattr(api, name, _instrument_method(name, getattr(api, name)))
+    client._metrics_instrumented = True
+
+
+# ---- Exposition ----
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _metric(lines: List[str], name: str, kind: str, help_text: str, samples: Iterable[Tuple[str, float]]) -> None:
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{name}{labels} {_format_number(value)}')
+
+
+def _histogram(lines: List[str], name: str, help_text: str, histogram: _Histogram, names: Tuple[str, ...]) -> None:
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for values, series in sorted(histogram.series.items()):
+        for bound, count in zip(histogram.buckets, series):
+            le = 'le="%s"' % _format_number(bound)
+            lines.append(f'{name}_bucket{_labels(names, values, le)} {count}')
+        le = 'le="+Inf"'
+        lines.append(f'{name}_bucket{_labels(names, values, le)} {series[-1]}')
+        lines.append(f'{name}_sum{_labels(names, values)} {_format_number(series[-2])}')
+        lines.append(f'{name}_count{_labels(names, values)} {series[-1]}')
+
+
+def render() -> str:
+    lines: List[str] = []
+    route = ('method', 'route')
+    with _lock:
+        background = ('', BACKGROUND)
+        rpcs = dict(_rpcs)
+        for rpc, count in _background.rpcs.items():
+            rpcs[background + (rpc,)] = count
+        documents = {kind: dict(_documents[kind]) for kind in ('read', 'streamed', 'written')}
+        documents['read'][background] = _background.documents_read
+        documents['streamed'][background] = _background.documents_streamed
+        documents['written'][background] = _background.documents_written
+
+        _metric(lines, 'earlyshield_http_requests_total', 'counter', 'HTTP requests by route template and status.',
+                ((_labels(('method', 'route', 'status'), key), value) for key, value in sorted(_requests.items())))
+        _histogram(lines, 'earlyshield_http_request_duration_seconds', 'Request latency by route template.', _durations, route)
+        _metric(lines, 'earlyshield_firestore_rpcs_total', 'counter', 'Firestore RPCs issued while serving each route.',
+                ((_labels(('method', 'route', 'rpc'), key), value) for key, value in sorted(rpcs.items())))
+        for kind, help_text in (
+            ('read', 'Documents returned by Firestore gets and queries.'),
+            ('streamed', 'Documents streamed back by Firestore queries.'),
+            ('written', 'Documents written by Firestore commits and batch writes.'),
+        ):
+            _metric(lines, f'earlyshield_firestore_documents_{kind}_total', 'counter', help_text,
+                    ((_labels(route, key), value) for key, value in sorted(documents[kind].items())))
+        _histogram(lines, 'earlyshield_firestore_documents_read_per_request',
+                   'Documents read per request; a high bucket means a collection scan.', _documents_per_request, route)
+
+    cache_stats = cache.stats()
+    for field, kind in (('hits', 'counter'), ('misses', 'counter'), ('coalesced', 'counter'), ('loads', 'counter'),
+                        ('evictions', 'counter'), ('expirations', 'counter'), ('invalidations', 'counter'), ('size', 'gauge')):
+        name = f'earlyshield_cache_{field}' + ('_total' if kind == 'counter' else '')
+        _metric(lines, name, kind, f'Read-through cache {field}.',
+                ((_labels(('cache',), (cache_name,)), stats[field]) for cache_name, stats in sorted(cache_stats.items())))
+
+    responses = response_cache.responses.stats()
+    _metric(lines, 'earlyshield_response_cache_hits_total', 'counter', 'List responses served from the encoded response cache.', (('', responses['hits']),))
+    _metric(lines, 'earlyshield_response_cache_misses_total', 'counter', 'List responses that had to be built.', (('', responses['misses']),))
+    _metric(lines, 'earlyshield_response_cache_not_modified_total', 'counter', 'List requests answered with 304 Not Modified.', (('', responses['notModified']),))
+    _metric(lines, 'earlyshield_response_cache_size', 'gauge', 'Encoded responses held.', (('', responses['size']),))
+
+    queue = ingest.get_queue().stats()
+    _metric(lines, 'earlyshield_ingest_queue_depth', 'gauge', 'Signals waiting in the ingest queue.', (('', queue['depth']),))
+    _metric(lines, 'earlyshield_ingest_flushes_total', 'counter', 'Ingest queue commits.', (('', queue['flushes']),))
+    _metric(lines, 'earlyshield_ingest_flushed_items_total', 'counter', 'Signals committed by the ingest queue.', (('', queue['flushedItems']),))
+    _metric(lines, 'earlyshield_ingest_failed_items_total', 'counter', 'Signals whose ingest commit failed.', (('', queue['failedItems']),))
+
+    pending = write_behind.stats()
+    if pending['enabled']:
+        _metric(lines, 'earlyshield_write_behind_depth', 'gauge', 'Logged signals not yet committed to Firestore.', (('', pending['depth']),))
+        _metric(lines, 'earlyshield_write_behind_lag_seconds', 'gauge', 'Age of the oldest logged signal not yet committed.', (('', pending['lagSeconds']),))
+        _metric(lines, 'earlyshield_write_behind_flushed_items_total', 'counter', 'Logged signals committed to Firestore.', (('', pending['flushedItems']),))
+        _metric(lines, 'earlyshield_write_behind_failed_flushes_total', 'counter', 'Write-behind commits that failed and were retried.', (('', pending['failedFlushes']),))
+
+    executor = db_executor.stats()
+    _metric(lines, 'earlyshield_db_executor_in_flight', 'gauge', 'Firestore calls running on the executor.', (('', executor['inFlight']),))
+    _metric(lines, 'earlyshield_db_executor_waiting', 'gauge', 'Firestore calls waiting for an executor slot.', (('', executor['waiting']),))
+    _metric(lines, 'earlyshield_db_executor_max_concurrency', 'gauge', 'Executor concurrency limit.', (('', executor['maxConcurrency']),))
+
+    live = feed.stats()
+    _metric(lines, 'earlyshield_live_feed_clients', 'gauge', 'Connected live feed clients.', (('', live['clients']),))
+    _metric(lines, 'earlyshield_live_feed_dropped_events', 'gauge', 'Events dropped for slow live feed clients.', (('', live['droppedEvents']),))
+    return '\n'.join(lines) + '\n'
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 
@@ -15,10 +15,16 @@ class Signal(BaseModel):
     title: str
     category: str
     location: str
-    timestamp: str  # ISO or relative string
+    timestamp: str  # relative display string, derived from createdAt when present
     riskLevel: RiskLevel
     description: str
     status: SignalStatus
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    zoneId: Optional[str] = None  # nearest zone, assigned when lat/lng are given
+    incidentId: Optional[str] = None
+    createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
 
 
 class SignalCreate(BaseModel):
@@ -27,12 +33,52 @@ class SignalCreate(BaseModel):
     location: str
     riskLevel: RiskLevel
     description: str
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class SignalStatusUpdate(BaseModel):
     status: SignalStatus
 
 
+class SignalBatchStatusUpdate(BaseModel):
+    ids: List[str] = Field(min_length=1)
+    status: SignalStatus
+
+
+class SignalBatchDelete(BaseModel):
+    ids: List[str] = Field(min_length=1)
+
+
+class BatchResult(BaseModel):
+    processed: List[str]
+    notFound: List[str]
+
+
+class IngestItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class IngestResult(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[IngestItemResult]
+
+
+class Incident(BaseModel):
+    id: str
+    title: str  # title of the signal that opened it
+    category: str
+    location: str
+    riskLevel: RiskLevel  # highest risk level among its signals
+    signalCount: int
+    zoneIds: List[str] = []
+    createdAt: datetime
+    lastSeen: datetime
+
+
 class Coordinates(BaseModel):
     x: float
     y: float
@@ -49,15 +95,29 @@ class Zone(BaseModel):
     details: str
 
 
+class NearbyZone(Zone):
+    distanceMeters: float
+
+
+class ZoneRisk(BaseModel):
+    zoneId: str
+    score: float  # 0-100, from time-decayed, severity-weighted active signals
+    riskLevel: RiskLevel
+
+
 class ZoneUpdate(BaseModel):
-    riskLevel: Optional[RiskLevel] = None
-    signalCount: Optional[int] = None
+    # signalCount and riskLevel are derived from the zone's signals, so they are rejected here.
+    model_config = ConfigDict(extra='forbid')
+
     details: Optional[str] = None
 
 
 class Stats(BaseModel):
     healthScore: int
     activeSignals: int
+    criticalSignals: int = 0
+    byCategory: Dict[str, int] = {}
+    byZone: Dict[str, int] = {}
     trend: List[int]
 
 
@@ -81,7 +141,13 @@ class Notification(BaseModel):
     title: str
     time: str
     read: bool
+    createdAt: Optional[datetime] = None
 
 
 class NotificationReadUpdate(BaseModel):
     read: bool = True
+
+
+class UnreadCount(BaseModel):
+    user: str
+    unread: int
@@ -0,0 +1,144 @@
+"""
+Cache of fully encoded list responses for the hot list endpoints.
+
+Entries are keyed on (collection, collection version, query string) and hold the JSON
+body, already serialized by pydantic-core, plus gzip (and brotli, when the brotli package
+is installed) variants and a strong ETag. Every write to a collection from this process
+bumps its version (database.py calls bump), as do the zone snapshot listeners in cache.py,
+so stale entries are never served; the TTL bounds staleness from writes made by other
+processes that this one doesn't hear about. A request whose If-None-Match matches the
+current entry gets a 304 without touching Firestore.
+"""
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from settings import RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MIN_COMPRESS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+@dataclass
+class EncodedResponse:
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+    variants: Dict[str, bytes]  # content-coding -> compressed body
+    expires_at: float
+
+    def encoding_for(self, accept_encoding: str) -> Optional[str]:
+        """Preferred content-coding the client accepts, or None for the identity body."""
+        accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+        for coding in ('br', 'gzip'):
+            if coding in self.variants and coding in accepted:
+                return coding
+        return None
+
+    def etag_for(self, coding: Optional[str]) -> str:
+        # Strong ETags must differ between content-codings of the same resource.
+        return self.etag if coding is None else f'{self.etag[:-1]}-{coding}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        # If-None-Match uses weak comparison, and any coding's ETag names the same content.
+        base = self.etag[1:-1]
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag == base or tag.startswith(base + '-'):
+                return True
+        return False
+
+
+def encode(body: bytes, headers: Dict[str, str]) -> EncodedResponse:
+    variants: Dict[str, bytes] = {}
+    if len(body) >= RESPONSE_CACHE_MIN_COMPRESS:
+        variants['gzip'] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            variants['br'] = brotli.compress(body, quality=5)
+    etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+    return EncodedResponse(body, etag, headers, variants, time.monotonic() + RESPONSE_CACHE_TTL)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, EncodedResponse]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._bumped_at: Dict[str, float] = {}  # wall-clock time of each collection's last bump
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def key(self, collection: str, query: str) -> Tuple[str, int, str]:
+        """Cache key for a query string, pinned to the collection's current version."""
+        with self._lock:
+            return (collection, self._versions.get(collection, 0), query)
+
+    def version(self, collection: str) -> int:
+        with self._lock:
+            return self._versions.get(collection, 0)
+
+    def bumped_at(self, collection: str) -> float:
+        with self._lock:
+            return self._bumped_at.get(collection, 0.0)
+
+    def get(self, key: Tuple[str, int, str]) -> Optional[EncodedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic() or key[1] != self._versions.get(key[0], 0):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[str, int, str], entry: EncodedResponse) -> None:
+        with self._lock:
+            if key[1] != self._versions.get(key[0], 0):
+                # The collection was written while this response was being built.
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump(self, collection: str) -> None:
+        """Mark every cached response for collection stale."""
+        with self._lock:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+            self._bumped_at[collection] = time.time()
+            for key in [key for key in self._entries if key[0] == collection]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': RESPONSE_CACHE_TTL,
+                'hits': self.hits,
+                'misses': self.misses,
+                'notModified': self.not_modified,
+                'versions': dict(self._versions),
+            }
+
+
+responses = ResponseCache()
+
+
+def bump(collection: str) -> None:
+    responses.bump(collection)
@@ -0,0 +1,285 @@
+"""
+Zone risk scores and the campus heatmap, computed from live signals.
+
+Each signal weighs its severity (riskLevel) times a status factor (resolved signals weigh
+nothing) and decays exponentially with its age, halving every RISK_HALF_LIFE_HOURS. Decay
+is kept relative to a reference time t0: a signal's stored mass is
+weight * exp(rate * (createdAt - t0)), so every mass decays by the same factor
+exp(-rate * (now - t0)) and adding, changing or removing a signal only adjusts its own
+zone's sum and the raster cells around it. t0 moves forward (rescaling everything) before
+the factors get large.
+
+A zone's score is 100 * (1 - exp(-mass / ZONE_SCALE)): about 63 for one fresh open Critical
+signal. The campus health score falls the same way with the total mass. The heatmap is a
+raster over the zones' latLng bounds in which each signal spreads its mass as a Gaussian of
+HEATMAP_SIGMA_M around its lat/lng (or its zone's, when it has none).
+
+A full rebuild is a handful of NumPy operations over all signals: bincount per zone, and
+per raster cell followed by a separable blur.
+"""
+import math
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from spatial_index import METERS_PER_DEGREE
+
+SEVERITY = {'Critical': 10.0, 'Moderate': 4.0, 'Low': 1.0, 'Stable': 0.0}
+STATUS_FACTOR = {'Open': 1.0, 'Investigating': 0.5, 'Resolved': 0.0}
+ZONE_SCALE = 10.0
+CAMPUS_SCALE = 100.0
+# Score thresholds for a zone's computed risk level, most severe first.
+LEVELS = ((60.0, 'Critical'), (30.0, 'Moderate'), (5.0, 'Low'))
+# t0 moves forward once masses could grow by more than exp(REBASE_EXPONENT).
+REBASE_EXPONENT = 30.0
+
+
+def signal_weight(signal: Dict[str, Any]) -> float:
+    return SEVERITY.get(signal.get('riskLevel'), 0.0) * STATUS_FACTOR.get(signal.get('status'), 1.0)
+
+
+def level_for(score: float) -> str:
+    for threshold, level in LEVELS:
+        if score >= threshold:
+            return level
+    return 'Stable'
+
+
+def _epoch(moment: Any, default: float) -> float:
+    return moment.timestamp() if isinstance(moment, datetime) else default
+
+
+class RiskEngine:
+    def __init__(self, half_life_hours: float, raster_size: int, sigma_m: float):
+        self.half_life_hours = half_life_hours
+        self.rate = math.log(2) / (half_life_hours * 3600)
+        self.raster_size = raster_size
+        self.sigma_m = sigma_m
+        self._lock = threading.RLock()
+        self._journal: Optional[List[Tuple[str, tuple]]] = None  # writes made while a rebuild runs
+        self.ready = threading.Event()
+        self.version = 0  # bumped on every change, so rendered rasters can be cached
+        self._reset([], 0.0)
+
+    def _reset(self, zones: List[Dict[str, Any]], t0: float) -> None:
+        self.t0 = t0
+        self._zone_ids = [zone['id'] for zone in zones]
+        self._zone_index = {zone_id: index for index, zone_id in enumerate(self._zone_ids)}
+        self._zone_points = {zone['id']: tuple(zone['latLng'][:2]) for zone in zones if len(zone.get('latLng') or []) >= 2}
+        self._zone_mass = np.zeros(len(zones))
+        self._total = 0.0
+        # Per-signal rows; removed rows are reused.
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._levels: List[Optional[Tuple[Any, Any]]] = []  # (riskLevel, status) per row
+        self._zone = np.zeros(0, dtype=np.int64)
+        self._cell = np.zeros(0, dtype=np.int64)
+        self._weight = np.zeros(0)
+        self._created = np.zeros(0)
+        self._mass = np.zeros(0)
+        self._set_geometry(list(self._zone_points.values()))
+
+    def _set_geometry(self, points: List[Tuple[float, float]]) -> None:
+        """Raster bounds around the zones, padded by the blur radius, with square cells."""
+        if not points:
+            self.height = self.width = 0
+            self.bounds = (0.0, 0.0, 0.0, 0.0)
+            self.heat = np.zeros((0, 0))
+            self._kernel = np.ones(1)
+            return
+        lats, lngs = zip(*points)
+        mid_lat = (min(lats) + max(lats)) / 2
+        lng_m = METERS_PER_DEGREE * math.cos(math.radians(mid_lat))
+        pad_m = 3 * self.sigma_m
+        span_m = max((max(lats) - min(lats)) * METERS_PER_DEGREE, (max(lngs) - min(lngs)) * lng_m) + 2 * pad_m
+        cell_m = span_m / self.raster_size
+        self.height = math.ceil(((max(lats) - min(lats)) * METERS_PER_DEGREE + 2 * pad_m) / cell_m)
+        self.width = math.ceil(((max(lngs) - min(lngs)) * lng_m + 2 * pad_m) / cell_m)
+        self._cell_lat, self._cell_lng = cell_m / METERS_PER_DEGREE, cell_m / lng_m
+        north, west = max(lats) + pad_m / METERS_PER_DEGREE, min(lngs) - pad_m / lng_m
+        self.bounds = (north - self.height * self._cell_lat, west, north, west + self.width * self._cell_lng)  # south, west, north, east
+        sigma = self.sigma_m / cell_m
+        radius = max(1, math.ceil(3 * sigma))
+        self._kernel = np.exp(-np.arange(-radius, radius + 1) ** 2 / (2 * sigma * sigma))
+        self.heat = np.zeros((self.height, self.width))
+
+    def _cells(self, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+        """Flat raster index (row 0 is the north edge) per point, or -1 outside the raster or without a point."""
+        south, west, north, east = self.bounds
+        rows = np.floor((north - lats) / self._cell_lat) if self.height else np.full(len(lats), -1.0)
+        cols = np.floor((lngs - west) / self._cell_lng) if self.width else np.full(len(lngs), -1.0)
+        inside = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        return np.where(inside, rows * self.width + cols, -1).astype(np.int64)
+
+    def _location(self, signal: Dict[str, Any]) -> Tuple[float, float]:
+        if signal.get('lat') is not None and signal.get('lng') is not None:
+            return signal['lat'], signal['lng']
+        return self._zone_points.get(signal.get('zoneId'), (math.nan, math.nan))
+
+    def rebuild(self, zones: List[Dict[str, Any]], signals: Iterable[Dict[str, Any]], now: float) -> None:
+        """
+        Replace the contents with zones and signals. Writes that arrive while the signals are
+        being scanned are journaled and replayed.
+        """
+        with self._lock:
+            self._journal = []
+        fresh = RiskEngine(self.half_life_hours, self.raster_size, self.sigma_m)
+        fresh._reset(zones, now)
+        rows = [(signal['id'], signal.get('riskLevel'), signal.get('status'), signal.get('zoneId'),
+                 *fresh._location(signal), _epoch(signal.get('createdAt'), now)) for signal in signals]
+        ids, levels, statuses, zone_ids, lats, lngs, created = zip(*rows) if rows else ((),) * 7
+        fresh._rows = {signal_id: row for row, signal_id in enumerate(ids)}
+        fresh._levels = list(zip(levels, statuses))
+        fresh._zone = np.array([fresh._zone_index.get(zone_id, -1) for zone_id in zone_ids], dtype=np.int64)
+        fresh._cell = fresh._cells(np.array(lats, dtype=float), np.array(lngs, dtype=float))
+        fresh._weight = np.array([SEVERITY.get(level, 0.0) for level in levels]) * np.array([STATUS_FACTOR.get(status, 1.0) for status in statuses])
+        fresh._created = np.array(created, dtype=float)
+        fresh._recompute()
+        with self._lock:
+            journal, self._journal = self._journal, None
+            for name, value in vars(fresh).items():
+                if name not in ('_lock', '_journal', 'ready', 'version'):
+                    setattr(self, name, value)
+            self.ready.set()
+            for method, args in journal:
+                getattr(self, method)(*args)
+            self.version += 1
+
+    def _recompute(self) -> None:
+        """Rebuild every sum from the per-signal rows at the current t0, which also clears rounding drift."""
+        self._mass = self._weight * np.exp(self.rate * (self._created - self.t0))
+        in_zone = self._zone >= 0
+        # bincount of nothing comes back as integers, which would truncate later increments.
+        self._zone_mass = np.bincount(self._zone[in_zone], weights=self._mass[in_zone], minlength=len(self._zone_ids)).astype(float)
+        self._total = float(self._mass.sum())
+        if self.height:
+            in_raster = self._cell >= 0
+            points = np.bincount(self._cell[in_raster], weights=self._mass[in_raster], minlength=self.height * self.width).astype(float)
+            self.heat = self._blur(points.reshape(self.height, self.width))
+
+    def _blur(self, grid: np.ndarray) -> np.ndarray:
+        kernel = self._kernel
+        radius = len(kernel) // 2
+        padded = np.pad(grid, radius)
+        across = sum(weight * padded[:, offset:offset + self.width] for offset, weight in enumerate(kernel))
+        return sum(weight * across[offset:offset + self.height, :] for offset, weight in enumerate(kernel))
+
+    def _rebase(self, now: float) -> None:
+        if self.rate * (now - self.t0) > REBASE_EXPONENT:
+            self.t0 = now
+            self._recompute()
+
+    def _grow(self) -> int:
+        if self._free:
+            return self._free.pop()
+        row = len(self._levels)
+        if row == len(self._weight):
+            capacity = max(16, 2 * row)
+            for name in ('_zone', '_cell', '_weight', '_created', '_mass'):
+                array = getattr(self, name)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:row] = array
+                setattr(self, name, grown)
+        self._levels.append(None)
+        return row
+
+    def _apply(self, row: int, sign: float) -> None:
+        """Add (sign 1) or take away (sign -1) a row's mass from its zone, the total and the raster."""
+        mass = sign * self._mass[row]
+        if not mass:
+            return
+        self._total += mass
+        if self._zone[row] >= 0:
+            self._zone_mass[self._zone[row]] += mass
+        cell = self._cell[row]
+        if cell >= 0:
+            radius = len(self._kernel) // 2
+            r, c = divmod(int(cell), self.width)
+            r0, r1 = max(0, r - radius), min(self.height, r + radius + 1)
+            c0, c1 = max(0, c - radius), min(self.width, c + radius + 1)
+            rows = self._kernel[r0 - r + radius:r1 - r + radius]
+            cols = self._kernel[c0 - c + radius:c1 - c + radius]
+            self.heat[r0:r1, c0:c1] += mass * np.outer(rows, cols)
+
+    def _tracking(self, method: str, args: tuple) -> bool:
+        """Journal a write made during a rebuild. False before the first build, which will read it anyway."""
+        if self._journal is not None:
+            self._journal.append((method, args))
+        return self._journal is not None or self.ready.is_set()
+
+    def upsert(self, signal: Dict[str, Any], now: float) -> None:
+        with self._lock:
+            if not self._tracking('upsert', (signal, now)):
+                return
+            self._rebase(now)
+            row = self._rows.get(signal['id'])
+            if row is None:
+                row = self._rows[signal['id']] = self._grow()
+            else:
+                self._apply(row, -1)
+            self._levels[row] = (signal.get('riskLevel'), signal.get('status'))
+            self._zone[row] = self._zone_index.get(signal.get('zoneId'), -1)
+            self._cell[row] = self._cells(*(np.array([value], dtype=float) for value in self._location(signal)))[0]
+            self._weight[row] = signal_weight(signal)
+            self._created[row] = _epoch(signal.get('createdAt'), now)
+            self._mass[row] = self._weight[row] * math.exp(self.rate * (self._created[row] - self.t0))
+            self._apply(row, 1)
+            self.version += 1
+
+    def update(self, signal_id: str, updates: Dict[str, Any], now: float) -> None:
+        """Apply a patch to riskLevel or status, such as a batch status change."""
+        with self._lock:
+            if not self._tracking('update', (signal_id, updates, now)):
+                return
+            row = self._rows.get(signal_id)
+            if row is None:
+                return
+            self._rebase(now)
+            level, status = self._levels[row]
+            self._levels[row] = (updates.get('riskLevel', level), updates.get('status', status))
+            self._apply(row, -1)
+            self._weight[row] = signal_weight(dict(zip(('riskLevel', 'status'), self._levels[row])))
+            self._mass[row] = self._weight[row] * math.exp(self.rate * (self._created[row] - self.t0))
+            self._apply(row, 1)
+            self.version += 1
+
+    def remove(self, signal_id: str) -> None:
+        with self._lock:
+            if not self._tracking('remove', (signal_id,)):
+                return
+            row = self._rows.pop(signal_id, None)
+            if row is None:
+                return
+            self._apply(row, -1)
+            self._levels[row] = None
+            self._weight[row] = self._mass[row] = 0.0
+            self._zone[row] = self._cell[row] = -1
+            self._free.append(row)
+            self.version += 1
+
+    def _decay(self, now: float) -> float:
+        return math.exp(-self.rate * (now - self.t0))
+
+    def zone_scores(self, now: float) -> List[Dict[str, Any]]:
+        """Every zone's score (0-100) and the risk level it implies, highest first."""
+        with self._lock:
+            scores = 100 * -np.expm1(-np.maximum(self._zone_mass, 0) * self._decay(now) / ZONE_SCALE)
+            ranked = sorted(zip(self._zone_ids, scores.tolist()), key=lambda item: (-item[1], item[0]))
+        return [{'zoneId': zone_id, 'score': round(score, 1), 'riskLevel': level_for(score)} for zone_id, score in ranked]
+
+    def health_score(self, now: float) -> int:
+        with self._lock:
+            return round(100 * math.exp(-max(self._total, 0.0) * self._decay(now) / CAMPUS_SCALE))
+
+    def raster(self, now: float) -> bytes:
+        """The heatmap as uint8 intensities, row by row from the north edge."""
+        with self._lock:
+            heat = np.maximum(self.heat, 0) * self._decay(now)
+        return np.round(-255 * np.expm1(-heat / ZONE_SCALE)).astype(np.uint8).tobytes()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'ready': self.ready.is_set(), 'signals': len(self._rows), 'zones': len(self._zone_ids),
+                    'raster': [self.width, self.height]}
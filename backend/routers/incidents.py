@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from datetime import datetime
+from typing import List, Optional
+from models import Incident, RiskLevel
+from routers.listing import ListOrder, parse_fields, cached_list, time_range
+from settings import MAX_PAGE_SIZE
+from firebase_config import INCIDENTS_COLLECTION
+import async_database as db
+
+router = APIRouter(prefix="/incidents", tags=["incidents"])
+
+
+@router.get("", response_model=List[Incident])
+async def get_incidents(
+    request: Request,
+    riskLevel: Optional[RiskLevel] = None,
+    category: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    since: Optional[datetime] = Query(None, description="Only incidents opened at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only incidents opened before this time"),
+    order: ListOrder = Query("id", description="'newest' orders by createdAt, newest first (implied by since/until)"),
+):
+    """Clusters of related signals. An incident's signals are listed by GET /api/signals?incidentId=."""
+    field_list = parse_fields(fields, Incident)
+    return await cached_list(request, INCIDENTS_COLLECTION, Incident, field_list, lambda: db.query_incidents(
+        {'riskLevel': riskLevel, 'category': category}, field_list, limit, cursor,
+        time_range(since, until, order)
+    ))
+
+
+@router.get("/{incident_id}", response_model=Incident)
+async def get_incident(incident_id: str):
+    incident = await db.get_incident_by_id(incident_id)
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
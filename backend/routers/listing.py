@@ -0,0 +1,150 @@
+"""
+Helpers shared by the list endpoints: ?fields= parsing, paginated responses, and serving
+hot lists from the encoded response cache or the snapshot shared between workers.
+"""
+import asyncio
+import functools
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple, Type
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+import response_cache
+import shared_state
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """Split a comma-separated ?fields= value, rejecting names the model doesn't have."""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+ListOrder = Literal["id", "newest"]
+
+
+def as_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Query parameter times without a zone are taken as UTC."""
+    return moment.replace(tzinfo=timezone.utc) if moment is not None and moment.tzinfo is None else moment
+
+
+def time_range(since: Optional[datetime], until: Optional[datetime], order: ListOrder):
+    """
+    The (since, until) createdAt bounds for a newest-first query, or None for the default ID order.
+    Giving either bound implies newest-first.
+    """
+    if since is None and until is None and order != "newest":
+        return None
+    return as_utc(since), as_utc(until)
+
+
+def list_response(response: Response, items: List[Dict[str, Any]], fields: Optional[List[str]], next_cursor: Optional[str]):
+    """
+    Return a page of items, with the cursor for the next page in the X-Next-Cursor header.
+    Projected items are returned as-is, since they don't satisfy the full response model.
+    """
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    if fields is not None:
+        return JSONResponse(content=jsonable_encoder(items), headers=headers)
+    response.headers.update(headers)
+    return items
+
+
+@functools.lru_cache(maxsize=None)
+def _list_adapter(model: Optional[Type[BaseModel]]) -> TypeAdapter:
+    return TypeAdapter(List[model] if model is not None else List[Dict[str, Any]])
+
+
+@functools.lru_cache(maxsize=None)
+def _adapter(annotation: Any) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+def encode_model(annotation: Any, value: Any) -> response_cache.EncodedResponse:
+    """Validate and encode a body as response_model=annotation would, for sharing between workers."""
+    adapter = _adapter(annotation)
+    return response_cache.encode(adapter.dump_json(adapter.validate_python(value)), {})
+
+
+def _query_string(request: Request) -> str:
+    return urlencode(sorted(request.query_params.multi_items()))
+
+
+def shared_response(request: Request, media_type: str = "application/json") -> Optional[Response]:
+    """The response from the workers' shared snapshot, or None when this worker has to build it."""
+    query = _query_string(request)
+    entry = shared_state.lookup(f"{request.url.path}?{query}" if query else request.url.path)
+    return encoded_response(request, entry, media_type) if entry is not None else None
+
+
+def encoded_response(request: Request, entry: response_cache.EncodedResponse, media_type: str = "application/json") -> Response:
+    """Serve a pre-encoded body in the best content-coding the client accepts, or 304 if its ETag matches."""
+    coding = entry.encoding_for(request.headers.get("accept-encoding", ""))
+    headers = {**entry.headers, "ETag": entry.etag_for(coding), "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if entry.matches(request.headers.get("if-none-match")):
+        response_cache.responses.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+        return Response(content=entry.variants[coding], media_type=media_type, headers=headers)
+    return Response(content=entry.body, media_type=media_type, headers=headers)
+
+
+async def cached_list(
+    request: Request,
+    collection: str,
+    model: Type[BaseModel],
+    fields: Optional[List[str]],
+    load: Callable[[], Awaitable[Tuple[List[Dict[str, Any]], Optional[str]]]],
+) -> Response:
+    """
+    Serve a list endpoint from the shared snapshot or the response cache, calling
+    load() -> (items, next_cursor) on a miss. Full items are validated and serialized
+    against model exactly as response_model would.
+    """
+    shared = shared_response(request)
+    if shared is not None:
+        return shared
+    return encoded_response(request, await cached_entry(collection, _query_string(request), model, fields, load))
+
+
+async def cached_entry(
+    collection: str,
+    query: str,
+    model: Type[BaseModel],
+    fields: Optional[List[str]],
+    load: Callable[[], Awaitable[Tuple[List[Dict[str, Any]], Optional[str]]]],
+) -> response_cache.EncodedResponse:
+    """The encoded response for query (a sorted query string), built and cached on a miss."""
+    key = response_cache.responses.key(collection, query)
+    entry = response_cache.responses.get(key)
+    if entry is None:
+        # Concurrent misses for the same key (a dashboard refresh right after a write) share one load.
+        building = _building.get(key)
+        if building is None:
+            building = _building[key] = asyncio.ensure_future(_build(key, model, fields, load))
+            building.add_done_callback(lambda _: _building.pop(key, None))
+        entry = await asyncio.shield(building)
+    return entry
+
+
+_building: Dict[Tuple[str, int, str], "asyncio.Future[response_cache.EncodedResponse]"] = {}
+
+
+async def _build(key, model, fields, load) -> response_cache.EncodedResponse:
+    items, next_cursor = await load()
+    adapter = _list_adapter(model if fields is None else None)
+    body = adapter.dump_json(adapter.validate_python(items))
+    entry = response_cache.encode(body, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {})
+    response_cache.responses.put(key, entry)
+    return entry
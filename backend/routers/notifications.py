@@ -1,26 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models import Notification, NotificationReadUpdate
-import database as db
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from datetime import datetime
+from typing import List, Optional
+from models import Notification, NotificationReadUpdate, UnreadCount
+from routers.listing import ListOrder, parse_fields, list_response, time_range
+from settings import MAX_PAGE_SIZE
+from database import document_etag
+import async_database as db
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
 
 @router.get("", response_model=List[Notification])
-async def get_notifications():
-    notifications = db.get_all_notifications()
-    return notifications
+async def get_notifications(
+    response: Response,
+    read: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    since: Optional[datetime] = Query(None, description="Only notifications created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only notifications created before this time"),
+    order: ListOrder = Query("id", description="'newest' orders by createdAt, newest first (implied by since/until)"),
+    user: Optional[str] = Query(None, description="List this user's inbox, with their read flags"),
+):
+    field_list = parse_fields(fields, Notification)
+    if user is not None:
+        notifications, next_cursor = await db.query_inbox(user, {'read': read}, field_list, limit, cursor,
+                                                          time_range(since, until, order))
+    else:
+        notifications, next_cursor = await db.query_notifications({'read': read}, field_list, limit, cursor,
+                                                                  time_range(since, until, order))
+    return list_response(response, notifications, field_list, next_cursor)
+
+
+@router.get("/unread-count", response_model=UnreadCount)
+async def get_unread_count(user: str):
+    unread = await db.get_unread_count(user)
+    if unread is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"user": user, "unread": unread}
 
 
 @router.patch("/{notification_id}/read", response_model=Notification)
-async def mark_notification_read(notification_id: int, update: NotificationReadUpdate):
-    updated = db.update_notification(notification_id, {'read': update.read})
+async def mark_notification_read(notification_id: int, update: NotificationReadUpdate, response: Response,
+                                 if_match: Optional[str] = Header(None),
+                                 user: Optional[str] = Query(None, description="Mark it in this user's inbox only")):
+    if user is not None:
+        updated = await db.update_inbox_notification(user, notification_id, {'read': update.read}, if_match)
+    else:
+        updated = await db.update_notification(notification_id, {'read': update.read}, if_match)
     if not updated:
         raise HTTPException(status_code=404, detail="Notification not found")
+    response.headers["ETag"] = document_etag(updated)
     return updated
 
 
 @router.post("/mark-all-read")
-async def mark_all_read():
-    db.mark_all_notifications_read()
-    return {"message": "All notifications marked as read"}
+async def mark_all_read(user: Optional[str] = Query(None, description="Mark this user's inbox only")):
+    if user is not None:
+        updated = await db.mark_inbox_read(user)
+    else:
+        updated = await db.mark_all_notifications_read()
+    return {"message": "All notifications marked as read", "updated": updated}
@@ -1,56 +1,161 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models import Signal, SignalCreate, SignalStatusUpdate
-import database as db
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from typing import List, Optional
+from models import Signal, SignalCreate, SignalStatusUpdate, SignalBatchStatusUpdate, SignalBatchDelete, BatchResult, IngestResult, RiskLevel, SignalStatus
+from routers.listing import ListOrder, as_utc, parse_fields, cached_entry, cached_list, list_response, time_range
+from settings import MAX_PAGE_SIZE, BULK_MAX_IDS, INGEST_MAX_ITEMS
+from database import document_etag
+from firebase_config import SIGNALS_COLLECTION
+import async_database as db
+import export
+import ingest
+import shared_state
+import write_behind
 
 router = APIRouter(prefix="/signals", tags=["signals"])
 
 
 @router.get("", response_model=List[Signal])
-async def get_signals():
-    signals = db.get_all_signals()
-    return signals
+async def get_signals(
+    request: Request,
+    status: Optional[SignalStatus] = None,
+    riskLevel: Optional[RiskLevel] = None,
+    category: Optional[str] = None,
+    incidentId: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    since: Optional[datetime] = Query(None, description="Only signals created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only signals created before this time"),
+    order: ListOrder = Query("id", description="'newest' orders by createdAt, newest first (implied by since/until)"),
+):
+    field_list = parse_fields(fields, Signal)
+    return await cached_list(request, SIGNALS_COLLECTION, Signal, field_list, lambda: db.query_signals(
+        {'status': status, 'riskLevel': riskLevel, 'category': category, 'incidentId': incidentId}, field_list, limit, cursor,
+        time_range(since, until, order)
+    ))
+
+
+@router.get("/search", response_model=List[Signal])
+async def search_signals(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to match in title, description, location and category; each also matches as a prefix"),
+    status: Optional[SignalStatus] = None,
+    riskLevel: Optional[RiskLevel] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+):
+    """Signals matching every word of q, best match first."""
+    signals, next_cursor = await db.search_signals(q, {'status': status, 'riskLevel': riskLevel}, limit, cursor)
+    return list_response(response, signals, None, next_cursor)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_signals(
+    format: export.ExportFormat = Query("csv", description="csv, ndjson, or arrow (Arrow IPC stream)"),
+    status: Optional[SignalStatus] = None,
+    riskLevel: Optional[RiskLevel] = None,
+    category: Optional[str] = None,
+    incidentId: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to export"),
+    since: Optional[datetime] = Query(None, description="Only signals created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only signals created before this time"),
+    changedSince: Optional[datetime] = Query(None, description="Only signals written at or after this time, oldest change first; "
+                                                               "pass the previous export's X-Next-Changed-Since"),
+):
+    """Stream every matching signal, paging through Firestore as the client reads."""
+    if not export.available(format):
+        raise HTTPException(status_code=501, detail=f"The {format} format needs the pyarrow package")
+    if changedSince is not None and (since is not None or until is not None):
+        raise HTTPException(status_code=400, detail="changedSince can't be combined with since or until")
+    field_list = parse_fields(fields, Signal)
+    started = datetime.now(timezone.utc)
+    chunks = export.signals(format, {'status': status, 'riskLevel': riskLevel, 'category': category, 'incidentId': incidentId},
+                            field_list, time_range(since, until, "id"), as_utc(changedSince))
+    return StreamingResponse(chunks, media_type=export.MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="signals.{export.EXTENSIONS[format]}"',
+        export.NEXT_CHANGED_SINCE_HEADER: (started - export.CHANGES_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+    })
+
+
+@router.post(":batchUpdateStatus", response_model=BatchResult)
+async def batch_update_status(batch: SignalBatchStatusUpdate):
+    if len(batch.ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_IDS} ids per request")
+    return await db.batch_update_signals(batch.ids, {'status': batch.status})
+
+
+@router.post(":batchDelete", response_model=BatchResult)
+async def batch_delete(batch: SignalBatchDelete):
+    if len(batch.ids) > BULK_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_IDS} ids per request")
+    return await db.batch_delete_signals(batch.ids)
+
+
+@router.post(":ingest", response_model=IngestResult, response_model_exclude_none=True)
+async def ingest_signals(request: Request, notify: bool = Query(True, description="Create a notification per signal")):
+    """
+    Bulk-create signals from a JSON array, or from an NDJSON stream (Content-Type application/x-ndjson),
+    which is consumed line by line. Returns one result per input item, in order.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = ingest.iter_ndjson(request.stream())
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        items = ingest.iter_list(body)
+    return await ingest.ingest(items, notify, INGEST_MAX_ITEMS)
 
 
 @router.get("/{signal_id}", response_model=Signal)
-async def get_signal(signal_id: str):
-    signal = db.get_signal_by_id(signal_id)
+async def get_signal(signal_id: str, response: Response):
+    signal = await db.get_signal_by_id(signal_id)
+    if not signal and write_behind.get_log() is not None:
+        signal = write_behind.get_log().pending_signal(signal_id)
     if not signal:
         raise HTTPException(status_code=404, detail="Signal not found")
+    response.headers["ETag"] = document_etag(signal)
     return signal
 
 
 @router.post("", response_model=Signal)
 async def create_signal(signal_data: SignalCreate):
-    new_signal = db.create_signal({
-        'title': signal_data.title,
-        'category': signal_data.category,
-        'location': signal_data.location,
-        'timestamp': "Just now",
-        'riskLevel': signal_data.riskLevel,
-        'description': signal_data.description,
-        'status': "Open"
-    })
-    
-    db.create_notification({
-        'title': f"New Signal: {signal_data.title[:30]}...",
-        'time': "Just now",
-        'read': False
-    })
-    
-    return new_signal
+    # The notification is only written if the signal opens an incident or raises its risk level.
+    if write_behind.get_log() is not None:
+        return await write_behind.get_log().submit(ingest.signal_document(signal_data), ingest.notification_document(signal_data))
+    return await db.create_signal(ingest.signal_document(signal_data), ingest.notification_document(signal_data))
 
 
 @router.patch("/{signal_id}/status", response_model=Signal)
-async def update_signal_status(signal_id: str, update: SignalStatusUpdate):
-    updated = db.update_signal(signal_id, {'status': update.status})
+async def update_signal_status(signal_id: str, update: SignalStatusUpdate, response: Response,
+                               if_match: Optional[str] = Header(None)):
+    updated = await db.update_signal(signal_id, {'status': update.status}, if_match)
     if not updated:
         raise HTTPException(status_code=404, detail="Signal not found")
+    response.headers["ETag"] = document_etag(updated)
     return updated
 
 
 @router.delete("/{signal_id}")
-async def delete_signal(signal_id: str):
-    if not db.delete_signal(signal_id):
+async def delete_signal(signal_id: str, if_match: Optional[str] = Header(None)):
+    if not await db.delete_signal(signal_id, if_match):
         raise HTTPException(status_code=404, detail="Signal not found")
     return {"message": "Signal deleted"}
+
+
+def _share_list(query: str, limit: Optional[int], order: ListOrder):
+    """Share the unfiltered list the dashboard loads under query."""
+    filters = {'status': None, 'riskLevel': None, 'category': None, 'incidentId': None}
+    shared_state.share(f"/api/signals?{query}" if query else "/api/signals", SIGNALS_COLLECTION, lambda: cached_entry(
+        SIGNALS_COLLECTION, query, Signal, None, lambda: db.query_signals(filters, None, limit, None, time_range(None, None, order))
+    ))
+
+
+_share_list("", None, "id")
+_share_list("limit=100&order=newest", 100, "newest")
@@ -1,11 +1,24 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from models import Stats
-import database as db
+from routers.listing import encode_model, shared_response
+from firebase_config import SIGNALS_COLLECTION
+import async_database as db
+import shared_state
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
 
 @router.get("", response_model=Stats)
-async def get_stats():
-    stats = db.get_stats()
+async def get_stats(request: Request):
+    shared = shared_response(request)
+    if shared is not None:
+        return shared
+    stats = await db.get_stats()
     return stats
+
+
+async def _stats_body():
+    return encode_model(Stats, await db.get_stats())
+
+
+shared_state.share("/api/stats", SIGNALS_COLLECTION, _stats_body, derived=True)
@@ -0,0 +1,43 @@
+import asyncio
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from live_feed import feed, TOPICS
+from settings import LIVE_FEED_HEARTBEAT_SECONDS
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+
+@router.get("")
+async def stream_changes(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Comma-separated subset of: signals, notifications, stats"),
+    last_event_id: Optional[str] = Header(None),
+    lastEventId: Optional[str] = Query(None, description="Resume token, for clients that can't send Last-Event-ID"),
+):
+    wanted = set(topics.split(",")) if topics else set(TOPICS)
+    unknown = wanted - set(TOPICS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(sorted(unknown))}")
+    
+    feed.start(asyncio.get_running_loop())
+    subscription = feed.subscribe(wanted, last_event_id or lastEventId)
+    
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=LIVE_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.encode()
+        finally:
+            feed.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
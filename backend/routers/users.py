@@ -1,22 +1,26 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import Optional
 from models import User, UserUpdate
-import database as db
+from database import document_etag
+import async_database as db
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/{user_type}", response_model=User)
-async def get_user(user_type: str):
-    user = db.get_user_by_type(user_type)
+async def get_user(user_type: str, response: Response):
+    user = await db.get_user_by_type(user_type)
     if not user:
         raise HTTPException(status_code=404, detail="User type not found")
+    response.headers["ETag"] = document_etag(user)
     return user
 
 
 @router.patch("/{user_type}", response_model=User)
-async def update_user(user_type: str, update: UserUpdate):
+async def update_user(user_type: str, update: UserUpdate, response: Response, if_match: Optional[str] = Header(None)):
     update_data = update.model_dump(exclude_unset=True)
-    updated = db.update_user(user_type, update_data)
+    updated = await db.update_user(user_type, update_data, if_match)
     if not updated:
         raise HTTPException(status_code=404, detail="User type not found")
+    response.headers["ETag"] = document_etag(updated)
     return updated
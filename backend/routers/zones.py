@@ -1,29 +1,87 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models import Zone, ZoneUpdate
-import database as db
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from typing import List, Optional
+from models import Zone, NearbyZone, ZoneRisk, ZoneUpdate, RiskLevel, ZoneCategory
+from routers.listing import parse_fields, cached_entry, cached_list, encode_model, encoded_response, shared_response
+from settings import MAX_PAGE_SIZE, NEARBY_MAX_RADIUS_M
+from database import document_etag
+from firebase_config import SIGNALS_COLLECTION, ZONES_COLLECTION
+import async_database as db
+import shared_state
 
 router = APIRouter(prefix="/zones", tags=["zones"])
 
 
 @router.get("", response_model=List[Zone])
-async def get_zones():
-    zones = db.get_all_zones()
-    return zones
+async def get_zones(
+    request: Request,
+    riskLevel: Optional[RiskLevel] = None,
+    category: Optional[ZoneCategory] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+):
+    field_list = parse_fields(fields, Zone)
+    return await cached_list(request, ZONES_COLLECTION, Zone, field_list, lambda: db.query_zones(
+        {'riskLevel': riskLevel, 'category': category}, field_list, limit, cursor
+    ))
+
+
+@router.get("/nearby", response_model=List[NearbyZone])
+async def get_nearby_zones(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(1000, gt=0, le=NEARBY_MAX_RADIUS_M, description="Search radius in metres"),
+):
+    return await db.nearby_zones(lat, lng, radius)
+
+
+@router.get("/risk", response_model=List[ZoneRisk])
+async def get_zone_risk(request: Request):
+    """Every zone's computed risk score, highest first."""
+    shared = shared_response(request)
+    if shared is not None:
+        return shared
+    return await db.zone_risk()
+
+
+@router.get("/heatmap", response_class=Response, responses={200: {"content": {"application/octet-stream": {}}}})
+async def get_heatmap(request: Request):
+    """
+    Signal intensity over the campus as one byte (0-255) per cell, row by row from the north
+    edge. X-Heatmap-Width and X-Heatmap-Height give the raster's size, and X-Heatmap-Bounds
+    its south,west,north,east edges in degrees.
+    """
+    shared = shared_response(request, "application/octet-stream")
+    if shared is not None:
+        return shared
+    return encoded_response(request, await db.get_heatmap(), "application/octet-stream")
 
 
 @router.get("/{zone_id}", response_model=Zone)
-async def get_zone(zone_id: str):
-    zone = db.get_zone_by_id(zone_id)
+async def get_zone(zone_id: str, response: Response):
+    zone = await db.get_zone_by_id(zone_id)
     if not zone:
         raise HTTPException(status_code=404, detail="Zone not found")
+    response.headers["ETag"] = document_etag(zone)
     return zone
 
 
 @router.patch("/{zone_id}", response_model=Zone)
-async def update_zone(zone_id: str, update: ZoneUpdate):
+async def update_zone(zone_id: str, update: ZoneUpdate, response: Response, if_match: Optional[str] = Header(None)):
     update_data = update.model_dump(exclude_unset=True)
-    updated = db.update_zone(zone_id, update_data)
+    updated = await db.update_zone(zone_id, update_data, if_match)
     if not updated:
         raise HTTPException(status_code=404, detail="Zone not found")
+    response.headers["ETag"] = document_etag(updated)
     return updated
+
+
+async def _zone_risk_body():
+    return encode_model(List[ZoneRisk], await db.zone_risk())
+
+
+shared_state.share("/api/zones", ZONES_COLLECTION, lambda: cached_entry(ZONES_COLLECTION, "", Zone, None, lambda: db.query_zones(
+    {'riskLevel': None, 'category': None}, None, None, None
+)))
+shared_state.share("/api/zones/risk", SIGNALS_COLLECTION, _zone_risk_body, derived=True)
+shared_state.share("/api/zones/heatmap", SIGNALS_COLLECTION, db.get_heatmap, derived=True)
@@ -0,0 +1,203 @@
+"""
+In-memory full-text index over signals, behind GET /api/signals/search.
+
+An inverted index maps each token of a signal's title, description, location and category
+to the signals containing it, with per-field weights (a title match counts for more than a
+description match). Queries are AND-ed terms ranked with BM25; each term also matches
+tokens it is a prefix of, found by bisecting a sorted vocabulary, at a discount. Status and
+risk level are kept per signal so filters don't need Firestore.
+
+database.py builds the index once at startup and updates it from every signal write path.
+Writes made by other processes only show up after a restart.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+FIELD_WEIGHTS = {'title': 3.0, 'category': 2.0, 'location': 2.0, 'description': 1.0}
+TEXT_FIELDS = tuple(FIELD_WEIGHTS)
+META_FIELDS = ('status', 'riskLevel')
+
+# BM25 parameters, and the weight of a prefix-only match relative to an exact one.
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 2
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _weighted_terms(doc: Dict[str, Any]) -> Dict[str, float]:
+    terms: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(doc.get(field) or ''):
+            terms[token] += weight
+    return dict(terms)
+
+
+class SignalSearchIndex:
+    def __init__(self, max_expansions: int = 50):
+        self.max_expansions = max_expansions
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._vocab: List[str] = []  # sorted, for prefix lookups
+        self._terms: Dict[str, Dict[str, float]] = {}  # signal ID -> its weighted terms
+        self._meta: Dict[str, Tuple[Any, ...]] = {}
+        self._by_meta: Dict[Tuple[str, Any], Set[str]] = {}  # (field, value) -> signal IDs
+        self._lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._lock = threading.RLock()
+        self._journal: Optional[List[Tuple[str, tuple]]] = None  # writes made while a rebuild runs
+        self.ready = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def rebuild(self, docs: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replace the contents with docs. The scan runs outside the lock, so writes aren't held
+        up; writes that arrive meanwhile are journaled and replayed onto the new contents.
+        """
+        fresh = SignalSearchIndex(self.max_expansions)
+        with self._lock:
+            self._journal = []
+        for doc in docs:
+            fresh._add(doc)
+        fresh._vocab = sorted(fresh._postings)
+        with self._lock:
+            journal, self._journal = self._journal, None
+            for name in ('_postings', '_vocab', '_terms', '_meta', '_by_meta', '_lengths', '_total_length'):
+                setattr(self, name, getattr(fresh, name))
+            for method, args in journal:
+                getattr(self, method)(*args)
+            self.ready.set()
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(('upsert', (doc,)))
+            self._remove(doc['id'])
+            for token in self._add(doc):
+                if len(self._postings[token]) == 1:
+                    bisect.insort(self._vocab, token)
+
+    def update_meta(self, signal_id: str, updates: Dict[str, Any]) -> None:
+        """Apply a patch that only touches filter fields (such as a status change)."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(('update_meta', (signal_id, updates)))
+            meta = self._meta.get(signal_id)
+            if meta is not None:
+                self._set_meta(signal_id, tuple(updates.get(field, value) for field, value in zip(META_FIELDS, meta)))
+
+    def remove(self, signal_id: str) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(('remove', (signal_id,)))
+            self._remove(signal_id)
+
+    def _add(self, doc: Dict[str, Any]) -> List[str]:
+        signal_id = doc['id']
+        terms = _weighted_terms(doc)
+        self._terms[signal_id] = terms
+        self._set_meta(signal_id, tuple(doc.get(field) for field in META_FIELDS))
+        self._lengths[signal_id] = sum(terms.values())
+        self._total_length += self._lengths[signal_id]
+        for token, weight in terms.items():
+            self._postings.setdefault(token, {})[signal_id] = weight
+        return list(terms)
+
+    def _set_meta(self, signal_id: str, meta: Optional[Tuple[Any, ...]]) -> None:
+        for key in zip(META_FIELDS, self._meta.pop(signal_id, ())):
+            self._by_meta[key].discard(signal_id)
+        if meta is not None:
+            self._meta[signal_id] = meta
+            for key in zip(META_FIELDS, meta):
+                self._by_meta.setdefault(key, set()).add(signal_id)
+
+    def _remove(self, signal_id: str) -> None:
+        terms = self._terms.pop(signal_id, None)
+        if terms is None:
+            return
+        self._set_meta(signal_id, None)
+        self._total_length -= self._lengths.pop(signal_id)
+        for token in terms:
+            posting = self._postings[token]
+            del posting[signal_id]
+            if not posting:
+                del self._postings[token]
+                position = bisect.bisect_left(self._vocab, token)
+                if position < len(self._vocab) and self._vocab[position] == token:
+                    del self._vocab[position]
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Tokens a query term matches, with the weight of each match."""
+        matches = [(term, 1.0)] if term in self._postings else []
+        if len(term) >= MIN_PREFIX_LENGTH:
+            position = bisect.bisect_left(self._vocab, term)
+            while position < len(self._vocab) and len(matches) < self.max_expansions:
+                token = self._vocab[position]
+                if not token.startswith(term):
+                    break
+                if token != term:
+                    matches.append((token, PREFIX_WEIGHT))
+                position += 1
+        return matches
+
+    def search(self, query: str, filters: Dict[str, Any], offset: int, limit: int) -> Tuple[List[str], int]:
+        """Signal IDs for one page of results, best first, and the total number of matches."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], 0
+        with self._lock:
+            expanded = [[(self._postings[token], weight) for token, weight in self._expand(term)] for term in terms]
+            if not all(expanded):
+                return [], 0
+            # Intersect from the rarest term, with set operations rather than per-signal checks.
+            expanded.sort(key=lambda matches: sum(len(posting) for posting, _ in matches))
+            candidates = set().union(*(posting.keys() for posting, _ in expanded[0]))
+            for matches in expanded[1:]:
+                if len(matches) == 1 and len(matches[0][0]) < len(candidates):
+                    candidates.intersection_update(matches[0][0].keys())
+                else:
+                    candidates = {signal_id for signal_id in candidates if any(signal_id in posting for posting, _ in matches)}
+            for field in META_FIELDS:
+                if filters.get(field) is not None:
+                    candidates.intersection_update(self._by_meta.get((field, filters[field]), ()))
+            if not candidates:
+                return [], 0
+
+            count = len(self._terms)
+            lengths = self._lengths
+            # BM25 length normalisation: tf / (tf + a + c * length).
+            a, c = K1 * (1 - B), K1 * B * count / self._total_length
+            scores = dict.fromkeys(candidates, 0.0)
+            for matches in expanded:
+                best: Dict[str, float] = {}
+                for posting, weight in matches:
+                    factor = weight * math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5)) * (K1 + 1)
+                    if len(posting) > len(candidates):
+                        hits = ((signal_id, posting[signal_id]) for signal_id in candidates if signal_id in posting)
+                    else:
+                        hits = ((signal_id, tf) for signal_id, tf in posting.items() if signal_id in candidates)
+                    term = {signal_id: factor * tf / (tf + a + c * lengths[signal_id]) for signal_id, tf in hits}
+                    if not best:
+                        best = term
+                    else:
+                        for signal_id, score in term.items():
+                            if score > best.get(signal_id, 0.0):
+                                best[signal_id] = score
+                for signal_id, score in best.items():
+                    scores[signal_id] += score
+            ranked = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [signal_id for signal_id, _ in ranked[offset:]], len(candidates)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'ready': self.ready.is_set(), 'signals': len(self._terms), 'terms': len(self._postings)}
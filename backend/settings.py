@@ -0,0 +1,93 @@
+import os
+
+# Maximum number of Firestore calls allowed in flight at once per worker.
+# Extra requests wait on the event loop instead of piling onto the thread pool.
+FIRESTORE_MAX_CONCURRENCY = int(os.getenv('FIRESTORE_MAX_CONCURRENCY', '32'))
+
+# Width of one health-score history bucket, and how many buckets /api/stats returns as its trend.
+STATS_BUCKET_SECONDS = int(os.getenv('STATS_BUCKET_SECONDS', '3600'))
+STATS_TREND_POINTS = int(os.getenv('STATS_TREND_POINTS', '7'))
+
+# Upper bound for the ?limit= page size on list endpoints.
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '500'))
+
+# Live feed (/api/stream): events kept for Last-Event-ID resume, events buffered per client
+# before it is told to resync, and the idle heartbeat interval.
+LIVE_FEED_HISTORY = int(os.getenv('LIVE_FEED_HISTORY', '1000'))
+LIVE_FEED_CLIENT_QUEUE = int(os.getenv('LIVE_FEED_CLIENT_QUEUE', '256'))
+LIVE_FEED_HEARTBEAT_SECONDS = float(os.getenv('LIVE_FEED_HEARTBEAT_SECONDS', '15'))
+
+# Read-through cache for zones and user profiles (cache.py). TTLs are in seconds.
+CACHE_TTL_ZONES = float(os.getenv('CACHE_TTL_ZONES', '300'))
+CACHE_TTL_USERS = float(os.getenv('CACHE_TTL_USERS', '300'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+CACHE_SNAPSHOT_INVALIDATION = os.getenv('CACHE_SNAPSHOT_INVALIDATION', 'true').lower() == 'true'
+
+# Writes per Firestore batch or transaction (Firestore allows at most 500), and the
+# most IDs one bulk request may name.
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '400'))
+BULK_MAX_IDS = int(os.getenv('BULK_MAX_IDS', '5000'))
+
+# Bulk ingest (/api/signals:ingest): items per commit, how long a partial batch may wait
+# for more items, and the most items one request may carry.
+INGEST_FLUSH_SIZE = int(os.getenv('INGEST_FLUSH_SIZE', '200'))
+INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', '0.05'))
+INGEST_MAX_ITEMS = int(os.getenv('INGEST_MAX_ITEMS', '100000'))
+
+# Zone grid index: cell size in degrees (0.01 is about 1.1 km), how far a signal may be
+# from a zone to be assigned to it, and the largest radius /api/zones/nearby accepts.
+ZONE_GRID_CELL_DEGREES = float(os.getenv('ZONE_GRID_CELL_DEGREES', '0.01'))
+SIGNAL_ZONE_MAX_DISTANCE_M = float(os.getenv('SIGNAL_ZONE_MAX_DISTANCE_M', '1000'))
+NEARBY_MAX_RADIUS_M = float(os.getenv('NEARBY_MAX_RADIUS_M', '50000'))
+
+# Skip the startup emptiness probes and seeding, for deployments whose data already exists.
+FIRESTORE_SKIP_SEED_CHECK = os.getenv('FIRESTORE_SKIP_SEED_CHECK', 'false').lower() == 'true'
+
+# Encoded response cache for GET /api/signals and /api/zones (response_cache.py): how long
+# an entry may be served, how many are kept, and the smallest body worth compressing.
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '10'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+RESPONSE_CACHE_MIN_COMPRESS = int(os.getenv('RESPONSE_CACHE_MIN_COMPRESS', '1024'))
+
+# Archival: resolved signals and read notifications older than ARCHIVE_AFTER_DAYS are moved
+# into the *_archive collections every ARCHIVE_INTERVAL_SECONDS (0 turns the job off).
+ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', '30'))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv('ARCHIVE_INTERVAL_SECONDS', '3600'))
+
+# Incident clustering (clustering.py): the cosine similarity a signal needs to join an
+# incident, and how long an incident stays open to new signals after its last one.
+CLUSTER_SIMILARITY = float(os.getenv('CLUSTER_SIMILARITY', '0.5'))
+CLUSTER_WINDOW_HOURS = float(os.getenv('CLUSTER_WINDOW_HOURS', '24'))
+
+# Full-text search over signals (search_index.py): whether to build the in-memory index at
+# startup, and how many vocabulary words one prefix term may expand to.
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+SEARCH_MAX_PREFIX_EXPANSIONS = int(os.getenv('SEARCH_MAX_PREFIX_EXPANSIONS', '50'))
+
+# Streaming export (/api/signals/export): signals read from Firestore per page.
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', '1000'))
+
+# Zone risk scoring and the heatmap (risk_scoring.py): how long a signal takes to lose half
+# its weight, the raster's cells along its longer side, the spread of each signal over the
+# raster in metres, and how often the raster is re-rendered as signals decay.
+RISK_HALF_LIFE_HOURS = float(os.getenv('RISK_HALF_LIFE_HOURS', '24'))
+HEATMAP_SIZE = int(os.getenv('HEATMAP_SIZE', '128'))
+HEATMAP_SIGMA_M = float(os.getenv('HEATMAP_SIGMA_M', '60'))
+HEATMAP_REFRESH_SECONDS = float(os.getenv('HEATMAP_REFRESH_SECONDS', '60'))
+
+# Per-user notification inboxes: fan-out batches committed at once per worker.
+FANOUT_CONCURRENCY = int(os.getenv('FANOUT_CONCURRENCY', '8'))
+
+# Write-behind mode for POST /api/signals (write_behind.py): the local append-only log file
+# (unset keeps creates synchronous), how long a partial batch waits before it is committed,
+# and how many signal IDs are reserved at a time.
+WRITE_BEHIND_LOG = os.getenv('WRITE_BEHIND_LOG', '')
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', '0.05'))
+WRITE_BEHIND_ID_BLOCK = int(os.getenv('WRITE_BEHIND_ID_BLOCK', '100'))
+
+# Cross-worker shared state (shared_state.py): the directory for the snapshot and lock files,
+# on a tmpfs such as /dev/shm (unset keeps each worker on its own), how often the refresher
+# publishes changes, and the most an entry may age before it is rebuilt anyway.
+SHARED_STATE_DIR = os.getenv('SHARED_STATE_DIR', '')
+SHARED_STATE_REFRESH_SECONDS = float(os.getenv('SHARED_STATE_REFRESH_SECONDS', '1'))
+SHARED_STATE_MAX_AGE_SECONDS = float(os.getenv('SHARED_STATE_MAX_AGE_SECONDS', '10'))
@@ -0,0 +1,288 @@
+"""
+Hot responses shared by the worker processes on one host, turned on by setting SHARED_STATE_DIR.
+
+One worker, whichever holds the lock file, is the refresher. It keeps the encoded bodies
+of the hottest read endpoints (the zone list, the signal lists the dashboard loads, the
+stats, zone risk and the heatmap) in a snapshot file. The other workers memory-map that
+file and serve those endpoints from it, so the bodies live once in the page cache rather
+than in every worker's heap, and only the refresher reads Firestore for them. It is also
+the only worker that builds the risk engine.
+
+Entries are registered with share() by the routers. The refresher rebuilds an entry when
+the response cache version of its collection moves (local writes bump it, and so do
+listeners on the zones collection, the stats document and the most recently updated
+signal, which hear other workers' writes), and at least every SHARED_STATE_MAX_AGE_SECONDS.
+Changed entries are published together, at most every SHARED_STATE_REFRESH_SECONDS, by
+writing a new file and renaming it over the old one.
+
+A worker doesn't serve an entry built before its own last write to that collection, so it
+always sees its own writes, except for derived entries (stats, zone risk and the heatmap),
+which only the refresher's risk engine can build; those lag a write by up to a refresh.
+If the refresher exits, another worker takes the lock over within one refresh interval. Until
+then readers rebuild entries that have gone too old themselves, except derived ones, which they
+keep serving with Age and Warning headers.
+Without fcntl (Windows) sharing stays off.
+"""
+import asyncio
+import dataclasses
+import math
+import mmap
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from google.cloud.firestore_v1 import Query
+from pydantic_core import from_json, to_json
+
+import cache
+import database
+import metrics
+from firebase_config import db, SIGNALS_COLLECTION
+from response_cache import EncodedResponse, responses
+from settings import SHARED_STATE_DIR, SHARED_STATE_REFRESH_SECONDS, SHARED_STATE_MAX_AGE_SECONDS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# How often a reader checks whether the snapshot file was replaced.
+CHECK_INTERVAL_SECONDS = 0.05
+
+Build = Callable[[], Awaitable[EncodedResponse]]
+
+
+def _bumping(collection: str):
+    initial = True
+
+    def on_snapshot(docs, changes, read_time):
+        nonlocal initial
+        if initial:
+            initial = False
+            return
+        responses.bump(collection)
+
+    return on_snapshot
+
+
+class SharedState:
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, 'snapshot')
+        self.lock_path = os.path.join(directory, 'refresher.lock')
+        os.makedirs(directory, exist_ok=True)
+        self._shared: Dict[str, Tuple[str, Build, bool]] = {}  # key -> (collection, build, derived)
+        self._lock_fd: Optional[int] = None
+        self._watches: List[Any] = []
+        self._task: Optional[asyncio.Task] = None
+        self._on_promote: Optional[Callable[[], None]] = None
+        # Refresher side: key -> (built at, collection version it was built from, entry).
+        self._built: Dict[str, Tuple[float, Tuple[int, bool], EncodedResponse]] = {}
+        # Reader side: key -> (built at, collection, entry) from the mapped file.
+        self._mapped: Dict[str, Tuple[float, str, EncodedResponse]] = {}
+        self._identity: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
+        self.published_at = 0.0
+        self.publishes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @property
+    def is_refresher(self) -> bool:
+        return self._lock_fd is not None
+
+    def share(self, key: str, collection: str, build: Build, derived: bool) -> None:
+        self._shared[key] = (collection, build, derived)
+
+    def start(self, on_promote: Callable[[], None]) -> None:
+        """Try for the refresher role in the background, and once it's held keep the snapshot fresh."""
+        self._on_promote = on_promote
+        self._task = metrics.start_background_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches.clear()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def _watch(self) -> None:
+        cache.start_invalidation_listeners()
+        self._watches = [
+            database._stats_ref().on_snapshot(_bumping(SIGNALS_COLLECTION)),
+            db.collection(SIGNALS_COLLECTION).order_by(database.UPDATED_AT, direction=Query.DESCENDING).limit(1)
+              .on_snapshot(_bumping(SIGNALS_COLLECTION)),
+        ]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._tick()
+            except Exception as exc:
+                print(f"Shared state refresh failed: {exc}")
+            await asyncio.sleep(SHARED_STATE_REFRESH_SECONDS)
+
+    async def _tick(self) -> None:
+        if not self.is_refresher:
+            if not self._try_lock():
+                return
+            print(f"Worker {os.getpid()} is the shared state refresher")
+            await asyncio.to_thread(self._watch)
+            self._on_promote()
+        changed = False
+        now = time.time()
+        for key, (collection, build, derived) in self._shared.items():
+            # Derived entries built before the risk engine was ready used the counter-based fallbacks.
+            version = (responses.version(collection), derived and database.risk_engine.ready.is_set())
+            built = self._built.get(key)
+            if built is not None and built[1] == version and now - built[0] < SHARED_STATE_MAX_AGE_SECONDS:
+                continue
+            try:
+                entry = await build()
+            except database.ScoringUnavailable:
+                continue
+            except Exception as exc:
+                print(f"Shared state rebuild of {key} failed: {exc}")
+                continue
+            self._built[key] = (time.time(), version, entry)
+            changed = True
+        if changed:
+            await asyncio.to_thread(self._publish, dict(self._built))
+
+    def _publish(self, built: Dict[str, Tuple[float, Tuple[int, bool], EncodedResponse]]) -> None:
+        index: Dict[str, Any] = {}
+        blobs: List[bytes] = []
+        offset = 0
+
+        def place(data: bytes) -> List[int]:
+            nonlocal offset
+            blobs.append(data)
+            offset += len(data)
+            return [offset - len(data), len(data)]
+
+        for key, (built_at, _, entry) in built.items():
+            index[key] = {
+                'builtAt': built_at, 'collection': self._shared[key][0], 'etag': entry.etag, 'headers': entry.headers,
+                'body': place(entry.body), 'variants': {coding: place(body) for coding, body in entry.variants.items()},
+            }
+        header = to_json({'pid': os.getpid(), 'publishedAt': time.time(), 'entries': index})
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(temporary, self.path)
+        self.published_at = time.time()
+        self.publishes += 1
+
+    def _map(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + CHECK_INTERVAL_SECONDS
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            self._mapped, self._identity = {}, None
+            return
+        identity = (status.st_ino, status.st_mtime_ns, status.st_size)
+        if identity == self._identity:
+            return
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = int.from_bytes(mapped[:8], 'little')
+        header = from_json(mapped[8:8 + size])
+        # Entries are views into the mapping; it is unmapped once the last of them is dropped.
+        data = memoryview(mapped)[8 + size:]
+        self._mapped = {
+            key: (meta['builtAt'], meta['collection'], EncodedResponse(
+                data[meta['body'][0]:sum(meta['body'])], meta['etag'], meta['headers'],
+                {coding: data[start:start + length] for coding, (start, length) in meta['variants'].items()}, math.inf))
+            for key, meta in header['entries'].items()
+        }
+        self.published_at = header['publishedAt']
+        self._identity = identity
+
+    def lookup(self, key: str) -> Optional[EncodedResponse]:
+        """The shared entry for key, or None when this worker should build the response itself."""
+        if self.is_refresher or key not in self._shared:
+            return None
+        self._map()
+        mapped = self._mapped.get(key)
+        derived = self._shared[key][2]
+        # Before our own last write an entry is stale for us, unless it's derived.
+        if mapped is None or (not derived and mapped[0] < responses.bumped_at(mapped[1])):
+            self.misses += 1
+            return None
+        # Too old means the refresher has stopped publishing. Other entries can be rebuilt here, but
+        # derived ones can't be without the risk engine, so keep serving the last one and say how old it is.
+        age = time.time() - mapped[0]
+        if age > SHARED_STATE_MAX_AGE_SECONDS + 2 * SHARED_STATE_REFRESH_SECONDS:
+            if not derived:
+                self.misses += 1
+                return None
+            self.stale_hits += 1
+            return dataclasses.replace(mapped[2], headers={
+                **mapped[2].headers, 'Age': str(int(age)), 'Warning': '110 - "Response is Stale"'})
+        self.hits += 1
+        return mapped[2]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': True,
+            'role': 'refresher' if self.is_refresher else 'reader',
+            'entries': len(self._built if self.is_refresher else self._mapped),
+            'snapshotAgeSeconds': round(time.time() - self.published_at, 3) if self.published_at else None,
+            'publishes': self.publishes,
+            'hits': self.hits,
+            'staleHits': self.stale_hits,
+            'misses': self.misses,
+        }
+
+
+state: Optional[SharedState] = None
+
+
+def get_state() -> Optional[SharedState]:
+    """The shared state, or None when SHARED_STATE_DIR is unset or fcntl is missing."""
+    global state
+    if state is None and SHARED_STATE_DIR and fcntl is not None:
+        state = SharedState(SHARED_STATE_DIR)
+    return state
+
+
+def share(key: str, collection: str, build: Build, derived: bool = False) -> None:
+    """
+    Register a response to share under key (its path and query string), rebuilt when collection
+    changes. Derived responses need the risk engine, so readers serve them even after their own writes.
+    """
+    if get_state() is not None:
+        state.share(key, collection, build, derived)
+
+
+def lookup(key: str) -> Optional[EncodedResponse]:
+    return state.lookup(key) if state is not None else None
+
+
+def refreshes_derived_state() -> bool:
+    """Whether this worker should build the derived state (the risk engine) shared workers take from the refresher."""
+    return state is None or state.is_refresher
+
+
+def stats() -> Dict[str, Any]:
+    return state.stats() if state is not None else {'enabled': False}
@@ -0,0 +1,137 @@
+"""
+Uniform-grid spatial index over zone coordinates.
+
+Zones are bucketed into square lat/lng cells. A nearest-zone lookup searches rings of
+cells outward from the query point and stops as soon as no unsearched cell can hold
+anything closer than the best match, so it touches a handful of cells rather than every
+zone. Radius queries only visit the cells overlapping the radius.
+"""
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+Cell = Tuple[int, int]
+
+
+class ZoneGridIndex:
+    def __init__(self, cell_degrees: float):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Cell, Set[str]] = defaultdict(set)
+        self._points: Dict[str, Tuple[float, float]] = {}
+        # (min row, min col, max row, max col) of the occupied cells; None when it must be recomputed.
+        self._bounds: Optional[Tuple[int, int, int, int]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def rebuild(self, points: Iterable[Tuple[str, float, float]]) -> None:
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self._bounds = None
+            for zone_id, lat, lng in points:
+                self.upsert(zone_id, lat, lng)
+
+    def upsert(self, zone_id: str, lat: float, lng: float) -> None:
+        with self._lock:
+            self.remove(zone_id)
+            self._points[zone_id] = (lat, lng)
+            row, col = cell = self._cell(lat, lng)
+            self._cells[cell].add(zone_id)
+            if self._bounds is not None or len(self._cells) == 1:
+                low_row, low_col, high_row, high_col = self._bounds or (row, col, row, col)
+                self._bounds = (min(low_row, row), min(low_col, col), max(high_row, row), max(high_col, col))
+
+    def remove(self, zone_id: str) -> None:
+        with self._lock:
+            point = self._points.pop(zone_id, None)
+            if point is None:
+                return
+            cell = self._cell(*point)
+            self._cells[cell].discard(zone_id)
+            if not self._cells[cell]:
+                del self._cells[cell]
+                # Only an edge cell can shrink the bounds; they are recomputed on the next lookup.
+                if self._bounds is not None and (cell[0] in self._bounds[::2] or cell[1] in self._bounds[1::2]):
+                    self._bounds = None
+
+    def _ring(self, center: Cell, radius: int) -> Iterable[Cell]:
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for d in range(-radius, radius + 1):
+            yield (row - radius, col + d)
+            yield (row + radius, col + d)
+        for d in range(-radius + 1, radius):
+            yield (row + d, col - radius)
+            yield (row + d, col + radius)
+
+    def _max_ring(self, center: Cell) -> int:
+        """Ring beyond which there are no occupied cells."""
+        if self._bounds is None:
+            if not self._cells:
+                return 0
+            rows, cols = zip(*self._cells)
+            self._bounds = (min(rows), min(cols), max(rows), max(cols))
+        low_row, low_col, high_row, high_col = self._bounds
+        return max(abs(low_row - center[0]), abs(high_row - center[0]), abs(low_col - center[1]), abs(high_col - center[1]))
+
+    def nearest(self, lat: float, lng: float, max_distance_m: Optional[float] = None) -> Optional[Tuple[str, float]]:
+        """Closest zone to (lat, lng) as (zone_id, metres), or None if none is within max_distance_m."""
+        with self._lock:
+            if not self._points:
+                return None
+            center = self._cell(lat, lng)
+            # Smallest ground distance one cell can span here (longitude cells shrink toward the poles).
+            cell_m = self.cell_degrees * METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)
+            best: Optional[Tuple[str, float]] = None
+            last_ring = self._max_ring(center)
+            if max_distance_m is not None:
+                last_ring = min(last_ring, int(max_distance_m // cell_m) + 1)
+            for radius in range(last_ring + 1):
+                # Anything in this ring or beyond is at least (radius - 1) cells away.
+                if best is not None and (radius - 1) * cell_m > best[1]:
+                    break
+                for cell in self._ring(center, radius):
+                    for zone_id in self._cells.get(cell, ()):
+                        distance = haversine_m(lat, lng, *self._points[zone_id])
+                        if best is None or distance < best[1]:
+                            best = (zone_id, distance)
+            if best is None or (max_distance_m is not None and best[1] > max_distance_m):
+                return None
+            return best
+
+    def within(self, lat: float, lng: float, radius_m: float) -> List[Tuple[str, float]]:
+        """Zones within radius_m of (lat, lng), nearest first."""
+        with self._lock:
+            lat_span = radius_m / METERS_PER_DEGREE
+            lng_span = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+            low = self._cell(lat - lat_span, lng - lng_span)
+            high = self._cell(lat + lat_span, lng + lng_span)
+            matches = []
+            for row in range(low[0], high[0] + 1):
+                for col in range(low[1], high[1] + 1):
+                    for zone_id in self._cells.get((row, col), ()):
+                        distance = haversine_m(lat, lng, *self._points[zone_id])
+                        if distance <= radius_m:
+                            matches.append((zone_id, distance))
+            matches.sort(key=lambda match: match[1])
+            return matches
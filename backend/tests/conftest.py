@@ -0,0 +1,20 @@
+"""
+The tests run against benchmarks/fake_firestore.py, installed as firebase_config before any
+backend module is imported, so no credentials or emulator are needed.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from api_load import install_firestore  # noqa: E402
+
+fake = install_firestore(0.0, None)
+
+
+def signal_document(title):
+    return {'title': title, 'category': 'IT', 'location': 'Library', 'riskLevel': 'Low', 'description': 'wifi down',
+            'status': 'Open', 'timestamp': 'Just now', 'createdAt': datetime.now(timezone.utc)}
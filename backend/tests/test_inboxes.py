@@ -0,0 +1,91 @@
+import itertools
+import threading
+
+import pytest
+from google.api_core import exceptions
+
+import database
+import fake_firestore
+from conftest import fake
+
+notification_ids = itertools.count(9001)
+
+
+def old_notification(notification_id):
+    """A notification written before inboxes existed, so no inbox has a copy of it."""
+    data = {'id': notification_id, 'title': f'Old notification {notification_id}', 'time': '1h ago', 'read': False}
+    fake.collection('notifications').document(str(notification_id)).set(data)
+    return data
+
+
+def assert_counts_match_items():
+    for user in fake.collection('users').stream():
+        inbox = fake.collection('inboxes').document(user.id)
+        items = [doc.to_dict() for doc in inbox.collection('notifications').stream()]
+        counts = inbox.get().to_dict()
+        assert counts['total'] == len(items), user.id
+        assert counts['unread'] == sum(1 for item in items if not item.get('read')), user.id
+
+
+@pytest.fixture
+def old_notifications():
+    database.initialize_firestore()
+    return [old_notification(next(notification_ids)) for _ in range(3)]
+
+
+def test_fan_out_after_backfill_counts_each_item_once(old_notifications):
+    assert database.backfill_inboxes() == 3 * len(list(fake.collection('users').stream()))
+    for future in database.fan_out(old_notifications[:1]):
+        future.result()
+    assert_counts_match_items()
+
+
+def test_concurrent_backfills_count_each_item_once(old_notifications):
+    workers = [threading.Thread(target=database.backfill_inboxes) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert_counts_match_items()
+    assert database.backfill_inboxes() == 0
+    items = fake.collection('inboxes').document('Admin').collection('notifications')
+    assert all(items.document(str(notification['id'])).get().exists for notification in old_notifications)
+
+
+def test_failed_fan_out_batch_is_retried(old_notifications, monkeypatch):
+    commit = fake_firestore.WriteBatch.commit
+    failures = [exceptions.ServiceUnavailable('unavailable')]
+
+    def flaky_commit(batch, **kwargs):
+        if failures:
+            raise failures.pop()
+        return commit(batch, **kwargs)
+
+    monkeypatch.setattr(fake_firestore.WriteBatch, 'commit', flaky_commit)
+    monkeypatch.setattr(database, 'FANOUT_RETRY_SECONDS', 0)
+    for future in database.fan_out(old_notifications):
+        future.result()
+    assert not failures
+    assert_counts_match_items()
+    user = next(iter(fake.collection('users').stream())).id
+    assert fake.collection('inboxes').document(user).collection('notifications').document(str(old_notifications[-1]['id'])).get().exists
+
+
+def test_sync_after_a_load_matches_inboxes_to_notifications(old_notifications):
+    fake.collection('users').document('Visitor').set({'type': 'Visitor'})
+    database.backfill_inboxes()
+    deleted, changed, _ = old_notifications
+    fake.collection('notifications').document(str(deleted['id'])).delete()
+    fake.collection('notifications').document(str(changed['id'])).update({'title': 'Renamed'})
+    added = old_notification(next(notification_ids))
+    visitor = fake.collection('inboxes').document('Visitor').get().get('total')
+    fake.collection('users').document('Visitor').delete()
+    users = len(list(fake.collection('users').stream()))
+    assert database.sync_inboxes() == {'removed': users + visitor, 'refreshed': users, 'copied': users}
+    assert not fake.collection('inboxes').document('Visitor').get().exists
+    assert_counts_match_items()
+    items = fake.collection('inboxes').document('Admin').collection('notifications')
+    assert not items.document(str(deleted['id'])).get().exists
+    assert items.document(str(changed['id'])).get().get('title') == 'Renamed'
+    assert items.document(str(added['id'])).get().exists
+    assert database.sync_inboxes() == {'removed': 0, 'refreshed': 0, 'copied': 0}
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+
+import pytest
+from google.api_core import exceptions
+
+import database
+import fake_firestore
+from clustering import term_counts
+from conftest import fake, signal_document
+
+
+def test_incident_from_another_process_is_joined():
+    database.initialize_firestore()
+    database.incident_index()
+    fake.collection('incidents').document('elsewhere').set({
+        'id': 'elsewhere', 'title': 'Projector broken', 'category': 'IT', 'riskLevel': 'Low', 'signalCount': 1,
+        'terms': term_counts('Projector broken', 'lecture hall projector shows no image'),
+        'lastSeen': datetime.now(timezone.utc)})
+    signal = {**signal_document('Projector broken'), 'description': 'lecture hall projector shows no image'}
+    assert database.create_signal(signal)['incidentId'] == 'elsewhere'
+
+
+def test_failed_commit_leaves_the_index_alone(monkeypatch):
+    database.initialize_firestore()
+    index = database.incident_index()
+
+    def failing_commit(transaction):
+        transaction._clean_up()
+        raise exceptions.InvalidArgument('rejected')
+
+    monkeypatch.setattr(fake_firestore.Transaction, '_commit', failing_commit)
+    signal = {**signal_document('Elevator stuck'), 'description': 'elevator stuck between floors two and three'}
+    before = len(index)
+    with pytest.raises(exceptions.InvalidArgument):
+        database.create_signal(signal)
+    assert len(index) == before
+    monkeypatch.undo()
+    created = database.create_signal({**signal_document('Elevator stuck'), 'description': signal['description']})
+    assert len(index) == before + 1
+    assert created['incidentId'] != signal['incidentId']
@@ -0,0 +1,36 @@
+import pytest
+from google.api_core import exceptions
+
+import database
+import fake_firestore
+from conftest import fake
+
+
+@pytest.fixture
+def busy_document(monkeypatch):
+    """Every guarded update loses to another writer, as on a document under heavy contention."""
+    update = fake_firestore.DocumentReference.update
+
+    def contended_update(doc_ref, field_updates, option=None):
+        if option is not None and option.last_update_time is not None:
+            update(doc_ref, {'busy': True})
+            raise exceptions.FailedPrecondition('Update time mismatch')
+        return update(doc_ref, field_updates, option)
+
+    monkeypatch.setattr(fake_firestore.DocumentReference, 'update', contended_update)
+
+
+def test_unconditional_patch_of_busy_document_is_applied(busy_document):
+    database.initialize_firestore()
+    updated = database.update_zone('z1', {'name': 'Renamed zone'})
+    assert updated['name'] == 'Renamed zone'
+    assert updated['busy'] is True
+    assert fake.collection('zones').document('z1').get().get('name') == 'Renamed zone'
+    assert database.get_zone_by_id('z1')['name'] == 'Renamed zone'
+
+
+def test_if_match_patch_of_busy_document_fails(busy_document):
+    database.initialize_firestore()
+    etag = database.document_etag(database.get_zone_by_id('z1'))
+    with pytest.raises(database.PreconditionFailed):
+        database.update_zone('z1', {'name': 'Renamed zone'}, etag)
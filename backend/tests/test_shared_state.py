@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+import shared_state
+from response_cache import encode
+from settings import SHARED_STATE_MAX_AGE_SECONDS
+
+
+@pytest.fixture
+def reader(tmp_path):
+    """A reader of a snapshot whose refresher stopped publishing long ago."""
+    if shared_state.fcntl is None:
+        pytest.skip('shared state needs fcntl')
+    refresher = shared_state.SharedState(str(tmp_path))
+    reader = shared_state.SharedState(str(tmp_path))
+    built_at = time.time() - 10 * SHARED_STATE_MAX_AGE_SECONDS
+    for state in (refresher, reader):
+        state.share('/api/zones', 'zones', None, False)
+        state.share('/api/zones/risk', 'signals', None, True)
+    refresher._publish({
+        '/api/zones': (built_at, (1, False), encode(b'[]', {})),
+        '/api/zones/risk': (built_at, (1, True), encode(b'{"zones": []}', {})),
+    })
+    return reader
+
+
+def test_reader_keeps_serving_old_derived_entries(reader):
+    assert reader.lookup('/api/zones') is None
+    entry = reader.lookup('/api/zones/risk')
+    assert bytes(entry.body) == b'{"zones": []}'
+    assert int(entry.headers['Age']) >= 10 * SHARED_STATE_MAX_AGE_SECONDS - 1
+    assert entry.headers['Warning'].startswith('110')
+    assert reader.stats()['staleHits'] == 1 and reader.stats()['misses'] == 1
@@ -0,0 +1,41 @@
+import pytest
+from google.api_core import exceptions
+
+import database
+import fake_firestore
+from conftest import fake, signal_document
+
+
+@pytest.fixture
+def lost_race(monkeypatch):
+    """Abort the next commit after another writer takes the signal ID it was about to use."""
+    commit = fake_firestore.Transaction._commit
+    pending = [True]
+
+    def aborting_commit(transaction):
+        if not pending:
+            return commit(transaction)
+        pending.clear()
+        transaction._clean_up()
+        database.create_signal(signal_document('Concurrent signal'))
+        raise exceptions.Aborted('Transaction contention')
+
+    monkeypatch.setattr(fake_firestore.Transaction, '_commit', aborting_commit)
+
+
+def test_create_retry_takes_a_fresh_id(lost_race):
+    database.initialize_firestore()
+    next_id = database._max_existing_id('signals') + 1
+    created = database.create_signal(signal_document('Retried signal'))
+    assert fake.collection('signals').document(f's{next_id}').get().get('title') == 'Concurrent signal'
+    assert created['id'] == f's{next_id + 1}'
+    assert fake.collection('signals').document(created['id']).get().get('title') == 'Retried signal'
+    assert fake.collection('counters').document('signals').get().get('next') == next_id + 2
+
+
+def test_ingest_retry_takes_fresh_ids(lost_race):
+    database.initialize_firestore()
+    next_id = database._max_existing_id('signals') + 1
+    stored = database.ingest_signals([signal_document('Ingested 1'), signal_document('Ingested 2')], [None, None])
+    assert [signal['id'] for signal in stored] == [f's{next_id + 1}', f's{next_id + 2}']
+    assert fake.collection('counters').document('signals').get().get('next') == next_id + 3
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from pydantic_core import to_json
+
+import database
+import write_behind
+from conftest import fake, signal_document
+
+
+def stored(signal_id):
+    return fake.collection('signals').document(signal_id).get().exists
+
+
+async def drain(log):
+    while log.depth:
+        await asyncio.sleep(0.01)
+    await log.stop()
+
+
+@pytest.fixture
+def path(tmp_path):
+    database.initialize_firestore()
+    return str(tmp_path / 'signals.log')
+
+
+def test_replay_commits_entries_after_the_last_mark(path):
+    ids = database.allocate_ids('signals', 3)
+    with open(path, 'wb') as f:
+        for seq, signal_id in enumerate(ids, 1):
+            signal = {**signal_document(f'Logged {seq}'), 'id': f's{signal_id}'}
+            f.write(to_json({'seq': seq, 'signal': signal, 'notification': None}) + b'\n')
+        f.write(to_json({'committed': 1}) + b'\n')
+        f.write(b'{"seq": 4, "sig')
+
+    async def replay():
+        log = write_behind.WriteBehindLog(path)
+        assert log.lock()
+        await log.start()
+        assert log.replayed == 2
+        await drain(log)
+
+    asyncio.run(replay())
+    assert [stored(f's{signal_id}') for signal_id in ids] == [False, True, True]
+    with open(path, 'rb') as f:
+        assert f.read() == b''
+
+
+def test_log_is_used_by_one_process_at_a_time(path):
+    first = write_behind.WriteBehindLog(path)
+    assert first.lock()
+    assert not write_behind.WriteBehindLog(path).lock()
+    first._file.close()
+    assert write_behind.WriteBehindLog(path).lock()
+
+
+def test_failed_commit_is_retried(path, monkeypatch):
+    persist = database.persist_signals
+    failures = [RuntimeError('unavailable')]
+
+    def flaky_persist(signals, notifications):
+        if failures:
+            raise failures.pop()
+        return persist(signals, notifications)
+
+    monkeypatch.setattr(database, 'persist_signals', flaky_persist)
+    monkeypatch.setattr(write_behind, 'RETRY_DELAY_SECONDS', 0.01)
+
+    async def submit():
+        log = write_behind.WriteBehindLog(path, flush_interval=0)
+        assert log.lock()
+        await log.start()
+        signal = await log.submit(signal_document('Retried'), None)
+        await drain(log)
+        return log, signal
+
+    log, signal = asyncio.run(submit())
+    assert log.failed_flushes == 1 and log.flushed_items == 1
+    document = fake.collection('signals').document(signal['id']).get()
+    assert document.get('updatedAt') > document.get('createdAt')
+    with open(path, 'rb') as f:
+        assert f.read() == b''
+
+
+def test_failed_append_is_never_committed(path, monkeypatch):
+    fsync = write_behind.os.fsync
+
+    def failing_fsync(fd):
+        raise OSError('disk full')
+
+    async def submit():
+        log = write_behind.WriteBehindLog(path, flush_interval=0)
+        assert log.lock()
+        await log.start()
+        monkeypatch.setattr(write_behind.os, 'fsync', failing_fsync)
+        with pytest.raises(OSError):
+            await log.submit(signal_document('Lost'), None)
+        monkeypatch.setattr(write_behind.os, 'fsync', fsync)
+        kept = await log.submit(signal_document('Kept'), None)
+        await drain(log)
+        return log, kept
+
+    log, kept = asyncio.run(submit())
+    assert log.flushed_items == 1
+    assert stored(kept['id'])
+    assert not stored(f"s{int(kept['id'][1:]) - 1}")
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+import pytest
+
+import database
+from conftest import fake, signal_document
+
+ZONES = 300
+
+
+@pytest.fixture
+def spread_signals():
+    """One signal in each of ZONES zones far from the seeded campus, so every signal touches its own zone."""
+    database.initialize_firestore()
+    for index in range(ZONES):
+        fake.collection('zones').document(f'budget{index}').set({
+            'id': f'budget{index}', 'name': f'Budget zone {index}', 'category': 'Safety', 'riskLevel': 'Stable',
+            'signalCount': 0, 'coordinates': {'x': 0, 'y': 0}, 'latLng': [10 + index * 0.02, 70.0], 'details': ''})
+    database._invalidate_zones({f'budget{index}' for index in range(ZONES)})
+    signals = []
+    for index in range(ZONES):
+        signal = {**signal_document(f'Budget signal {index}'), 'lat': 10 + index * 0.02, 'lng': 70.0}
+        signal['createdAt'] -= timedelta(days=2)
+        signals.append(signal)
+    for start in range(0, ZONES, database.SIGNALS_PER_COMMIT):
+        database.ingest_signals(signals[start:start + database.SIGNALS_PER_COMMIT], [None] * len(signals[start:start + database.SIGNALS_PER_COMMIT]))
+    assert {signal['zoneId'] for signal in signals} == {f'budget{index}' for index in range(ZONES)}
+    return [signal['id'] for signal in signals]
+
+
+def test_batch_update_and_archive_stay_within_the_write_limit(spread_signals):
+    result = database.batch_update_signals(spread_signals, {'status': 'Resolved'})
+    assert len(result['processed']) == ZONES
+    assert fake.collection('zones').document('budget0').get().get('signalCount') == 0
+    assert database.archive_old_documents(1)['signals'] >= ZONES
+    assert not fake.collection('signals').document(spread_signals[0]).get().exists
@@ -0,0 +1,24 @@
+import pytest
+from pydantic import ValidationError
+
+import database
+from conftest import fake
+from models import ZoneUpdate
+
+
+def test_zone_counts_match_their_signals_from_startup():
+    database.initialize_firestore()
+    active = {}
+    for doc in fake.collection('signals').stream():
+        signal = doc.to_dict()
+        if signal.get('zoneId') and signal.get('status') != 'Resolved':
+            active[signal['zoneId']] = active.get(signal['zoneId'], 0) + 1
+    for doc in fake.collection('zones').stream():
+        assert doc.get('signalCount') == active.get(doc.id, 0), doc.id
+
+
+def test_zone_update_rejects_derived_fields():
+    assert ZoneUpdate(details='Zone A').model_dump(exclude_unset=True) == {'details': 'Zone A'}
+    for derived in ({'signalCount': 3}, {'riskLevel': 'Critical'}):
+        with pytest.raises(ValidationError):
+            ZoneUpdate(**derived)
@@ -0,0 +1,280 @@
+"""
+Write-behind mode for POST /api/signals, turned on by setting WRITE_BEHIND_LOG.
+
+Normally a new signal is acknowledged after its transaction commits. In write-behind mode
+it is acknowledged once it is in a local append-only log: it takes an ID from a block
+reserved ahead with allocate_ids, its entry is appended and fsynced (entries arriving
+together share one fsync), and the client gets the signal straight away. A background
+task commits logged signals to Firestore in log order, in batches of up to
+INGEST_FLUSH_SIZE, appends a mark after each commit, and empties the log whenever
+everything in it is committed. Failed commits are retried.
+
+At startup the log is replayed: entries after the last mark are queued again. A crash
+between a commit and its mark replays signals that are already stored, which
+database.persist_signals skips. The log holds an flock on its file, so only one process
+uses it; a worker that can't take the lock keeps creating signals synchronously. Give
+each worker its own WRITE_BEHIND_LOG to have all of them write behind.
+
+Until it is committed a signal can be read through GET /api/signals/{id} only; lists,
+search, stats and the live feed see it after the commit. stats() reports the backlog:
+entries waiting and the age of the oldest.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pydantic_core import from_json, to_json
+
+import database
+import metrics
+from db_executor import run
+from firebase_config import SIGNALS_COLLECTION
+from settings import INGEST_FLUSH_SIZE, WRITE_BEHIND_LOG, WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_ID_BLOCK
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Wait before retrying a failed commit.
+RETRY_DELAY_SECONDS = 1.0
+
+
+def _decode(document: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if document is not None and isinstance(document.get(database.CREATED_AT), str):
+        document[database.CREATED_AT] = datetime.fromisoformat(document[database.CREATED_AT])
+    return document
+
+
+class WriteBehindLog:
+    def __init__(self, path: str, flush_size: int = INGEST_FLUSH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL, id_block: int = WRITE_BEHIND_ID_BLOCK):
+        self.path = path
+        self.flush_size = max(1, min(flush_size, database.SIGNALS_PER_COMMIT))
+        self.flush_interval = flush_interval
+        self.id_block = id_block
+        self._file = None
+        self._file_lock = threading.Lock()
+        # seq -> (logged at, signal, notification), in log order.
+        self._pending: Dict[int, Tuple[float, Dict[str, Any], Optional[Dict[str, Any]]]] = {}
+        self._pending_ids: Dict[str, int] = {}
+        self._seq = 0
+        # Entries in the file not yet committed; the file is emptied when this drops to zero.
+        self._uncommitted = 0
+        self._unsynced: List[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]], bytes, asyncio.Future]] = []
+        self._sync_task: Optional[asyncio.Task] = None
+        self._ids: Deque[int] = deque()
+        self._id_lock = asyncio.Lock()
+        self._has_items = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.replayed = 0
+        self.flushes = 0
+        self.flushed_items = 0
+        self.failed_flushes = 0
+
+    def lock(self) -> bool:
+        """Open the log and take an exclusive lock on it; False if another process holds it."""
+        self._file = open(self.path, 'ab')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._file.close()
+                self._file = None
+                return False
+        return True
+
+    async def start(self) -> None:
+        """Replay the log, then start committing in the background."""
+        if self._task is not None:
+            return
+        entries = await asyncio.to_thread(self._open)
+        for seq, signal, notification in entries:
+            self._queue(seq, signal, notification)
+        self.replayed = len(entries)
+        if entries:
+            print(f"Write-behind log: replaying {len(entries)} uncommitted signals from {self.path}")
+        self._task = metrics.start_background_task(self._run())
+
+    async def stop(self) -> None:
+        """Commit whatever is logged (what can't be committed stays for the next replay), then close the log."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._has_items.set()
+        await self._task
+        if self._sync_task is not None:
+            await self._sync_task
+        self._task = None
+        self._stopping = False
+        with self._file_lock:
+            self._file.close()
+
+    def _open(self) -> List[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]]:
+        entries: Dict[int, Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = {}
+        committed = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = from_json(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-append; its signal was never acknowledged.
+                        continue
+                    if 'committed' in record:
+                        committed = max(committed, record['committed'])
+                    else:
+                        entries[record['seq']] = (_decode(record['signal']), _decode(record['notification']))
+        self._seq = max(entries, default=0)
+        uncommitted = [(seq, signal, notification) for seq, (signal, notification) in sorted(entries.items()) if seq > committed]
+        self._uncommitted = len(uncommitted)
+        if not uncommitted:
+            self._file.truncate(0)
+        return uncommitted
+
+    def _queue(self, seq: int, signal: Dict[str, Any], notification: Optional[Dict[str, Any]]) -> None:
+        self._pending[seq] = (time.time(), signal, notification)
+        self._pending_ids[signal['id']] = seq
+        self._has_items.set()
+
+    async def submit(self, signal: Dict[str, Any], notification: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Log a new signal and return it with its ID once the log entry is on disk."""
+        signal['id'] = f's{await self._next_id()}'
+        self._seq += 1
+        line = to_json({'seq': self._seq, 'signal': signal, 'notification': notification}) + b'\n'
+        future = asyncio.get_running_loop().create_future()
+        self._unsynced.append((self._seq, signal, notification, line, future))
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync())
+        await future
+        return database.with_display_time(SIGNALS_COLLECTION, dict(signal))
+
+    def pending_signal(self, signal_id: str) -> Optional[Dict[str, Any]]:
+        """A logged signal not yet committed, or None."""
+        seq = self._pending_ids.get(signal_id)
+        if seq is None or seq not in self._pending:
+            return None
+        return database.with_display_time(SIGNALS_COLLECTION, dict(self._pending[seq][1]))
+
+    async def _next_id(self) -> int:
+        async with self._id_lock:
+            if not self._ids:
+                self._ids.extend(await run(database.allocate_ids, SIGNALS_COLLECTION, self.id_block))
+            return self._ids.popleft()
+
+    async def _sync(self) -> None:
+        # Everything appended while one fsync runs goes out together in the next.
+        while self._unsynced:
+            waiting, self._unsynced = self._unsynced, []
+            try:
+                await asyncio.to_thread(self._append, b''.join(entry[3] for entry in waiting), len(waiting))
+            except Exception as exc:
+                # Never queued, so never committed: the client's retry can't duplicate these.
+                for *_, future in waiting:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                # Queued only once durable, so a commit never holds an entry the log could lose.
+                for seq, signal, notification, _, future in waiting:
+                    self._queue(seq, signal, notification)
+                    if not future.done():
+                        future.set_result(None)
+
+    def _append(self, data: bytes, entries: int) -> None:
+        with self._file_lock:
+            size = self._file.tell()
+            try:
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception:
+                # Drop what may have reached the file so a replay doesn't commit failed entries.
+                self._file.truncate(size)
+                raise
+            self._uncommitted += entries
+
+    def _mark(self, seq: int, entries: int) -> None:
+        with self._file_lock:
+            # A mark needs no fsync: if it is lost, replay only skips signals already stored.
+            self._uncommitted -= entries
+            if not self._uncommitted:
+                self._file.truncate(0)
+            else:
+                self._file.write(to_json({'committed': seq}) + b'\n')
+                self._file.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_items.wait()
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._has_items.clear()
+                continue
+            if len(self._pending) < self.flush_size and not self._stopping:
+                await asyncio.sleep(self.flush_interval)
+            if not await self._flush() and self._stopping:
+                return
+
+    async def _flush(self) -> bool:
+        seqs = list(self._pending)[:self.flush_size]
+        batch = [self._pending[seq] for seq in seqs]
+        try:
+            await run(database.persist_signals, [signal for _, signal, _ in batch], [notification for _, _, notification in batch])
+        except Exception as exc:
+            self.failed_flushes += 1
+            print(f"Write-behind commit of {len(batch)} signals failed, retrying: {exc}")
+            if not self._stopping:
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+            return False
+        for seq, (_, signal, _) in zip(seqs, batch):
+            del self._pending[seq]
+            self._pending_ids.pop(signal['id'], None)
+        self.flushes += 1
+        self.flushed_items += len(batch)
+        await asyncio.to_thread(self._mark, seqs[-1], len(seqs))
+        return True
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = next(iter(self._pending.values()), None)
+        return {
+            'enabled': True,
+            'depth': self.depth,
+            'lagSeconds': round(time.time() - oldest[0], 3) if oldest else 0.0,
+            'replayed': self.replayed,
+            'flushes': self.flushes,
+            'flushedItems': self.flushed_items,
+            'failedFlushes': self.failed_flushes,
+        }
+
+
+log: Optional[WriteBehindLog] = None
+
+
+_locked_out = False
+
+
+def get_log() -> Optional[WriteBehindLog]:
+    """The write-behind log, or None when WRITE_BEHIND_LOG is unset or another process holds it."""
+    global log, _locked_out
+    if log is None and WRITE_BEHIND_LOG and not _locked_out:
+        candidate = WriteBehindLog(WRITE_BEHIND_LOG)
+        if candidate.lock():
+            log = candidate
+        else:
+            _locked_out = True
+            print(f"Write-behind log {WRITE_BEHIND_LOG} is locked by another process; creating signals synchronously")
+    return log
+
+
+def stats() -> Dict[str, Any]:
+    return log.stats() if log is not None else {'enabled': False}